@@ -59,6 +59,7 @@ def create_new_agent(body: AgentCreate):
         top_k=body.top_k,
         icon=body.icon.strip() or "E",
         use_multi_query=body.use_multi_query,
+        neighbor_window=body.neighbor_window,
     )
     return agent
 
@@ -9,6 +9,7 @@ logger = logging.getLogger(__name__)
 
 from app.core.database import (
     list_sessions,
+    page_cursor,
     get_session,
     delete_session,
     add_feedback,
@@ -53,24 +54,37 @@ def create_chat_session(body: NewSessionRequest | None = None):
     return session
 
 
+def _session_page(sessions: list[dict], limit: int) -> dict:
+    """Response for one page of sessions; next_cursor is None on the last page."""
+    next_cursor = page_cursor(sessions[-1]) if len(sessions) == limit else None
+    return {"sessions": sessions, "next_cursor": next_cursor}
+
+
 @router.get("/sessions")
-def list_chat_sessions(limit: int = 50):
+def list_chat_sessions(limit: int = 50, cursor: str | None = None):
     limit = min(max(limit, 1), 500)
-    sessions = list_sessions(limit=limit)
-    return {"sessions": sessions}
+    try:
+        sessions = list_sessions(limit=limit, cursor=cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return _session_page(sessions, limit)
 
 
 @router.get("/sessions/search")
-def search_chat_sessions(q: str = "", limit: int = 50):
+def search_chat_sessions(q: str = "", limit: int = 50, cursor: str | None = None):
     limit = min(max(limit, 1), 500)
-    if not q.strip():
-        return {"sessions": list_sessions(limit=limit)}
-    sessions = search_sessions(q.strip(), limit=limit)
-    return {"sessions": sessions}
+    try:
+        if not q.strip():
+            sessions = list_sessions(limit=limit, cursor=cursor)
+        else:
+            sessions = search_sessions(q.strip(), limit=limit, cursor=cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return _session_page(sessions, limit)
 
 
 @router.get("/sessions/{session_id}")
-def get_chat_session(session_id: str):
+def get_chat_session(session_id: str, sources: bool = True):
     session = get_session(session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
@@ -80,7 +94,7 @@ def get_chat_session(session_id: str):
             session["metadata"] = json.loads(session["metadata"])
         except (json.JSONDecodeError, TypeError):
             session["metadata"] = {}
-    messages = get_chat_history(session_id)
+    messages = get_chat_history(session_id, include_sources=sources)
     return {"session": session, "messages": messages}
 
 
@@ -122,12 +136,15 @@ def send_message(session_id: str, body: ChatRequest):
 
 
 @router.post("/sessions/{session_id}/messages/stream")
-def send_message_stream(session_id: str, body: ChatRequest):
-    """Stream chat response via Server-Sent Events."""
+async def send_message_stream(session_id: str, body: ChatRequest):
+    """Stream chat response via Server-Sent Events.
+
+    Async end to end, so an open stream doesn't hold a threadpool worker.
+    """
 
-    def event_generator():
+    async def event_generator():
         try:
-            for event in chat_stream(
+            async for event in chat_stream(
                 session_id=session_id,
                 question=body.message.strip(),
                 top_k=body.top_k,
@@ -2,9 +2,13 @@ import logging
 
 from fastapi import APIRouter
 
-from app.core.embeddings import check_ollama_embeddings
+from app.core.embeddings import check_ollama_embeddings, get_embedding_cache
+from app.core.usage_tracker import get_usage_queue_stats
 from app.core.llm import check_groq, check_cerebras, check_openrouter, list_available_models, get_active_provider
 from app.core.vectorstore import get_chroma_client
+from app.retrieval.retriever import get_rerank_cache_stats, get_retrieval_cache_stats
+from app.services.prompt_budget import get_prompt_token_stats
+from app.services.speculation import get_speculation_stats
 from app.config import settings
 
 logger = logging.getLogger(__name__)
@@ -28,6 +32,7 @@ def health_check():
 
     # System is OK if embeddings work AND at least one cloud LLM is available
     llm_ok = groq_ok or cerebras_ok or openrouter_ok
+    embedding_cache = get_embedding_cache()
 
     return {
         "status": "ok" if (ollama_embed and llm_ok and chroma_ok) else "degraded",
@@ -37,6 +42,12 @@ def health_check():
         "openrouter": openrouter_ok,
         "active_provider": get_active_provider(),
         "chroma": chroma_ok,
+        "embedding_cache": embedding_cache.stats() if embedding_cache else None,
+        "rerank_cache": get_rerank_cache_stats(),
+        "retrieval_cache": get_retrieval_cache_stats(),
+        "speculation": get_speculation_stats(),
+        "prompt_tokens": get_prompt_token_stats(),
+        "usage_queue": get_usage_queue_stats(),
     }
 
 
@@ -64,8 +75,8 @@ def system_info():
                 {"name": "Ollama (Embeddings Only)", "description": f"Lokale Ollama wordt alleen gebruikt voor embeddings — niet voor LLM generatie (te traag op CPU)"},
                 {"name": "Ollama Embeddings", "description": f"Lokale embedding-engine ({settings.embedding_model}) voor vectorisatie", "model": settings.embedding_model},
                 {"name": "ChromaDB", "description": "Lokale vector database voor opslag en zoeken van document-chunks"},
-                {"name": "Cross-Encoder", "description": "Re-ranking model (ms-marco-MiniLM-L-6-v2) voor nauwkeurigere resultaten"},
-                {"name": "BM25", "description": "Keyword-gebaseerde zoekindex voor hybride retrieval (max 10.000 docs per zoekopdracht, Unicode-aware tokenisatie voor NL accenten)"},
+                {"name": "Cross-Encoder", "description": f"Re-ranking model ({settings.reranker_model.split('/')[-1]}) voor nauwkeurigere resultaten — backend: {settings.reranker_backend}"},
+                {"name": "BM25", "description": "Persistente, incrementeel bijgewerkte keyword-index per collectie voor hybride retrieval (postings, documentlengtes en document-frequenties in SQLite, Unicode-aware tokenisatie voor NL accenten)"},
             ],
         },
         "ingestion": {
@@ -76,7 +87,7 @@ def system_info():
                 {"step": 3, "name": "Deduplicatie Check", "description": "Content-hash (SHA256) wordt vergeleken met bestaande chunks in ChromaDB. Identieke bestanden worden overgeslagen met status 'duplicate' — voorkomt dubbele chunks bij herhaald uploaden"},
                 {"step": 4, "name": "Chunking", "description": f"Semantic chunking voor PDF en TXT: paragrafen worden geëmbed en gegroepeerd op cosine similarity (drempel {settings.semantic_similarity_threshold}). Bij hoge gelijkenis blijven alinea's bij elkaar, bij lage similarity wordt een chunk-grens geplaatst. Oversized groepen worden gesplitst via recursive fallback (~{settings.chunk_size} tekens, {settings.chunk_overlap} overlap). PDF-chunks krijgen automatisch paginanummer in metadata"},
                 {"step": 5, "name": "Contextual Headers", "description": "Elke chunk krijgt een verrijkte versie met bron, sectie, paginanummer header voor betere embeddings"},
-                {"step": 6, "name": "Batch Embedding", "description": f"Verrijkte tekst wordt gevectoriseerd met {settings.embedding_model} via Ollama (1024 dimensies, meertalig NL+EN). Native batch-embedding (50 teksten per call) voor snellere verwerking"},
+                {"step": 6, "name": "Batch Embedding", "description": f"Verrijkte tekst wordt gevectoriseerd met {settings.embedding_model} via Ollama (1024 dimensies, meertalig NL+EN). Native batch-embedding met adaptieve batchgrootte, meerdere batches tegelijk (max {settings.embedding_max_concurrency}) voor snellere verwerking"},
                 {"step": 7, "name": "Opslag", "description": "Platte tekst + vector + metadata worden opgeslagen in ChromaDB"},
             ],
             "supported_types": [
@@ -95,11 +106,11 @@ def system_info():
             "title": "Zoek & Retrieval Pipeline",
             "steps": [
                 {"step": 1, "name": "Semantisch Zoeken", "description": f"Vector similarity search in ChromaDB (top {settings.max_context_chunks} resultaten). Multi-query expansie genereert 3 alternatieve zoekformuleringen via LLM voor bredere retrieval — per agent configureerbaar (standaard aan)"},
-                {"step": 2, "name": "BM25 Keyword Search", "description": "Parallelle keyword-matching met BM25Okapi algoritme (max 10.000 documenten per zoekopdracht)"},
+                {"step": 2, "name": "BM25 Keyword Search", "description": "Parallelle keyword-matching met BM25 (Okapi) op de persistente index — gescoord als één sparse matrix-vector product (SciPy CSR) over alleen de postings van de zoektermen, geen limiet op collectiegrootte"},
                 {"step": 3, "name": "Reciprocal Rank Fusion (RRF)", "description": "Samenvoegen van semantische en keyword-resultaten met RRF (k=60) — documenten die in beide methoden hoog scoren worden geprioriteerd"},
                 {"step": 4, "name": "Cross-Encoder Re-ranking", "description": "Top-10 resultaten worden opnieuw gerankt met cross-encoder model (ms-marco-MiniLM-L-6-v2) voor betere precisie"},
                 {"step": 5, "name": "Threshold Filtering", "description": f"Alleen chunks met cosine distance <= {settings.similarity_threshold} worden behouden. Fallback: top 3 als niets de drempel haalt"},
-                {"step": 6, "name": "Neighbor Expansion", "description": "Top 3 chunks worden uitgebreid met aangrenzende chunks (±1) uit hetzelfde document voor bredere context"},
+                {"step": 6, "name": "Neighbor Expansion", "description": f"Top 3 chunks worden uitgebreid met aangrenzende chunks (±{settings.neighbor_window}, per agent instelbaar) uit hetzelfde document voor bredere context. Buur-ID's worden direct afgeleid ({{document_id}}_chunk_{{i}}) en per collectie in één ChromaDB-call opgehaald"},
             ],
             "settings": {
                 "top_k": settings.top_k,
@@ -115,20 +126,22 @@ def system_info():
                 {"name": "Inline bronverwijzingen", "description": "Elk antwoord bevat [1], [2] etc. citaties die verwijzen naar specifieke bronpassages"},
                 {"name": "Anti-hallucinatie regels", "description": "Expliciete instructies om ontbrekende informatie te benoemen i.p.v. te verzinnen"},
                 {"name": "Temperatuur 0.3", "description": "Lage temperatuur voor feitelijke, consistente antwoorden (configureerbaar per agent)"},
-                {"name": "Gespreksgeheugen", "description": f"Chat-modus onthoudt eerdere berichten, met gecachte samenvatting na {settings.summarize_after_messages} berichten (hergebruikt cache, alleen elke 10 berichten opnieuw samengevat)"},
+                {"name": "Gespreksgeheugen", "description": f"Chat-modus onthoudt eerdere berichten, met een doorlopende samenvatting na {settings.summarize_after_messages} berichten die na de beurt op de achtergrond wordt bijgewerkt"},
                 {"name": "Follow-up suggesties", "description": "Elk antwoord eindigt met 3 relevante vervolgvragen"},
             ],
         },
         "chat": {
             "title": "Chat Functies",
             "features": [
-                {"name": "Sessie Management", "description": "Meerdere gesprekken opslaan en laden, automatische titels via LLM (eerste bericht → 6-woorden titel)"},
-                {"name": "Smart History", "description": f"Laatste 6 berichten worden volledig meegestuurd, oudere berichten worden samengevat (na {settings.summarize_after_messages} berichten). Samenvatting wordt gecacht en alleen elke 10 nieuwe berichten vernieuwd — bespaart ~90% tokens bij lange gesprekken"},
+                {"name": "Sessie Zoeken", "description": "Zoeken in gesprekken via een SQLite FTS5-index op berichten en titels (unicode61 zonder accenten: 'creme' vindt 'crème'), bijgehouden met triggers. Resultaten zijn gerangschikt op BM25 (titeltreffers tellen dubbel), het laatste woord matcht als prefix tijdens het typen, en elk resultaat toont een fragment met de gevonden woorden gemarkeerd. Zoekresultaten en de gesprekkenlijst worden gepagineerd met een cursor (\"Meer laden\")"},
+                {"name": "Sessie Management", "description": "Meerdere gesprekken opslaan en laden, automatische titels via LLM (eerste bericht → 6-woorden titel). Een chatbeurt (vraag, antwoord, bronnen, updated_at en titel) wordt in één transactie opgeslagen via record_turn(); de titel wordt parallel aan het antwoord gegenereerd op een eigen kleine threadpool (los van de chat-pipeline), en samenvattingen of te laat klaargekomen titels worden door een achtergrond-writer weggeschreven. Aantal berichten en een preview van het laatste bericht staan op de sessie zelf (bijgehouden met triggers), en de zijbalk pagineert met een keyset-cursor op (updated_at, id): elke pagina kost een index-seek, ongeacht het aantal gesprekken"},
+                {"name": "Smart History", "description": f"Laatste 6 berichten worden volledig meegestuurd, oudere berichten worden samengevat (na {settings.summarize_after_messages} berichten) — bespaart ~90% tokens bij lange gesprekken. De samenvatting is incrementeel: zodra 10 berichten uit het venster zijn geschoven, vouwt een achtergrondworker ({settings.summary_max_workers} threads) alleen die nieuwe berichten in de vorige samenvatting, na afloop van de beurt. Een beurt wacht dus nooit op een LLM-samenvatting; berichten die nog niet zijn verwerkt krijgen een eenvoudige extractieve samenvatting (de gestelde vragen). Per beurt worden sessie, aantal berichten, de laatste berichten (zonder bronnen) en de gecachte samenvatting in één query geladen via get_turn_context(); oudere berichten leest alleen de achtergrondworker, en bronnen worden alleen gedecodeerd als de geschiedenis ze opvraagt"},
                 {"name": "Agent Modus", "description": "Gespecialiseerde AI-assistenten met eigen system prompt, collectie-scoping, temperatuur, top_k en multi-query instellingen. Multi-query genereert 3 alternatieve zoekformuleringen per vraag voor bredere retrieval (per agent aan/uit schakelbaar)"},
-                {"name": "Streaming", "description": "Real-time token-voor-token antwoorden via Server-Sent Events (SSE)"},
+                {"name": "Streaming", "description": f"Real-time token-voor-token antwoorden via Server-Sent Events (SSE). De chat-stream is volledig async: LLM-tokens komen via async Groq/httpx-clients (gedeelde connection pool, max {settings.llm_max_connections}) en blokkerende stappen (retrieval, BM25, re-ranking, SQLite) draaien op een begrensde pool van {settings.chat_pipeline_max_workers} threads. Een open SSE-verbinding bezet dus geen threadpool-worker; scripts/loadtest_chat_stream.py toont honderden gelijktijdige streams op een threadpool van 8"},
+                {"name": "Prompt Token Budget", "description": f"De prompt wordt per beurt opgebouwd binnen een tokenbudget per provider (geteld met tiktoken): het kleinste budget van de providers die de fallback-keten nog kan bereiken, zodat een fallback nooit op een te lange context stukloopt. System prompt en vraag gaan altijd volledig mee, de geschiedenis krijgt maximaal {settings.prompt_history_share:.0%} (meest recente deel), daarna vullen bijlage- en kennisbankpassages de rest op volgorde van ranking: de passage die niet meer past wordt ingekort, lager gerangschikte vallen weg. De tokenverdeling per beurt staat in de log en het done-event, totalen in /health"},
                 {"name": "Feedback", "description": "Duim omhoog/omlaag per antwoord voor kwaliteitstracking"},
                 {"name": "Export", "description": "Gesprekken exporteren als Markdown bestand"},
-                {"name": "Analytics Dashboard", "description": "Gebruiksstatistieken: totaal sessies/berichten, feedback-scores, dagelijks gebruik, top-vragen, agent-gebruik en LLM kosten-tracking per provider (Groq/Cerebras/OpenRouter) inclusief streaming-calls"},
+                {"name": "Analytics Dashboard", "description": "Gebruiksstatistieken: totaal sessies/berichten, feedback-scores, dagelijks gebruik, top-vragen, agent-gebruik en LLM kosten-tracking per provider (Groq/Cerebras/OpenRouter) inclusief streaming-calls. De tellers (totalen, berichten per dag, genormaliseerde top-vragen, sessies per agent, feedback) worden bijgewerkt in dezelfde transactie als de chatbeurt, zodat het dashboard geen volledige tabelscans meer doet"},
                 {"name": "YouTube Transcripties", "description": "YouTube URLs worden verwerkt via de YouTube Transcript API (niet via Whisper) — sneller en gratis"},
                 {"name": "Collection Cleanup", "description": "Micro-chunks (< 50 tekens) kunnen per collectie worden opgeruimd via de cleanup endpoint"},
                 {"name": "Mappensysteem", "description": "Documenten organiseren in mappen en submappen binnen collecties. Mappen aanmaken, hernoemen, verwijderen en documenten verplaatsen via drag-and-drop. Breadcrumb-navigatie voor mappenstructuur. Mappen worden opgeslagen in SQLite — ChromaDB chunks blijven ongewijzigd, waardoor verplaatsingen instant zijn."},
@@ -150,14 +163,15 @@ def system_info():
                 {"name": "Upload Limiet", "description": f"Bestanden groter dan {settings.max_file_size_mb} MB worden geweigerd vóór verwerking om geheugen- en opslagmisbruik te voorkomen"},
                 {"name": "CORS Restrictie", "description": "Alleen verzoeken van rag.evotiondata.com en localhost worden geaccepteerd met beperkte HTTP-methoden (GET/POST/PUT/DELETE/OPTIONS) en headers (Content-Type/Authorization)"},
                 {"name": "Embedding Dimensie-check", "description": "Fallback naar sentence-transformers (384-dim) wordt geblokkeerd als de collectie 1024-dim vectors verwacht — voorkomt ChromaDB-fouten"},
-                {"name": "Batch Embedding", "description": "Ollama embed() API met native batch-input (max 50 teksten per call) i.p.v. one-by-one — aanzienlijk snellere ingestie bij grote documenten"},
+                {"name": "Batch Embedding", "description": f"Ollama embed() API met native batch-input i.p.v. one-by-one. Grote jobs sturen tot {settings.embedding_max_concurrency} batches tegelijk via een async client; de batchgrootte (8-256 teksten) past zich aan op de gemeten latency (doel {settings.embedding_target_batch_seconds}s per batch) en payload — bijna lineaire versnelling tot Ollama verzadigd is"},
+                {"name": "Embedding Cache", "description": f"Embeddings worden gecachet op (model, sha256 van de tekst) als float32 in embedding_cache.db, met een in-memory LRU ({settings.embedding_cache_memory_items} vectoren) ervoor. Alleen cache-misses gaan naar Ollama — ongewijzigde chunks bij her-ingestie en herhaalde zoekvragen worden niet opnieuw ge-embed. Schijfcache is begrensd op {settings.embedding_cache_max_mb} MB (oudste entries worden verwijderd)"},
                 {"name": "Triple-Provider Failover", "description": "Automatische fallback: Groq → Cerebras → OpenRouter. Als alle cloud-providers falen (rate limit), krijgt de gebruiker een duidelijke foutmelding i.p.v. een eindeloos wachtende Ollama-request"},
                 {"name": "Collectienaam Validatie", "description": "Alle collectie-endpoints valideren namen op alfanumerieke tekens, streepjes en underscores (1-64 chars, moet starten met alfanumeriek)"},
                 {"name": "Auth Startup Check", "description": "Server weigert te starten als AUTH_ENABLED=true maar AUTH_TOKEN leeg is — voorkomt onbeveiligde API"},
                 {"name": "API Timeouts", "description": f"Groq: 60s, Cerebras: {settings.cerebras_timeout}s, OpenRouter: {settings.openrouter_timeout}s, Ollama embeddings: 120s — voorkomt hangende requests"},
-                {"name": "Embedding Retry", "description": "Batch-embedding probeert tot 3× met exponentiële backoff (1s, 2s, 4s) bij timeout of connectiefouten — voorkomt falen bij tijdelijke Ollama-overbelasting (bijv. tijdens startup)"},
-                {"name": "Database Connection Management", "description": "Context managers (with-statement) garanderen dat SQLite-connecties altijd worden gesloten, ook bij fouten"},
-                {"name": "BM25 Memory Cap", "description": "Maximum 10.000 documenten per BM25-zoekopdracht om geheugenoverloop te voorkomen bij grote collecties"},
+                {"name": "Embedding Retry", "description": "Batch-embedding probeert tot 3× met exponentiële backoff met jitter (~1s, 2s, 4s) bij timeout of connectiefouten; mislukte batches worden gehalveerd — voorkomt falen bij tijdelijke Ollama-overbelasting (bijv. tijdens startup)"},
+                {"name": "Database Connection Management", "description": f"chat.db gebruikt één herbruikbare SQLite-connectie per thread, gedeeld door chat-database en usage tracking: PRAGMA's (WAL, synchronous=NORMAL, mmap {settings.sqlite_mmap_size_mb} MB, cache {settings.sqlite_cache_size_mb} MB) worden eenmalig ingesteld en prepared statements blijven gecachet. Een niet-afgeronde transactie wordt na elke aanroep teruggedraaid; bij shutdown worden alle connecties gesloten"},
+                {"name": "BM25 Index Sync", "description": "De BM25-index wordt bijgewerkt bij ingestion en verwijdering; ontbreekt de index of loopt het aantal chunks uit de pas met ChromaDB, dan wordt hij automatisch opnieuw opgebouwd"},
                 {"name": "SSE Error Handling", "description": "Streaming responses sturen een error-event naar de client bij onverwachte fouten in plaats van stil te crashen"},
                 {"name": "Thread-Safe Singletons", "description": "Alle lazy-loaded clients (Groq, Cerebras, OpenRouter, Ollama, embeddings, cross-encoder) gebruiken double-check locking om race conditions bij concurrent requests te voorkomen"},
                 {"name": "Query Parameter Limieten", "description": "Alle paginatie-parameters zijn geclampt: sessies max 500, chunks max 500, cleanup min_chars 0-10.000 — voorkomt resource exhaustion via onbegrensde queries"},
@@ -165,20 +179,27 @@ def system_info():
                 {"name": "Non-Root Container", "description": "Docker container draait als appuser (UID 1000) in plaats van root — beperkt impact van container-escapes"},
                 {"name": "Zero-Cost Health Checks", "description": "Health checks gebruiken models.list() in plaats van chat completions — kost geen API-quota (voorheen ~2880 Groq-requests/dag)"},
                 {"name": "Per-Response Provider Tracking", "description": "Elke streaming response bevat in het 'done' event de daadwerkelijk gebruikte LLM provider — UI toont dit als label onder elk antwoord. Elke API-call wordt in de usage database opgeslagen met provider label (groq/cerebras/openrouter) voor per-provider kostenanalyse"},
+                {"name": "Usage Write-Behind", "description": f"Usage-logging in het LLM-pad zet alleen een rij in een wachtrij; een aparte writer-thread schrijft de rijen gebundeld weg (elke {settings.usage_flush_interval_ms} ms of per {settings.usage_batch_size} rijen, in één transactie). Bij een volle wachtrij ({settings.usage_queue_max_rows} rijen) schrijft de aanroeper zelf (backpressure); bij shutdown wordt de wachtrij leeggeschreven. Tellers staan in /health"},
+                {"name": "Usage Rollups", "description": f"Elke batch usage-rijen werkt in dezelfde transactie dagtotalen per provider × model × type bij (usage_daily). Het usage-dashboard leest alleen deze rollups i.p.v. de ruwe tabel te scannen; ruwe rijen ouder dan {settings.usage_raw_retention_days} dagen worden dagelijks opgeruimd zonder dat totalen veranderen"},
                 {"name": "RRF Score Blending", "description": "Reciprocal Rank Fusion gebruikt gewogen gemiddelde (40% origineel + 60% RRF positie) voor nauwkeurigere relevantie-scores"},
                 {"name": "SSRF Redirect Validatie", "description": "Na HTTP-redirects wordt het eindpunt opnieuw gevalideerd tegen private IP-adressen — voorkomt SSRF bypass via open-redirect chains"},
                 {"name": "Chat History Truncatie", "description": "Lange assistant-antwoorden in gesprekshistorie worden afgekapt op 800 tekens — gebalanceerde kwaliteit vs. efficiëntie (volledige document-context blijft ongewijzigd op 15 chunks × 1000 chars)"},
                 {"name": "Gecachte Samenvatting", "description": "Conversatie-samenvattingen worden opgeslagen in session metadata en pas elke 10 nieuwe berichten vernieuwd — bespaart ~90% tokens bij lange gesprekken (voorheen: elke bericht opnieuw samengevat)"},
                 {"name": "Rate Limit Memory Cleanup", "description": "Verlopen IP-entries worden automatisch opgeruimd uit de rate limit store — voorkomt geheugengroei bij langdurige uptime"},
                 {"name": "XSS Sanitatie", "description": "Alle LLM-gegenereerde markdown wordt gesaniteerd met DOMPurify voordat het in de DOM wordt geplaatst. Bij CDN-uitval (DOMPurify niet geladen) wordt veilig gefallbackt naar escapeHtml() i.p.v. ruwe HTML — voorkomt XSS via geïnjecteerde HTML/scripts in documenten"},
-                {"name": "HTML→Markdown Conversie", "description": "HTML tags in LLM-output worden driedubbel gefilterd: (1) system prompt verbiedt HTML, (2) server-side _clean_llm_output() converteert HTML→Markdown (strong→**, li→-, p→paragraaf) en stuurt schone 'content' SSE events, (3) client-side stripHtmlToMarkdown() past dezelfde regex-keten toe als extra vangnet — ook bij incomplete streaming HTML en entity-encoded tags"},
+                {"name": "HTML→Markdown Conversie", "description": "HTML tags in LLM-output worden driedubbel gefilterd: (1) system prompt verbiedt HTML, (2) server-side clean_llm_output() converteert HTML→Markdown (strong→**, li→-, p→paragraaf) in één scan over alle tags met voorgecompileerde patronen i.p.v. een keten van regex-vervangingen — uitvoer identiek aan de oude keten, gecontroleerd op een golden corpus van opgenomen antwoorden; tijdens streaming doet StreamingCleaner dit incrementeel — afgeronde alinea's worden één keer opgeschoond en bevroren, alleen de onafgeronde staart wordt opnieuw verwerkt — en stuurt alleen 'delta' SSE events (offset + nieuwe tekst) met af en toe een volledige 'content' resync, (3) client-side stripHtmlToMarkdown() past dezelfde regex-keten toe als extra vangnet — ook bij incomplete streaming HTML en entity-encoded tags"},
                 {"name": "SSE Foutbestendigheid", "description": "JSON.parse in de SSE-streamlezer is gewrapped in try/catch — malformed events worden overgeslagen i.p.v. de hele UI te crashen"},
                 {"name": "Auth Bypass Preventie", "description": "Bij onbereikbare server wordt de login-scherm getoond met foutmelding i.p.v. de app zonder authenticatie te tonen"},
                 {"name": "Upload Pre-Check", "description": "Bestandsgrootte wordt gecontroleerd via Content-Length header vóór het inlezen in geheugen — voorkomt OOM bij grote uploads"},
                 {"name": "Graceful OCR Degradatie", "description": "ImageProcessor wordt alleen geregistreerd als easyocr daadwerkelijk geïnstalleerd is — geen crash bij ontbrekende dependency"},
                 {"name": "Meertalig Embedding Model", "description": f"bge-m3 (1024-dim) via Ollama — specifiek geoptimaliseerd voor meertalige retrieval (NL+EN). Scoort top op MTEB benchmarks voor cross-language zoeken"},
                 {"name": "Semantic Chunking", "description": f"PDF en TXT bestanden worden gechunkt op basis van semantische gelijkenis (cosine similarity drempel {settings.semantic_similarity_threshold}). Opeenvolgende alinea's met hoge gelijkenis blijven in dezelfde chunk. Oversized groepen worden gesplitst via recursive fallback. Safeguard: documenten met >500 paragrafen vallen automatisch terug op recursive chunker om excessieve embedding-calls te voorkomen. Resultaat: chunks die inhoudelijk bij elkaar horen i.p.v. arbitraire lengte-grenzen"},
-                {"name": "Per-Agent Multi-Query", "description": "Multi-query expansie genereert 3 alternatieve formuleringen van de vraag via LLM, waardoor meer relevante chunks worden gevonden. Per agent configureerbaar via toggle in de agent-instellingen (standaard aan). Voegt ~1-2s latentie toe maar verbetert retrieval-kwaliteit significant"},
+                {"name": "Per-Agent Multi-Query", "description": f"Multi-query expansie genereert 3 alternatieve formuleringen van de vraag via LLM, waardoor meer relevante chunks worden gevonden. Per agent configureerbaar via toggle in de agent-instellingen (standaard aan). De LLM-call draait parallel met het zoeken op de originele vraag en wordt gecachet per genormaliseerde vraag (TTL {settings.multi_query_cache_ttl_seconds // 60} min); na {settings.multi_query_budget_seconds}s gaat retrieval zonder alternatieven verder"},
+                {"name": "ONNX Re-ranking", "description": f"Cross-encoder kan draaien als int8-gekwantiseerd ONNX-model via ONNX Runtime (RERANKER_BACKEND=onnx) i.p.v. PyTorch — meerdere keren sneller op CPU. (query, passage)-paren worden op lengte gesorteerd en per batch ({settings.reranker_batch_size}) alleen tot de langste in die batch gepad; max {settings.reranker_max_length} tokens per paar. Valt terug op sentence-transformers als het ONNX-model niet laadt"},
+                {"name": "Retrieval Cache", "description": f"Volledige retrieval-resultaten worden gecachet per (genormaliseerde vraag, collecties, top_k, opties) — max {settings.retrieval_cache_max_mb} MB, TTL {settings.retrieval_cache_ttl_seconds // 60} min. Elke upload, verwijdering, cleanup of verwijderde collectie verhoogt een generatieteller per collectie, waardoor verouderde resultaten direct niet meer matchen. Uit te zetten per query met use_cache=false"},
+                {"name": "Gefaseerde Retrieval", "description": "In de chat-stream worden de semantische treffers op de originele vraag direct als voorlopige bronnen verstuurd (extra 'sources' event), nog vóór multi-query, BM25, re-ranking en neighbor-expansie. Daarna volgt het definitieve 'sources' event met de herrangschikte top-k. De gespreksgeschiedenis (incl. samenvatting) wordt parallel aan de retrieval opgebouwd, zodat de prompt klaarstaat zodra de bronnen definitief zijn"},
+                {"name": "Speculatieve Generatie", "description": f"Optioneel ({'aan' if settings.speculative_generation_enabled else 'uit'}): het LLM begint al te genereren op de voorlopige semantische treffers terwijl BM25 en re-ranking nog lopen. Tokens worden gebufferd; als minstens {settings.speculative_overlap_threshold:.0%} van de definitieve top-k al in de prompt zat wordt het antwoord behouden (met de voorlopige passages als bronnen), anders afgebroken en opnieuw gestart. Behouden/herstart-ratio en overlap-histogram in /health"},
+                {"name": "Rerank Score Cache", "description": f"Cross-encoder scores worden gecachet per (genormaliseerde query, chunk-id) — LRU van {settings.rerank_cache_size} scores, TTL {settings.rerank_cache_ttl_seconds // 60} min. Vervolgvragen die dezelfde chunks ophalen scoren alleen nieuwe paren. Hit-rate zichtbaar in /health"},
                 {"name": "Performance-Optimized Pipeline", "description": "Cross-encoder beperkt tot top 10 (i.p.v. 30), neighbor expansion beperkt tot top 3 (i.p.v. 5), context chunks verlaagd naar 15, cross-encoder wordt bij startup voorgeladen (i.p.v. lazy-load bij eerste query) — geoptimaliseerde response tijd"},
                 {"name": "API Docs Uitgeschakeld", "description": "Swagger UI (/docs), ReDoc (/redoc) en OpenAPI schema (/openapi.json) zijn uitgeschakeld in productie — voorkomt volledige API-reconnaissance door aanvallers"},
                 {"name": "Content Security Policy", "description": "Strikte CSP header beperkt script-bronnen tot 'self' + gepinde CDN's (jsdelivr, cloudflare), blokkeert inline scripts, connect-src beperkt tot 'self' + CDN (source maps), frame-ancestors 'none' — voorkomt XSS payload execution zelfs bij geïnjecteerde HTML"},
@@ -209,7 +230,7 @@ def system_info():
                 "Groq Model": settings.groq_model,
                 "Cerebras Model (Fallback 1)": settings.cerebras_model,
                 "OpenRouter Model (Fallback 2)": settings.openrouter_model,
-                "Embedding Model": f"{settings.embedding_model} (1024-dim, meertalig NL+EN, via Ollama, batch 50)",
+                "Embedding Model": f"{settings.embedding_model} (1024-dim, meertalig NL+EN, via Ollama, adaptieve batches, {settings.embedding_max_concurrency} parallel)",
                 "Chunk Size": f"{settings.chunk_size} tekens",
                 "Chunk Overlap": f"{settings.chunk_overlap} tekens",
                 "Top K (standaard)": settings.top_k,
@@ -224,7 +245,8 @@ def system_info():
                 "OpenRouter Timeout": f"{settings.openrouter_timeout} seconden",
                 "Ollama Embedding Timeout": "120 seconden (3x retry met exponentiële backoff)",
                 "Max Output Tokens": "2048",
-                "BM25 Max Documents": "10.000",
+                "Prompt Token Budget": f"Groq {settings.groq_prompt_token_budget}, Cerebras {settings.cerebras_prompt_token_budget}, OpenRouter {settings.openrouter_prompt_token_budget} tokens (kleinste bereikbare provider geldt; max {settings.prompt_history_share:.0%} voor geschiedenis)",
+                "BM25 Index": "Persistent (bm25.db), incrementeel bijgewerkt",
                 "Upload Rate Limit": "10 uploads/minuut per IP",
                 "Circuit Breaker Threshold": "3 fouten → 60s cooldown",
                 "Docker CPU Limit": "2 cores (reservering: 0.5)",
@@ -9,23 +9,47 @@ class Settings(BaseSettings):
     # Groq (primary LLM)
     groq_api_key: str = ""
     groq_model: str = "llama-3.3-70b-versatile"
+    groq_prompt_token_budget: int = 9000  # Free tier allows 12k tokens/min, including the 2048-token answer
 
     # Cerebras (secondary cloud fallback — fast & free)
     cerebras_api_key: str = ""
     cerebras_model: str = "gpt-oss-120b"
     cerebras_timeout: int = 60
+    cerebras_base_url: str = "https://api.cerebras.ai/v1"
+    cerebras_prompt_token_budget: int = 24000
 
     # OpenRouter (tertiary cloud fallback)
     openrouter_api_key: str = ""
     openrouter_model: str = "google/gemma-3-27b-it:free"
     openrouter_timeout: int = 60
+    openrouter_base_url: str = "https://openrouter.ai/api/v1"
+    openrouter_prompt_token_budget: int = 24000
 
     # Ollama (embeddings only — generation is handled by cloud providers)
     ollama_base_url: str = "http://localhost:11434"
     embedding_model: str = "bge-m3"
 
+    # Embedding cache (keyed by model + sha256 of the text)
+    embedding_cache_enabled: bool = True
+    embedding_cache_memory_items: int = 5000  # In-memory LRU tier (~4 KB per 1024-dim vector)
+    embedding_cache_max_mb: int = 1024  # On-disk size before least recently used entries are evicted
+
+    # Embedding dispatch (batches pipelined to Ollama)
+    embedding_max_concurrency: int = 4  # Batches in flight at once; 1 = sequential
+    embedding_target_batch_seconds: float = 2.0  # Adaptive batch sizing aims for this latency per batch
+    embedding_max_batch_chars: int = 200_000  # Payload cap per batch
+
     # LLM provider: "groq" (primary)
     llm_provider: str = "groq"
+    llm_max_connections: int = 100  # Pooled async HTTP connections for streaming chat
+
+    # Chat database (SQLite, per-thread pooled connections)
+    sqlite_mmap_size_mb: int = 256  # Memory-mapped I/O for reads
+    sqlite_cache_size_mb: int = 16  # Page cache per connection
+    usage_flush_interval_ms: int = 500  # Usage rows are written in batches at most this late
+    usage_batch_size: int = 200  # ...or as soon as this many rows are queued
+    usage_queue_max_rows: int = 10000  # Beyond this, callers write their usage row themselves
+    usage_raw_retention_days: int = 90  # Raw usage rows older than this are deleted (daily rollups stay); 0 = keep
 
     # ChromaDB
     chroma_persist_dir: str = "./data/chroma_db"
@@ -43,11 +67,35 @@ class Settings(BaseSettings):
     top_k: int = 15
     max_top_k: int = 50
     similarity_threshold: float = 0.65
+    neighbor_window: int = 1  # Chunks on each side merged into top results (agents can override)
+    retrieval_max_workers: int = 4  # Concurrent per-collection Chroma queries
+    retrieval_cache_enabled: bool = True  # Cache retrieve() results until a searched collection changes
+    retrieval_cache_max_mb: int = 64
+    retrieval_cache_ttl_seconds: int = 600
+    multi_query_budget_seconds: float = 2.0  # Max wait for LLM query alternatives, from retrieval start
+    multi_query_cache_size: int = 2000
+    multi_query_cache_ttl_seconds: int = 3600
+
+    # Re-ranking (cross-encoder)
+    reranker_model: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    reranker_backend: str = "torch"  # "torch" (sentence-transformers) or "onnx" (ONNX Runtime)
+    reranker_onnx_file: str = "onnx/model_quint8_avx2.onnx"  # File in the model repo, or a local .onnx path
+    reranker_max_length: int = 512  # Max tokens per (query, passage) pair
+    reranker_batch_size: int = 16
+    reranker_threads: int = 0  # Inference threads; 0 = library default
+    rerank_cache_size: int = 20000  # Cached (query, chunk) cross-encoder scores
+    rerank_cache_ttl_seconds: int = 3600
 
     # Chat
     max_context_chunks: int = 15
     max_history_messages: int = 20
     summarize_after_messages: int = 20
+    chat_pipeline_max_workers: int = 8  # Threads for blocking chat steps (retrieval, BM25, rerank, SQLite)
+    summary_max_workers: int = 2  # Background threads that fold aged-out messages into session summaries
+    title_max_workers: int = 2  # Threads for new-session title LLM calls, apart from the chat pipeline
+    prompt_history_share: float = 0.3  # Max share of the prompt token budget for conversation history
+    speculative_generation_enabled: bool = False  # Start the answer on semantic-only hits while re-ranking runs
+    speculative_overlap_threshold: float = 0.8  # Min share of the final top-k already in the speculative prompt
 
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
 
@@ -1,35 +1,26 @@
+import base64
+import hashlib
 import json
 import logging
+import queue
+import re
 import sqlite3
+import threading
 import uuid
-from contextlib import contextmanager
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 
 from app.config import settings
+from app.core import sqlite_pool
 
 logger = logging.getLogger(__name__)
 
 DB_PATH = Path(settings.chroma_persist_dir).parent / "chat.db"
 
 
-def _get_conn() -> sqlite3.Connection:
-    DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.connect(str(DB_PATH))
-    conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA journal_mode=WAL")
-    conn.execute("PRAGMA foreign_keys=ON")
-    return conn
-
-
-@contextmanager
 def _conn():
-    """Context manager that guarantees connection cleanup."""
-    conn = _get_conn()
-    try:
-        yield conn
-    finally:
-        conn.close()
+    """This thread's pooled chat.db connection (see app.core.sqlite_pool)."""
+    return sqlite_pool.connection(DB_PATH)
 
 
 def init_db():
@@ -55,7 +46,7 @@ def init_db():
             );
 
             CREATE INDEX IF NOT EXISTS idx_messages_session ON messages(session_id);
-            CREATE INDEX IF NOT EXISTS idx_sessions_updated ON sessions(updated_at DESC);
+            CREATE INDEX IF NOT EXISTS idx_sessions_recent ON sessions(updated_at DESC, id DESC);
 
             CREATE TABLE IF NOT EXISTS agents (
                 id TEXT PRIMARY KEY,
@@ -123,6 +114,67 @@ def init_db():
         except Exception:
             pass  # Column already exists
 
+        # Migration: add neighbor_window to agents
+        try:
+            conn.execute("ALTER TABLE agents ADD COLUMN neighbor_window INTEGER DEFAULT 1")
+        except Exception:
+            pass  # Column already exists
+
+        # Migration: materialized analytics counters, backfilled once for existing databases
+        has_analytics = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'analytics_counters'"
+        ).fetchone()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS analytics_counters (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL DEFAULT 0
+            ) WITHOUT ROWID;
+
+            CREATE TABLE IF NOT EXISTS analytics_daily_messages (
+                day TEXT PRIMARY KEY,
+                count INTEGER NOT NULL DEFAULT 0
+            ) WITHOUT ROWID;
+
+            CREATE TABLE IF NOT EXISTS analytics_questions (
+                hash TEXT PRIMARY KEY,
+                question TEXT NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0
+            );
+
+            CREATE INDEX IF NOT EXISTS idx_analytics_questions_count ON analytics_questions(count DESC);
+
+            CREATE TABLE IF NOT EXISTS analytics_agent_sessions (
+                agent_id TEXT PRIMARY KEY,
+                count INTEGER NOT NULL DEFAULT 0
+            ) WITHOUT ROWID;
+        """)
+        if not has_analytics:
+            _rebuild_analytics(conn)
+
+        # Migration: message_count and last_message_preview on sessions, kept current by triggers
+        conn.execute("DROP INDEX IF EXISTS idx_sessions_updated")  # Superseded by idx_sessions_recent
+        try:
+            conn.execute("ALTER TABLE sessions ADD COLUMN message_count INTEGER NOT NULL DEFAULT 0")
+            conn.execute("ALTER TABLE sessions ADD COLUMN last_message_preview TEXT DEFAULT NULL")
+            backfill_stats = True
+        except Exception:
+            backfill_stats = False  # Columns already exist
+        conn.executescript(_SESSION_STATS_SCHEMA)
+        if backfill_stats:
+            _rebuild_session_stats(conn)
+
+        # Migration: FTS5 search over message content and session titles
+        has_search = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'messages_fts'"
+        ).fetchone()
+        try:
+            conn.executescript(_SEARCH_SCHEMA)
+        except sqlite3.OperationalError as e:
+            logger.warning(f"FTS5 not available, session search falls back to LIKE: {e}")
+        else:
+            if not has_search:
+                _rebuild_search_index(conn)
+
         conn.commit()
 
 
@@ -136,21 +188,86 @@ def create_session(title: str = "Nieuwe chat", collection: str | None = None, ag
             "INSERT INTO sessions (id, title, created_at, updated_at, collection, agent_id) VALUES (?, ?, ?, ?, ?, ?)",
             (session_id, title, now, now, collection, agent_id),
         )
+        _count_session(conn, agent_id, 1)
         conn.commit()
         return {"id": session_id, "title": title, "created_at": now, "collection": collection, "agent_id": agent_id}
 
 
-def list_sessions(limit: int = 50) -> list[dict]:
+def list_sessions(limit: int = 50, cursor: str | None = None) -> list[dict]:
+    """Most recently updated sessions first; pass page_cursor() of the last one for the next page."""
     with _conn() as conn:
-        rows = conn.execute(
-            "SELECT s.*, COUNT(m.id) as message_count FROM sessions s "
-            "LEFT JOIN messages m ON m.session_id = s.id "
-            "GROUP BY s.id ORDER BY s.updated_at DESC LIMIT ?",
-            (limit,),
-        ).fetchall()
+        if cursor:
+            updated_at, session_id = _decode_cursor(cursor)
+            rows = conn.execute(
+                "SELECT * FROM sessions WHERE (updated_at, id) < (?, ?) "
+                "ORDER BY updated_at DESC, id DESC LIMIT ?",
+                (updated_at, session_id, limit),
+            ).fetchall()
+        else:
+            rows = conn.execute(
+                "SELECT * FROM sessions ORDER BY updated_at DESC, id DESC LIMIT ?", (limit,)
+            ).fetchall()
         return [dict(r) for r in rows]
 
 
+def page_cursor(session: dict) -> str:
+    """Opaque cursor for the page after *session* from list_sessions or search_sessions.
+
+    The key is (updated_at, id), or (rank, id) for ranked search results, so a
+    page costs an index seek no matter how many sessions come before it.
+    """
+    key = [session["rank"] if "rank" in session else session["updated_at"], session["id"]]
+    return base64.urlsafe_b64encode(json.dumps(key).encode("utf-8")).decode("ascii")
+
+
+def _decode_cursor(cursor: str) -> tuple:
+    """The (updated_at or rank, id) key of a page_cursor(); ValueError for anything SQLite cannot compare."""
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except ValueError:  # Also covers binascii.Error and UnicodeError
+        key = None
+    if not (isinstance(key, list) and len(key) == 2 and isinstance(key[1], str)
+            and isinstance(key[0], (str, int, float)) and not isinstance(key[0], bool)):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return key[0], key[1]
+
+
+# A session's message_count and last_message_preview follow its messages in the
+# same transaction as the insert or delete, so the sidebar reads one row per
+# session instead of counting messages.
+_SESSION_STATS_SCHEMA = """
+    CREATE INDEX IF NOT EXISTS idx_messages_session_created ON messages(session_id, created_at);
+
+    CREATE TRIGGER IF NOT EXISTS sessions_stats_insert AFTER INSERT ON messages BEGIN
+        UPDATE sessions
+        SET message_count = message_count + 1,
+            last_message_preview = substr(replace(new.content, char(10), ' '), 1, 120)
+        WHERE id = new.session_id;
+    END;
+    CREATE TRIGGER IF NOT EXISTS sessions_stats_delete AFTER DELETE ON messages BEGIN
+        UPDATE sessions
+        SET message_count = message_count - 1,
+            last_message_preview = (
+                SELECT substr(replace(content, char(10), ' '), 1, 120) FROM messages
+                WHERE session_id = old.session_id ORDER BY created_at DESC LIMIT 1
+            )
+        WHERE id = old.session_id;
+    END;
+"""
+
+
+def _rebuild_session_stats(conn):
+    """Recompute message_count and last_message_preview for every session."""
+    conn.execute("""
+        UPDATE sessions SET
+            message_count = (SELECT COUNT(*) FROM messages WHERE session_id = sessions.id),
+            last_message_preview = (
+                SELECT substr(replace(content, char(10), ' '), 1, 120) FROM messages
+                WHERE session_id = sessions.id ORDER BY created_at DESC LIMIT 1
+            )
+    """)
+
+
 def get_session(session_id: str) -> dict | None:
     with _conn() as conn:
         row = conn.execute("SELECT * FROM sessions WHERE id = ?", (session_id,)).fetchone()
@@ -183,6 +300,7 @@ def update_session_metadata(session_id: str, metadata: dict):
     """Update session metadata (merges with existing)."""
     with _conn() as conn:
         existing = {}
+        conn.execute("BEGIN IMMEDIATE")  # Read-merge-write must not interleave with another writer
         row = conn.execute("SELECT metadata FROM sessions WHERE id = ?", (session_id,)).fetchone()
         if row:
             try:
@@ -199,11 +317,70 @@ def update_session_metadata(session_id: str, metadata: dict):
 
 def delete_session(session_id: str):
     with _conn() as conn:
-        conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+        conn.execute("BEGIN IMMEDIATE")
+        # Take the session's messages, feedback and agent out of the analytics counters
+        session = conn.execute("SELECT agent_id FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        messages = conn.execute(
+            "SELECT role, content, created_at FROM messages WHERE session_id = ?", (session_id,)
+        ).fetchall()
+        _count_messages(conn, messages, -1)
+        for row in conn.execute(
+            "SELECT feedback, COUNT(*) AS n FROM feedback "
+            "WHERE message_id IN (SELECT id FROM messages WHERE session_id = ?) GROUP BY feedback",
+            (session_id,),
+        ).fetchall():
+            _bump_counter(conn, f"feedback_{row['feedback']}", -row["n"])
+        if session:
+            _count_session(conn, session["agent_id"], -1)
+
+        # Session row first, so the per-message stats trigger finds nothing to update
         conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+        conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
         conn.commit()
 
 
+# --- Background writer ---
+# Writes that nobody waits for (summary cache, late titles) run in submission
+# order on one daemon thread, off the request path.
+
+_write_queue: queue.Queue | None = None
+_write_queue_lock = threading.Lock()
+
+
+def _get_write_queue() -> queue.Queue:
+    global _write_queue
+    if _write_queue is None:
+        with _write_queue_lock:
+            if _write_queue is None:
+                q = queue.Queue()
+                threading.Thread(target=_write_loop, args=(q,), name="chat-db-writer", daemon=True).start()
+                _write_queue = q
+    return _write_queue
+
+
+def _write_loop(q: queue.Queue):
+    while True:
+        fn, args, kwargs = q.get()
+        try:
+            fn(*args, **kwargs)
+        except Exception as e:
+            logger.warning(f"Deferred write {getattr(fn, '__name__', fn)} failed: {e}")
+
+
+def defer_write(fn, *args, **kwargs):
+    """Run a database write on the background writer thread."""
+    _get_write_queue().put((fn, args, kwargs))
+
+
+def flush_deferred_writes(timeout: float = 10.0) -> bool:
+    """Wait until every write deferred so far has run. False on timeout."""
+    if _write_queue is None:
+        return True
+    done = threading.Event()
+    _write_queue.put((done.set, (), {}))
+    return done.wait(timeout)
+
+
 # --- Messages ---
 
 def add_message(
@@ -225,25 +402,129 @@ def add_message(
             "UPDATE sessions SET updated_at = ? WHERE id = ?",
             (now, session_id),
         )
+        _count_messages(conn, [(role, content, now)], 1)
         conn.commit()
         return {"id": msg_id, "role": role, "content": content, "sources": sources or [], "created_at": now}
 
 
-def get_messages(session_id: str, limit: int = 100) -> list[dict]:
+def record_turn(
+    session_id: str,
+    question: str,
+    answer: str,
+    sources: list | None = None,
+    title: str | None = None,
+    metadata: dict | None = None,
+) -> tuple[dict, dict]:
+    """Persist a whole chat turn in one transaction.
+
+    Writes the user and assistant messages, bumps the session's updated_at and
+    the analytics counters, and optionally sets the title and merges *metadata*
+    into the session metadata. Returns (user_message, assistant_message).
+    """
+    with _conn() as conn:
+        now = datetime.now(timezone.utc)
+        user_at = now.isoformat()
+        # Messages are ordered by created_at; keep the answer strictly after the question
+        answer_at = (now + timedelta(microseconds=1)).isoformat()
+        user_id, answer_id = str(uuid.uuid4()), str(uuid.uuid4())
+
+        conn.execute("BEGIN IMMEDIATE")  # Take the write lock before reading metadata to merge
+        conn.executemany(
+            "INSERT INTO messages (id, session_id, role, content, sources, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (user_id, session_id, "user", question, "[]", user_at),
+                (answer_id, session_id, "assistant", answer, json.dumps(sources or []), answer_at),
+            ],
+        )
+        _count_messages(conn, [("user", question, user_at), ("assistant", answer, answer_at)], 1)
+        if metadata:
+            row = conn.execute("SELECT metadata FROM sessions WHERE id = ?", (session_id,)).fetchone()
+            existing = {}
+            if row:
+                try:
+                    existing = json.loads(row["metadata"] or "{}")
+                except (json.JSONDecodeError, TypeError):
+                    pass
+            existing.update(metadata)
+            conn.execute("UPDATE sessions SET metadata = ? WHERE id = ?", (json.dumps(existing), session_id))
+        if title:
+            conn.execute("UPDATE sessions SET title = ?, updated_at = ? WHERE id = ?", (title, answer_at, session_id))
+        else:
+            conn.execute("UPDATE sessions SET updated_at = ? WHERE id = ?", (answer_at, session_id))
+        conn.commit()
+
+    return (
+        {"id": user_id, "role": "user", "content": question, "sources": [], "created_at": user_at},
+        {"id": answer_id, "role": "assistant", "content": answer, "sources": sources or [], "created_at": answer_at},
+    )
+
+
+def get_messages(session_id: str, limit: int = 100, include_sources: bool = True) -> list[dict]:
+    """Messages of a session, oldest first. Sources are only read and decoded when asked for."""
+    columns = "*" if include_sources else "id, session_id, role, content, created_at"
     with _conn() as conn:
         rows = conn.execute(
-            "SELECT * FROM messages WHERE session_id = ? ORDER BY created_at ASC LIMIT ?",
+            f"SELECT {columns} FROM messages WHERE session_id = ? ORDER BY created_at ASC LIMIT ?",
             (session_id, limit),
         ).fetchall()
 
     messages = []
     for r in rows:
         msg = dict(r)
-        msg["sources"] = json.loads(msg.get("sources", "[]"))
+        if include_sources:
+            msg["sources"] = json.loads(msg.get("sources", "[]"))
         messages.append(msg)
     return messages
 
 
+def get_messages_since(session_id: str, after: str | None, limit: int) -> list[dict]:
+    """Up to *limit* messages created after *after* (from the start if None), oldest first, without sources."""
+    with _conn() as conn:
+        rows = conn.execute(
+            "SELECT role, content, created_at FROM messages WHERE session_id = ? AND created_at > ? "
+            "ORDER BY created_at ASC LIMIT ?",
+            (session_id, after or "", limit),
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+
+def get_turn_context(session_id: str, tail: int) -> dict | None:
+    """Everything a chat turn reads from chat.db, in one query.
+
+    Returns the session row with ``metadata`` parsed, its ``message_count``
+    (the denormalized counter) and ``recent``: the last *tail* messages as
+    role/content/created_at, oldest first, without sources. None if the
+    session does not exist.
+    """
+    with _conn() as conn:
+        rows = conn.execute(
+            """
+            SELECT s.*, m.role AS m_role, m.content AS m_content, m.created_at AS m_created_at
+            FROM sessions s
+            LEFT JOIN (
+                SELECT role, content, created_at FROM messages
+                WHERE session_id = ? ORDER BY created_at DESC LIMIT ?
+            ) m
+            WHERE s.id = ?
+            ORDER BY m.created_at
+            """,
+            (session_id, tail, session_id),
+        ).fetchall()
+    if not rows:
+        return None
+
+    context = {k: rows[0][k] for k in rows[0].keys() if not k.startswith("m_")}
+    try:
+        context["metadata"] = json.loads(context.get("metadata") or "{}")
+    except (json.JSONDecodeError, TypeError):
+        context["metadata"] = {}
+    context["recent"] = [
+        {"role": r["m_role"], "content": r["m_content"], "created_at": r["m_created_at"]}
+        for r in rows if r["m_role"] is not None
+    ]
+    return context
+
+
 def get_recent_context(session_id: str, max_messages: int = 10) -> list[dict]:
     """Get recent messages for conversation context."""
     with _conn() as conn:
@@ -266,15 +547,16 @@ def create_agent(
     top_k: int = 15,
     icon: str = "E",
     use_multi_query: bool = True,
+    neighbor_window: int = 1,
 ) -> dict:
     with _conn() as conn:
         agent_id = str(uuid.uuid4())
         now = datetime.now(timezone.utc).isoformat()
         collections_json = json.dumps(collections or [])
         conn.execute(
-            "INSERT INTO agents (id, name, description, system_prompt, collections, temperature, top_k, icon, use_multi_query, created_at, updated_at) "
-            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-            (agent_id, name, description, system_prompt, collections_json, temperature, top_k, icon, int(use_multi_query), now, now),
+            "INSERT INTO agents (id, name, description, system_prompt, collections, temperature, top_k, icon, use_multi_query, neighbor_window, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (agent_id, name, description, system_prompt, collections_json, temperature, top_k, icon, int(use_multi_query), neighbor_window, now, now),
         )
         conn.commit()
         return {
@@ -282,6 +564,7 @@ def create_agent(
             "system_prompt": system_prompt, "collections": collections or [],
             "temperature": temperature, "top_k": top_k, "icon": icon,
             "use_multi_query": use_multi_query,
+            "neighbor_window": neighbor_window,
             "created_at": now, "updated_at": now,
         }
 
@@ -323,7 +606,7 @@ def get_agent(agent_id: str) -> dict | None:
 def update_agent(agent_id: str, **kwargs) -> dict | None:
     now = datetime.now(timezone.utc).isoformat()
 
-    allowed = {"name", "description", "system_prompt", "collections", "temperature", "top_k", "icon", "use_multi_query"}
+    allowed = {"name", "description", "system_prompt", "collections", "temperature", "top_k", "icon", "use_multi_query", "neighbor_window"}
     updates = {k: v for k, v in kwargs.items() if k in allowed and v is not None}
 
     if "collections" in updates:
@@ -347,28 +630,147 @@ def update_agent(agent_id: str, **kwargs) -> dict | None:
 def delete_agent(agent_id: str):
     with _conn() as conn:
         conn.execute("DELETE FROM agents WHERE id = ?", (agent_id,))
+        conn.execute("DELETE FROM analytics_agent_sessions WHERE agent_id = ?", (agent_id,))
         conn.commit()
 
 
 # --- Session search ---
+# External-content FTS5 tables over messages.content and sessions.title, kept in
+# sync by triggers. They map to the base tables by rowid, and VACUUM may renumber
+# rowids of tables without an INTEGER PRIMARY KEY: run rebuild_search_index()
+# after a VACUUM.
+
+_SEARCH_SCHEMA = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+        content, content='messages', content_rowid='rowid', tokenize='unicode61 remove_diacritics 2'
+    );
+    CREATE VIRTUAL TABLE IF NOT EXISTS sessions_fts USING fts5(
+        title, content='sessions', content_rowid='rowid', tokenize='unicode61 remove_diacritics 2'
+    );
+
+    CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+        INSERT INTO messages_fts (rowid, content) VALUES (new.rowid, new.content);
+    END;
+    CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+        INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.rowid, old.content);
+    END;
+    CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content ON messages BEGIN
+        INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.rowid, old.content);
+        INSERT INTO messages_fts (rowid, content) VALUES (new.rowid, new.content);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS sessions_fts_insert AFTER INSERT ON sessions BEGIN
+        INSERT INTO sessions_fts (rowid, title) VALUES (new.rowid, new.title);
+    END;
+    CREATE TRIGGER IF NOT EXISTS sessions_fts_delete AFTER DELETE ON sessions BEGIN
+        INSERT INTO sessions_fts (sessions_fts, rowid, title) VALUES ('delete', old.rowid, old.title);
+    END;
+    CREATE TRIGGER IF NOT EXISTS sessions_fts_update AFTER UPDATE OF title ON sessions BEGIN
+        INSERT INTO sessions_fts (sessions_fts, rowid, title) VALUES ('delete', old.rowid, old.title);
+        INSERT INTO sessions_fts (rowid, title) VALUES (new.rowid, new.title);
+    END;
+"""
+
+_SEARCH_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_TITLE_RANK_WEIGHT = 2.0  # A title hit counts double (bm25 is negative: lower is better)
+SNIPPET_START, SNIPPET_END = "\x02", "\x03"  # Match markers in snippets, escaped and styled by the UI
+
+
+def _rebuild_search_index(conn):
+    conn.execute("INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')")
+    conn.execute("INSERT INTO sessions_fts (sessions_fts) VALUES ('rebuild')")
+
+
+def rebuild_search_index():
+    """Re-index all messages and titles (after VACUUM or a manual edit of chat.db)."""
+    with _conn() as conn:
+        _rebuild_search_index(conn)
+        conn.commit()
+
 
-def search_sessions(query: str, limit: int = 50) -> list[dict]:
-    """Search sessions by title or message content."""
+def _fts_query(query: str) -> str | None:
+    """Turn user input into an FTS5 query: every word must match, the last one as a prefix."""
+    words = _SEARCH_TOKEN_RE.findall(query)
+    if not words:
+        return None
+    return " ".join(f'"{w}"' for w in words) + "*"
+
+
+def search_sessions(query: str, limit: int = 50, cursor: str | None = None) -> list[dict]:
+    """Search sessions by title or message content, best BM25 match first.
+
+    Each result carries a ``snippet`` of the best matching message (None when
+    only the title matched), with matches wrapped in SNIPPET_START/SNIPPET_END,
+    and its ``rank`` for page_cursor().
+    """
+    fts_query = _fts_query(query)
+    if fts_query is None:
+        return _search_sessions_like(query, limit, cursor)
+    after = _decode_cursor(cursor) if cursor else None
+    with _conn() as conn:
+        try:
+            rows = conn.execute(
+                f"""
+                WITH hits AS (
+                    SELECT m.session_id AS session_id, bm25(messages_fts) AS rank, messages_fts.rowid AS hit
+                    FROM messages_fts
+                    JOIN messages m ON m.rowid = messages_fts.rowid
+                    WHERE messages_fts MATCH ?
+                    UNION ALL
+                    SELECT s.id, bm25(sessions_fts) * ?, NULL
+                    FROM sessions_fts
+                    JOIN sessions s ON s.rowid = sessions_fts.rowid
+                    WHERE sessions_fts MATCH ?
+                ),
+                best AS (
+                    -- SQLite takes the bare hit column from the row holding MIN(rank)
+                    SELECT session_id, MIN(rank) AS rank, hit FROM hits GROUP BY session_id
+                )
+                SELECT s.*, best.rank, best.hit
+                FROM best
+                JOIN sessions s ON s.id = best.session_id
+                {"WHERE (best.rank, s.id) > (?, ?)" if after else ""}
+                ORDER BY best.rank, s.id
+                LIMIT ?
+                """,
+                (fts_query, _TITLE_RANK_WEIGHT, fts_query, *(after or ()), limit),
+            ).fetchall()
+            # Snippets only for the messages that made the page, not for every hit
+            hits = [r["hit"] for r in rows if r["hit"] is not None]
+            snippets = {}
+            if hits:
+                snippets = dict(conn.execute(
+                    f"SELECT rowid, snippet(messages_fts, 0, ?, ?, '…', 12) FROM messages_fts "
+                    f"WHERE messages_fts MATCH ? AND rowid IN ({','.join('?' * len(hits))})",
+                    (SNIPPET_START, SNIPPET_END, fts_query, *hits),
+                ).fetchall())
+        except sqlite3.OperationalError as e:
+            if "no such table" not in str(e):
+                raise
+            return _search_sessions_like(query, limit, cursor)  # SQLite built without FTS5
+
+    results = []
+    for r in rows:
+        session = dict(r)
+        session["snippet"] = snippets.get(session.pop("hit"))
+        results.append(session)
+    return results
+
+
+def _search_sessions_like(query: str, limit: int, cursor: str | None = None) -> list[dict]:
+    """Substring search without FTS5: scans all titles and messages, newest first."""
+    after = _decode_cursor(cursor) if cursor else None
     with _conn() as conn:
         pattern = f"%{query}%"
         rows = conn.execute(
-            """
-            SELECT DISTINCT s.*, COUNT(m.id) as message_count
-            FROM sessions s
-            LEFT JOIN messages m ON m.session_id = s.id
-            WHERE s.title LIKE ? OR s.id IN (
-                SELECT DISTINCT session_id FROM messages WHERE content LIKE ?
-            )
-            GROUP BY s.id
-            ORDER BY s.updated_at DESC
+            f"""
+            SELECT * FROM sessions
+            WHERE (title LIKE ? OR id IN (SELECT session_id FROM messages WHERE content LIKE ?))
+            {"AND (updated_at, id) < (?, ?)" if after else ""}
+            ORDER BY updated_at DESC, id DESC
             LIMIT ?
             """,
-            (pattern, pattern, limit),
+            (pattern, pattern, *(after or ()), limit),
         ).fetchall()
         return [dict(r) for r in rows]
 
@@ -385,12 +787,15 @@ def add_feedback(message_id: str, feedback: str):
         session_id = row["session_id"] if row else None
 
         # Upsert: delete existing feedback for this message, then insert
+        for old in conn.execute("SELECT feedback FROM feedback WHERE message_id = ?", (message_id,)).fetchall():
+            _bump_counter(conn, f"feedback_{old['feedback']}", -1)
         conn.execute("DELETE FROM feedback WHERE message_id = ?", (message_id,))
         feedback_id = str(uuid.uuid4())
         conn.execute(
             "INSERT INTO feedback (id, message_id, session_id, feedback, created_at) VALUES (?, ?, ?, ?, ?)",
             (feedback_id, message_id, session_id, feedback, now),
         )
+        _bump_counter(conn, f"feedback_{feedback}", 1)
         conn.commit()
 
 
@@ -402,38 +807,127 @@ def get_feedback_for_message(message_id: str) -> str | None:
 
 
 # --- Analytics ---
+# Counters are maintained in the same transaction as the writes they count, so
+# the dashboard reads O(result size) instead of scanning messages.
+
+def _question_hash(content: str) -> str:
+    """Key for top questions: case and whitespace differences don't make a new question."""
+    return hashlib.sha256(" ".join(content.lower().split()).encode("utf-8")).hexdigest()
+
+
+def _bump_counter(conn, name: str, delta: int):
+    conn.execute(
+        "INSERT INTO analytics_counters (name, value) VALUES (?, ?) "
+        "ON CONFLICT (name) DO UPDATE SET value = value + excluded.value",
+        (name, delta),
+    )
+
+
+def _count_session(conn, agent_id: str | None, sign: int):
+    _bump_counter(conn, "sessions", sign)
+    if agent_id:
+        conn.execute(
+            "INSERT INTO analytics_agent_sessions (agent_id, count) VALUES (?, ?) "
+            "ON CONFLICT (agent_id) DO UPDATE SET count = count + excluded.count",
+            (agent_id, sign),
+        )
+
+
+def _count_messages(conn, messages, sign: int):
+    """Add (sign=1) or remove (sign=-1) (role, content, created_at) messages from the counters."""
+    if not messages:
+        return
+    per_day: dict[str, int] = {}
+    questions = 0
+    for role, content, created_at in messages:
+        day = created_at[:10]  # UTC ISO timestamps: [:10] == DATE(created_at)
+        per_day[day] = per_day.get(day, 0) + sign
+        if role == "user":
+            questions += 1
+            conn.execute(
+                "INSERT INTO analytics_questions (hash, question, count) VALUES (?, ?, ?) "
+                "ON CONFLICT (hash) DO UPDATE SET count = count + excluded.count",
+                (_question_hash(content), content, sign),
+            )
+    _bump_counter(conn, "messages", sign * len(messages))
+    _bump_counter(conn, "questions", sign * questions)
+    conn.executemany(
+        "INSERT INTO analytics_daily_messages (day, count) VALUES (?, ?) "
+        "ON CONFLICT (day) DO UPDATE SET count = count + excluded.count",
+        list(per_day.items()),
+    )
+    if sign < 0:
+        conn.execute("DELETE FROM analytics_questions WHERE count <= 0")
+        conn.execute("DELETE FROM analytics_daily_messages WHERE count <= 0")
+
+
+def _rebuild_analytics(conn):
+    """Recompute every analytics counter from the base tables (inside the caller's transaction)."""
+    for table in ("analytics_counters", "analytics_daily_messages", "analytics_questions", "analytics_agent_sessions"):
+        conn.execute(f"DELETE FROM {table}")
+    conn.execute("""
+        INSERT INTO analytics_counters (name, value)
+        SELECT 'sessions', COUNT(*) FROM sessions
+        UNION ALL SELECT 'messages', COUNT(*) FROM messages
+        UNION ALL SELECT 'questions', COUNT(*) FROM messages WHERE role = 'user'
+        UNION ALL SELECT 'feedback_positive', COUNT(*) FROM feedback WHERE feedback = 'positive'
+        UNION ALL SELECT 'feedback_negative', COUNT(*) FROM feedback WHERE feedback = 'negative'
+    """)
+    conn.execute("""
+        INSERT INTO analytics_daily_messages (day, count)
+        SELECT DATE(created_at), COUNT(*) FROM messages GROUP BY DATE(created_at)
+    """)
+    conn.execute("""
+        INSERT INTO analytics_agent_sessions (agent_id, count)
+        SELECT agent_id, COUNT(*) FROM sessions WHERE agent_id IS NOT NULL GROUP BY agent_id
+    """)
+    questions: dict[str, list] = {}
+    for row in conn.execute("SELECT content FROM messages WHERE role = 'user' ORDER BY created_at"):
+        entry = questions.setdefault(_question_hash(row["content"]), [row["content"], 0])
+        entry[1] += 1
+    conn.executemany(
+        "INSERT INTO analytics_questions (hash, question, count) VALUES (?, ?, ?)",
+        [(h, question, count) for h, (question, count) in questions.items()],
+    )
+
+
+def rebuild_analytics() -> dict:
+    """Backfill / re-sync the analytics counters from the base tables. Returns the new totals."""
+    with _conn() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        _rebuild_analytics(conn)
+        conn.commit()
+        return {r["name"]: r["value"] for r in conn.execute("SELECT name, value FROM analytics_counters")}
+
 
 def get_analytics() -> dict:
     """Get analytics data for the dashboard."""
     with _conn() as conn:
-        # Total counts
-        total_sessions = conn.execute("SELECT COUNT(*) as c FROM sessions").fetchone()["c"]
-        total_messages = conn.execute("SELECT COUNT(*) as c FROM messages").fetchone()["c"]
-        total_user_msgs = conn.execute("SELECT COUNT(*) as c FROM messages WHERE role = 'user'").fetchone()["c"]
+        counters = {r["name"]: r["value"] for r in conn.execute("SELECT name, value FROM analytics_counters")}
+        total_sessions = counters.get("sessions", 0)
+        total_messages = counters.get("messages", 0)
+        total_user_msgs = counters.get("questions", 0)
         total_agents = conn.execute("SELECT COUNT(*) as c FROM agents").fetchone()["c"]
 
         # Feedback stats
-        positive = conn.execute("SELECT COUNT(*) as c FROM feedback WHERE feedback = 'positive'").fetchone()["c"]
-        negative = conn.execute("SELECT COUNT(*) as c FROM feedback WHERE feedback = 'negative'").fetchone()["c"]
+        positive = counters.get("feedback_positive", 0)
+        negative = counters.get("feedback_negative", 0)
 
         # Messages per day (last 30 days)
         messages_per_day = conn.execute(
             """
-            SELECT DATE(created_at) as day, COUNT(*) as count
-            FROM messages
-            WHERE created_at >= DATE('now', '-30 days')
-            GROUP BY DATE(created_at)
+            SELECT day, count
+            FROM analytics_daily_messages
+            WHERE day >= DATE('now', '-30 days')
             ORDER BY day ASC
             """
         ).fetchall()
 
-        # Top questions (most common user messages)
+        # Top questions (most common user messages, normalized)
         top_questions = conn.execute(
             """
-            SELECT content, COUNT(*) as count
-            FROM messages
-            WHERE role = 'user'
-            GROUP BY content
+            SELECT question as content, count
+            FROM analytics_questions
             ORDER BY count DESC
             LIMIT 10
             """
@@ -442,10 +936,9 @@ def get_analytics() -> dict:
         # Agent usage
         agent_usage = conn.execute(
             """
-            SELECT a.name, a.icon, COUNT(s.id) as session_count
+            SELECT a.name, a.icon, COALESCE(c.count, 0) as session_count
             FROM agents a
-            LEFT JOIN sessions s ON s.agent_id = a.id
-            GROUP BY a.id
+            LEFT JOIN analytics_agent_sessions c ON c.agent_id = a.id
             ORDER BY session_count DESC
             """
         ).fetchall()
@@ -1,7 +1,16 @@
+import asyncio
+import hashlib
 import logging
+import random
+import sqlite3
 import threading
 import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
 
+import numpy as np
+from ollama import AsyncClient as AsyncOllamaClient
 from ollama import Client as OllamaClient
 
 from app.config import settings
@@ -41,17 +50,237 @@ OLLAMA_EMBEDDING_DIM = 1024
 FALLBACK_EMBEDDING_DIM = 384
 
 
-EMBED_BATCH_SIZE = 50  # Max texts per Ollama batch call to avoid OOM
+EMBED_BATCH_SIZE = 50  # Texts per Ollama batch call (starting size for adaptive batching)
+MIN_EMBED_BATCH_SIZE = 8
+MAX_EMBED_BATCH_SIZE = 256  # Upper bound to avoid OOM on the Ollama side
+
+
+# --- Embedding cache ---
+
+EMBED_CACHE_PATH = Path(settings.chroma_persist_dir).parent / "embedding_cache.db"
+_EVICT_TO = 0.9  # Evict down to this fraction of the size limit so we don't evict on every insert
+_SQL_BATCH = 500
+
+
+class EmbeddingCache:
+    """Two-tier embedding cache keyed by (embedding model, sha256 of the text).
+
+    Vectors are stored as float32 blobs in a SQLite file next to the ChromaDB
+    store, with an in-memory LRU of recently used vectors in front of it. The
+    disk tier is bounded by ``max_bytes``: once exceeded, the least recently
+    read entries are evicted. Recency on disk is only refreshed on disk hits,
+    so entries kept hot by the memory tier may age out of the file first.
+
+    Cache failures never break embedding — they are logged and treated as misses.
+    """
+
+    def __init__(self, path: Path, memory_items: int, max_bytes: int):
+        self.path = Path(path)
+        self.memory_items = memory_items
+        self.max_bytes = max_bytes
+        self._memory: OrderedDict[tuple[str, str], bytes] = OrderedDict()
+        self._lock = threading.Lock()
+        self._schema_ready = False
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def text_hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    @contextmanager
+    def _conn(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.path), timeout=30.0)
+        conn.execute("PRAGMA journal_mode=WAL")
+        try:
+            if not self._schema_ready:
+                conn.executescript("""
+                    CREATE TABLE IF NOT EXISTS embedding_cache (
+                        model TEXT NOT NULL,
+                        text_hash TEXT NOT NULL,
+                        vector BLOB NOT NULL,
+                        last_used REAL NOT NULL,
+                        PRIMARY KEY (model, text_hash)
+                    );
+                    CREATE INDEX IF NOT EXISTS idx_embedding_cache_last_used ON embedding_cache(last_used);
+
+                    CREATE TABLE IF NOT EXISTS embedding_cache_meta (
+                        id INTEGER PRIMARY KEY CHECK (id = 1),
+                        total_bytes INTEGER NOT NULL DEFAULT 0
+                    );
+                    INSERT OR IGNORE INTO embedding_cache_meta (id, total_bytes) VALUES (1, 0);
+                """)
+                conn.commit()
+                self._schema_ready = True
+            yield conn
+        finally:
+            conn.close()
+
+    def _remember(self, key: tuple[str, str], blob: bytes):
+        """Insert into the memory LRU. Caller holds ``self._lock``."""
+        self._memory[key] = blob
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def get_many(self, model: str, texts: list[str]) -> list[list[float] | None]:
+        """Look up embeddings for *texts*, in order. Misses are returned as None."""
+        keys = [(model, self.text_hash(t)) for t in texts]
+        blobs: list[bytes | None] = [None] * len(texts)
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                blob = self._memory.get(key)
+                if blob is not None:
+                    self._memory.move_to_end(key)
+                    blobs[i] = blob
+            memory_hits = sum(1 for b in blobs if b is not None)
+
+        disk_hits = 0
+        pending = sorted({keys[i][1] for i, b in enumerate(blobs) if b is None})
+        if pending:
+            try:
+                found: dict[str, bytes] = {}
+                with self._conn() as conn:
+                    for i in range(0, len(pending), _SQL_BATCH):
+                        batch = pending[i:i + _SQL_BATCH]
+                        ph = ",".join("?" * len(batch))
+                        found.update(conn.execute(
+                            f"SELECT text_hash, vector FROM embedding_cache "
+                            f"WHERE model = ? AND text_hash IN ({ph})",
+                            (model, *batch),
+                        ).fetchall())
+                    if found:
+                        now = time.time()
+                        conn.executemany(
+                            "UPDATE embedding_cache SET last_used = ? WHERE model = ? AND text_hash = ?",
+                            [(now, model, h) for h in found],
+                        )
+                        conn.commit()
+                with self._lock:
+                    for i, key in enumerate(keys):
+                        if blobs[i] is None and key[1] in found:
+                            blobs[i] = found[key[1]]
+                            disk_hits += 1
+                            self._remember(key, blobs[i])
+            except sqlite3.Error as e:
+                logger.warning(f"Embedding cache read failed: {e}")
+
+        with self._lock:
+            self.memory_hits += memory_hits
+            self.disk_hits += disk_hits
+            self.misses += len(texts) - memory_hits - disk_hits
+
+        return [
+            np.frombuffer(b, dtype=np.float32).tolist() if b is not None else None
+            for b in blobs
+        ]
+
+    def put_many(self, model: str, texts: list[str], embeddings: list[list[float]]):
+        """Store embeddings for *texts* and evict old entries if over the size limit."""
+        rows = []
+        with self._lock:
+            for text, embedding in zip(texts, embeddings):
+                key = (model, self.text_hash(text))
+                blob = np.asarray(embedding, dtype=np.float32).tobytes()
+                self._remember(key, blob)
+                rows.append((model, key[1], blob))
+
+        now = time.time()
+        try:
+            with self._conn() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                added = 0
+                for model_, text_hash, blob in rows:
+                    cur = conn.execute(
+                        "INSERT OR IGNORE INTO embedding_cache (model, text_hash, vector, last_used) "
+                        "VALUES (?, ?, ?, ?)",
+                        (model_, text_hash, blob, now),
+                    )
+                    if cur.rowcount:
+                        added += len(blob)
+                conn.execute("UPDATE embedding_cache_meta SET total_bytes = total_bytes + ? WHERE id = 1", (added,))
+                total = conn.execute("SELECT total_bytes FROM embedding_cache_meta WHERE id = 1").fetchone()[0]
+                if total > self.max_bytes:
+                    self._evict(conn, total)
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding cache write failed: {e}")
+
+    def _evict(self, conn: sqlite3.Connection, total: int):
+        """Delete least recently used rows until the cache is under its target size."""
+        target = int(self.max_bytes * _EVICT_TO)
+        freed = 0
+        victims = []
+        for rowid, size in conn.execute(
+            "SELECT rowid, LENGTH(vector) FROM embedding_cache ORDER BY last_used"
+        ):
+            if total - freed <= target:
+                break
+            victims.append(rowid)
+            freed += size
+
+        for i in range(0, len(victims), _SQL_BATCH):
+            batch = victims[i:i + _SQL_BATCH]
+            conn.execute(
+                f"DELETE FROM embedding_cache WHERE rowid IN ({','.join('?' * len(batch))})",
+                batch,
+            )
+        conn.execute("UPDATE embedding_cache_meta SET total_bytes = total_bytes - ? WHERE id = 1", (freed,))
+        with self._lock:
+            self.evictions += len(victims)
+        logger.info(f"Embedding cache evicted {len(victims)} entries ({freed / 1024 / 1024:.1f} MB)")
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+                "memory_items": len(self._memory),
+                "evictions": self.evictions,
+            }
+
+
+_embedding_cache: EmbeddingCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache | None:
+    """Return the shared embedding cache, or None when caching is disabled."""
+    global _embedding_cache
+    if not settings.embedding_cache_enabled:
+        return None
+    if _embedding_cache is None:
+        with _cache_lock:
+            if _embedding_cache is None:
+                _embedding_cache = EmbeddingCache(
+                    EMBED_CACHE_PATH,
+                    memory_items=settings.embedding_cache_memory_items,
+                    max_bytes=settings.embedding_cache_max_mb * 1024 * 1024,
+                )
+    return _embedding_cache
 
 
 def embed_text(text: str) -> list[float]:
+    cache = get_embedding_cache()
+    if cache is not None:
+        cached = cache.get_many(settings.embedding_model, [text])[0]
+        if cached is not None:
+            return cached
+
     try:
         client = _get_ollama_client()
         response = client.embed(
             model=settings.embedding_model,
             input=text,
         )
-        return response["embeddings"][0]
+        embedding = response["embeddings"][0]
     except Exception as e:
         logger.error(
             f"Ollama embedding failed: {e}. "
@@ -64,9 +293,83 @@ def embed_text(text: str) -> list[float]:
             "and fallback model has incompatible dimensions."
         ) from e
 
+    if cache is not None:
+        cache.put_many(settings.embedding_model, [text], [embedding])
+    return embedding
+
 
 def embed_batch(texts: list[str], max_retries: int = 3) -> list[list[float]]:
-    """Batch-embed texts using Ollama's native batch API.
+    """Batch-embed texts, serving repeats from the embedding cache.
+
+    Only cache misses (deduplicated) are sent to Ollama; results are returned
+    in the order of *texts*.
+    """
+    cache = get_embedding_cache()
+    if cache is None:
+        return _embed_uncached(texts, max_retries)
+
+    model = settings.embedding_model
+    embeddings = cache.get_many(model, texts)
+    missing = _group_misses(texts, embeddings)
+
+    if missing:
+        unique = list(missing)
+        fresh = _embed_uncached(unique, max_retries)
+        cache.put_many(model, unique, fresh)
+        _fill_misses(embeddings, missing, fresh)
+
+    return embeddings
+
+
+def _group_misses(texts: list[str], embeddings: list[list[float] | None]) -> dict[str, list[int]]:
+    """Map each uncached text to its positions, so duplicates are embedded once."""
+    missing: dict[str, list[int]] = {}
+    for i, (text, embedding) in enumerate(zip(texts, embeddings)):
+        if embedding is None:
+            missing.setdefault(text, []).append(i)
+    return missing
+
+
+def _fill_misses(embeddings: list, missing: dict[str, list[int]], fresh: list[list[float]]):
+    for positions, embedding in zip(missing.values(), fresh):
+        for i in positions:
+            embeddings[i] = embedding
+
+
+def _embed_uncached(texts: list[str], max_retries: int = 3) -> list[list[float]]:
+    """Embed texts with Ollama, pipelining batches when there is more than one.
+
+    Runs the async dispatcher on a private event loop, so callers on worker
+    threads (ingestion jobs, bulk_ingest) get concurrent batches without
+    becoming async themselves. Falls back to sequential batches when called
+    from a thread that already runs an event loop.
+    """
+    if settings.embedding_max_concurrency > 1 and len(texts) > EMBED_BATCH_SIZE:
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(_embed_concurrent(texts, max_retries))
+    return _embed_sequential(texts, max_retries)
+
+
+def _embed_failed(error: Exception, max_retries: int) -> RuntimeError:
+    logger.error(
+        f"Ollama batch embedding failed after {max_retries} attempts: {error}. "
+        "Refusing fallback to avoid dimension mismatch in ChromaDB."
+    )
+    return RuntimeError(
+        f"Embedding service unavailable. Ollama ({settings.embedding_model}) is down "
+        "and fallback model has incompatible dimensions."
+    )
+
+
+def _backoff_delay(attempt: int) -> float:
+    """Exponential backoff (1s, 2s, 4s, ...) with +/-50% jitter so retries don't sync up."""
+    return (2 ** attempt) * random.uniform(0.5, 1.5)
+
+
+def _embed_sequential(texts: list[str], max_retries: int = 3) -> list[list[float]]:
+    """Batch-embed texts using Ollama's native batch API, one batch at a time.
 
     Processes in batches of EMBED_BATCH_SIZE to avoid memory issues.
     Retries with exponential backoff on transient failures (timeout, connection).
@@ -90,26 +393,144 @@ def embed_batch(texts: list[str], max_retries: int = 3) -> list[list[float]]:
             except Exception as e:
                 last_error = e
                 if attempt < max_retries - 1:
-                    wait = 2 ** attempt  # 1s, 2s, 4s
+                    wait = _backoff_delay(attempt)
                     logger.warning(
                         f"Ollama embed batch {i // EMBED_BATCH_SIZE + 1} failed (attempt {attempt + 1}/{max_retries}): {e}. "
-                        f"Retrying in {wait}s..."
+                        f"Retrying in {wait:.1f}s..."
                     )
                     time.sleep(wait)
 
         if last_error is not None:
-            logger.error(
-                f"Ollama batch embedding failed after {max_retries} attempts: {last_error}. "
-                "Refusing fallback to avoid dimension mismatch in ChromaDB."
-            )
-            raise RuntimeError(
-                f"Embedding service unavailable. Ollama ({settings.embedding_model}) is down "
-                "and fallback model has incompatible dimensions."
-            ) from last_error
+            raise _embed_failed(last_error, max_retries) from last_error
 
     return all_embeddings
 
 
+class AdaptiveBatchSizer:
+    """Picks the next batch size from observed Ollama latency.
+
+    Keeps an exponential moving average of seconds per character and sizes
+    batches so each takes roughly ``target_seconds``, capped by ``max_chars``
+    of payload. Failed batches halve the size, since oversized payloads are
+    the usual cause of Ollama timeouts.
+    """
+
+    def __init__(self, target_seconds: float, max_chars: int, initial: int = EMBED_BATCH_SIZE):
+        self.target_seconds = target_seconds
+        self.max_chars = max_chars
+        self.size = initial
+        self._seconds_per_char: float | None = None
+        self._avg_chars: float | None = None
+
+    def next_end(self, texts: list[str], start: int, parallelism: int = 1) -> int:
+        """Return the end index of the batch starting at *start*.
+
+        Never takes more than an even share of the remaining texts across
+        *parallelism* slots, so the tail of a job still fills every slot.
+        """
+        fair_share = -(-(len(texts) - start) // parallelism)
+        size = min(self.size, max(MIN_EMBED_BATCH_SIZE, fair_share))
+        end, chars = start, 0
+        while end < len(texts) and end - start < size:
+            chars += len(texts[end])
+            if chars > self.max_chars and end > start:
+                break
+            end += 1
+        return end
+
+    def observe(self, batch: list[str], seconds: float):
+        chars = max(sum(len(t) for t in batch), 1)
+        per_char = seconds / chars
+        avg_chars = chars / len(batch)
+        if self._seconds_per_char is None:
+            self._seconds_per_char, self._avg_chars = per_char, avg_chars
+        else:
+            self._seconds_per_char = 0.7 * self._seconds_per_char + 0.3 * per_char
+            self._avg_chars = 0.7 * self._avg_chars + 0.3 * avg_chars
+        ideal = self.target_seconds / (self._seconds_per_char * self._avg_chars)
+        self.size = max(MIN_EMBED_BATCH_SIZE, min(MAX_EMBED_BATCH_SIZE, int(ideal)))
+
+    def shrink(self):
+        self.size = max(MIN_EMBED_BATCH_SIZE, self.size // 2)
+
+
+async def _embed_concurrent(texts: list[str], max_retries: int = 3) -> list[list[float]]:
+    """Embed texts with up to ``embedding_max_concurrency`` batches in flight.
+
+    The next batch is only cut once a slot frees up, so its size reflects the
+    latency observed so far. Retries back off with ``asyncio.sleep``.
+    """
+    # httpx async clients are bound to the loop they were first used on, and
+    # every asyncio.run() call creates a new loop — so one client per run,
+    # closed before the loop is.
+    client = AsyncOllamaClient(host=settings.ollama_base_url, timeout=120.0)
+    sizer = AdaptiveBatchSizer(settings.embedding_target_batch_seconds, settings.embedding_max_batch_chars)
+    slots = asyncio.Semaphore(settings.embedding_max_concurrency)
+    results: list[list[float] | None] = [None] * len(texts)
+
+    async def run_batch(batch_no: int, start: int, end: int):
+        batch = texts[start:end]
+        try:
+            for attempt in range(max_retries):
+                try:
+                    t0 = time.perf_counter()
+                    response = await client.embed(model=settings.embedding_model, input=batch)
+                    sizer.observe(batch, time.perf_counter() - t0)
+                    results[start:end] = response["embeddings"]
+                    return
+                except Exception as e:
+                    sizer.shrink()
+                    if attempt == max_retries - 1:
+                        raise _embed_failed(e, max_retries) from e
+                    wait = _backoff_delay(attempt)
+                    logger.warning(
+                        f"Ollama embed batch {batch_no} failed (attempt {attempt + 1}/{max_retries}): {e}. "
+                        f"Retrying in {wait:.1f}s..."
+                    )
+                    await asyncio.sleep(wait)
+        finally:
+            slots.release()
+
+    tasks = []
+    try:
+        start = 0
+        while start < len(texts):
+            await slots.acquire()
+            if any(t.done() and t.exception() for t in tasks):
+                slots.release()
+                break
+            end = sizer.next_end(texts, start, settings.embedding_max_concurrency)
+            tasks.append(asyncio.create_task(run_batch(len(tasks) + 1, start, end)))
+            start = end
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await client._client.aclose()
+
+    return results
+
+
+async def embed_batch_async(texts: list[str], max_retries: int = 3) -> list[list[float]]:
+    """Async variant of :func:`embed_batch` for callers already on an event loop."""
+    cache = get_embedding_cache()
+    if cache is None:
+        return await _embed_concurrent(texts, max_retries)
+
+    model = settings.embedding_model
+    embeddings = await asyncio.to_thread(cache.get_many, model, texts)
+    missing = _group_misses(texts, embeddings)
+
+    if missing:
+        unique = list(missing)
+        fresh = await _embed_concurrent(unique, max_retries)
+        await asyncio.to_thread(cache.put_many, model, unique, fresh)
+        _fill_misses(embeddings, missing, fresh)
+
+    return embeddings
+
+
 def check_ollama_embeddings() -> bool:
     try:
         client = _get_ollama_client()
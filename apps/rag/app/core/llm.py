@@ -1,8 +1,9 @@
+import asyncio
 import json
 import logging
 import threading
 import time
-from collections.abc import Generator
+from collections.abc import AsyncGenerator, Generator
 
 import httpx
 
@@ -140,7 +141,7 @@ def _get_cerebras_client() -> httpx.Client:
         with _cerebras_lock:
             if _cerebras_client is None:
                 _cerebras_client = httpx.Client(
-                    base_url="https://api.cerebras.ai/v1",
+                    base_url=settings.cerebras_base_url,
                     headers={
                         "Authorization": f"Bearer {settings.cerebras_api_key}",
                         "Content-Type": "application/json",
@@ -199,7 +200,7 @@ def _cerebras_generate_stream(
     output_parts = []
     with httpx.stream(
         "POST",
-        "https://api.cerebras.ai/v1/chat/completions",
+        f"{settings.cerebras_base_url}/chat/completions",
         headers={
             "Authorization": f"Bearer {settings.cerebras_api_key}",
             "Content-Type": "application/json",
@@ -271,7 +272,7 @@ def _get_openrouter_client() -> httpx.Client:
         with _openrouter_lock:
             if _openrouter_client is None:
                 _openrouter_client = httpx.Client(
-                    base_url="https://openrouter.ai/api/v1",
+                    base_url=settings.openrouter_base_url,
                     headers={
                         "Authorization": f"Bearer {settings.openrouter_api_key}",
                         "Content-Type": "application/json",
@@ -330,7 +331,7 @@ def _openrouter_generate_stream(
     output_parts = []
     with httpx.stream(
         "POST",
-        "https://openrouter.ai/api/v1/chat/completions",
+        f"{settings.openrouter_base_url}/chat/completions",
         headers={
             "Authorization": f"Bearer {settings.openrouter_api_key}",
             "Content-Type": "application/json",
@@ -389,6 +390,160 @@ def _openrouter_generate_stream(
         logger.debug(f"Stream usage tracking failed: {e}")
 
 
+# ============================================================
+# Async streaming — used by the SSE chat endpoint, so an open stream waits
+# on the event loop instead of holding a threadpool worker
+# ============================================================
+
+_async_groq_client = None
+_async_http_client: httpx.AsyncClient | None = None
+_async_lock = threading.Lock()
+
+
+def _get_async_groq_client():
+    global _async_groq_client
+    if _async_groq_client is None:
+        with _async_lock:
+            if _async_groq_client is None:
+                from groq import AsyncGroq
+                _async_groq_client = AsyncGroq(api_key=settings.groq_api_key, timeout=60.0)
+    return _async_groq_client
+
+
+def _get_async_http_client() -> httpx.AsyncClient:
+    """Connection pool shared by the OpenAI-compatible providers (Cerebras, OpenRouter)."""
+    global _async_http_client
+    if _async_http_client is None:
+        with _async_lock:
+            if _async_http_client is None:
+                _async_http_client = httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=settings.llm_max_connections,
+                        max_keepalive_connections=settings.llm_max_connections,
+                    ),
+                )
+    return _async_http_client
+
+
+async def close_async_clients():
+    """Close the async clients (on shutdown — they are bound to the running event loop)."""
+    global _async_groq_client, _async_http_client
+    if _async_groq_client is not None:
+        await _async_groq_client.close()
+        _async_groq_client = None
+    if _async_http_client is not None:
+        await _async_http_client.aclose()
+        _async_http_client = None
+
+
+def _log_stream_usage(
+    provider: str, model: str, prompt: str, system: str | None,
+    output_parts: list[str], usage_data: dict | None = None,
+):
+    """Track usage after a stream completes (use API data if available, otherwise estimate)."""
+    try:
+        from app.core.usage_tracker import log_llm_usage
+        if usage_data:
+            log_llm_usage(
+                model=model,
+                input_tokens=usage_data.get("prompt_tokens", 0),
+                output_tokens=usage_data.get("completion_tokens", 0),
+                total_tokens=usage_data.get("total_tokens", 0),
+                provider=provider,
+            )
+        elif output_parts:
+            input_chars = len(prompt) + (len(system) if system else 0)
+            output_chars = sum(len(t) for t in output_parts)
+            log_llm_usage(
+                model=model,
+                input_tokens=input_chars // 4,
+                output_tokens=output_chars // 4,
+                total_tokens=(input_chars + output_chars) // 4,
+                provider=provider,
+            )
+    except Exception as e:
+        logger.debug(f"Stream usage tracking failed: {e}")
+
+
+async def _groq_generate_stream_async(
+    prompt: str, system: str | None = None, temperature: float = 0.7
+) -> AsyncGenerator[str, None]:
+    client = _get_async_groq_client()
+    messages = []
+    if system:
+        messages.append({"role": "system", "content": system})
+    messages.append({"role": "user", "content": prompt})
+
+    stream = await client.chat.completions.create(
+        model=settings.groq_model,
+        messages=messages,
+        temperature=temperature,
+        max_tokens=2048,
+        stream=True,
+    )
+    output_parts = []
+    try:
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                token = chunk.choices[0].delta.content
+                output_parts.append(token)
+                yield token
+    finally:
+        await stream.close()  # Also when the client disconnects mid-stream
+
+    await asyncio.to_thread(_log_stream_usage, "groq", settings.groq_model, prompt, system, output_parts)
+
+
+async def _openai_compatible_stream_async(
+    provider: str, base_url: str, api_key: str, model: str, timeout: float,
+    prompt: str, system: str | None = None, temperature: float = 0.7,
+) -> AsyncGenerator[str, None]:
+    """Stream from an OpenAI-compatible /chat/completions endpoint (Cerebras, OpenRouter)."""
+    messages = []
+    if system:
+        messages.append({"role": "system", "content": system})
+    messages.append({"role": "user", "content": prompt})
+
+    usage_data = None
+    output_parts = []
+    async with _get_async_http_client().stream(
+        "POST",
+        f"{base_url}/chat/completions",
+        headers={
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+        },
+        json={
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": 2048,
+            "stream": True,
+        },
+        timeout=timeout,
+    ) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if not line or not line.startswith("data: "):
+                continue
+            payload = line[6:]  # strip "data: "
+            if payload.strip() == "[DONE]":
+                break
+            try:
+                chunk = json.loads(payload)
+                if "usage" in chunk:
+                    usage_data = chunk["usage"]
+                delta = chunk.get("choices", [{}])[0].get("delta", {})
+                token = delta.get("content")
+                if token:
+                    output_parts.append(token)
+                    yield token
+            except (json.JSONDecodeError, IndexError, KeyError):
+                continue
+
+    await asyncio.to_thread(_log_stream_usage, provider, model, prompt, system, output_parts, usage_data)
+
+
 # ============================================================
 # Ollama client (embeddings + model listing only — NOT used for generation)
 # ============================================================
@@ -518,6 +673,90 @@ def generate_stream(
     )
 
 
+async def generate_stream_async(
+    prompt: str, system: str | None = None, temperature: float = 0.7,
+    provider_info: dict | None = None,
+) -> AsyncGenerator[str, None]:
+    """Async version of :func:`generate_stream` — same fallback chain and circuit breaker."""
+    errors = []
+
+    # 1. Try Groq (primary)
+    if settings.llm_provider == "groq" and settings.groq_api_key and not _cb_is_open("groq"):
+        try:
+            if provider_info is not None:
+                provider_info["name"] = f"groq ({settings.groq_model})"
+            async for token in _groq_generate_stream_async(prompt, system, temperature):
+                yield token
+            _cb_record_success("groq")
+            return
+        except Exception as e:
+            _cb_record_failure("groq")
+            errors.append(f"Groq: {e}")
+            logger.warning(f"Groq streaming failed: {e}")
+
+    # 2. Try Cerebras (secondary — fast & free)
+    if settings.cerebras_api_key and not _cb_is_open("cerebras"):
+        try:
+            if provider_info is not None:
+                provider_info["name"] = f"cerebras ({settings.cerebras_model})"
+            async for token in _openai_compatible_stream_async(
+                "cerebras", settings.cerebras_base_url, settings.cerebras_api_key,
+                settings.cerebras_model, float(settings.cerebras_timeout),
+                prompt, system, temperature,
+            ):
+                yield token
+            _cb_record_success("cerebras")
+            return
+        except Exception as e:
+            _cb_record_failure("cerebras")
+            errors.append(f"Cerebras: {e}")
+            logger.warning(f"Cerebras streaming failed: {e}")
+
+    # 3. Try OpenRouter (tertiary cloud)
+    if settings.openrouter_api_key and not _cb_is_open("openrouter"):
+        try:
+            if provider_info is not None:
+                provider_info["name"] = f"openrouter ({settings.openrouter_model})"
+            async for token in _openai_compatible_stream_async(
+                "openrouter", settings.openrouter_base_url, settings.openrouter_api_key,
+                settings.openrouter_model, float(settings.openrouter_timeout),
+                prompt, system, temperature,
+            ):
+                yield token
+            _cb_record_success("openrouter")
+            return
+        except Exception as e:
+            _cb_record_failure("openrouter")
+            errors.append(f"OpenRouter: {e}")
+            logger.warning(f"OpenRouter streaming failed: {e}")
+
+    logger.error(f"All cloud LLM providers failed (stream): {'; '.join(errors)}")
+    raise RuntimeError(
+        "Alle LLM-providers zijn tijdelijk niet beschikbaar (rate limit of storing). "
+        "Probeer het over een minuut opnieuw."
+    )
+
+
+def get_prompt_token_budget() -> int:
+    """Prompt token budget for the next call.
+
+    A prompt is built once and handed down the fallback chain, so it must fit
+    every provider the chain can still reach: the smallest of their budgets.
+    """
+    budgets = []
+    if settings.llm_provider == "groq" and settings.groq_api_key and not _cb_is_open("groq"):
+        budgets.append(settings.groq_prompt_token_budget)
+    if settings.cerebras_api_key and not _cb_is_open("cerebras"):
+        budgets.append(settings.cerebras_prompt_token_budget)
+    if settings.openrouter_api_key and not _cb_is_open("openrouter"):
+        budgets.append(settings.openrouter_prompt_token_budget)
+    return min(budgets or [
+        settings.groq_prompt_token_budget,
+        settings.cerebras_prompt_token_budget,
+        settings.openrouter_prompt_token_budget,
+    ])
+
+
 def get_active_provider() -> str:
     """Return which provider is currently active (primary)."""
     if settings.llm_provider == "groq" and settings.groq_api_key:
@@ -551,7 +790,7 @@ def check_cerebras() -> bool:
         return False
     try:
         r = httpx.get(
-            "https://api.cerebras.ai/v1/models",
+            f"{settings.cerebras_base_url}/models",
             headers={"Authorization": f"Bearer {settings.cerebras_api_key}"},
             timeout=10.0,
         )
@@ -566,7 +805,7 @@ def check_openrouter() -> bool:
         return False
     try:
         r = httpx.get(
-            "https://openrouter.ai/api/v1/models",
+            f"{settings.openrouter_base_url}/models",
             headers={"Authorization": f"Bearer {settings.openrouter_api_key}"},
             timeout=10.0,
         )
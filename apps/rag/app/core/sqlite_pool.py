@@ -0,0 +1,94 @@
+"""
+Per-thread reusable SQLite connections for chat.db.
+
+``database`` and ``usage_tracker`` used to open a fresh connection for every
+call and re-issue their PRAGMAs each time. ``connection(path)`` instead hands
+out one connection per (thread, database file), opened and configured once and
+kept for the life of the thread. Because the connection stays open, sqlite3's
+per-connection statement cache keeps repeated queries prepared.
+
+A connection is only ever used by the thread that opened it. Any transaction
+still open when the outermost ``with connection(...)`` exits is rolled back,
+so a failed call cannot leak half a write into the next one, just as closing
+the connection did before.
+"""
+
+import sqlite3
+import threading
+import weakref
+from contextlib import contextmanager
+from pathlib import Path
+
+from app.config import settings
+
+_local = threading.local()
+
+
+class _Connection(sqlite3.Connection):
+    """Plain sqlite3 connection that can be weakly referenced."""
+
+
+# Every open connection, so shutdown can close them from the main thread. Weak,
+# so a connection is closed and dropped when its thread exits.
+_all_conns: "weakref.WeakSet[_Connection]" = weakref.WeakSet()
+_all_conns_lock = threading.Lock()
+_generation = 0  # Bumped by close_all(); threads then reopen on next use
+
+_STATEMENT_CACHE_SIZE = 256
+
+
+def _open(path: Path) -> _Connection:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # check_same_thread=False only so close_all() may close it; use stays per thread
+    conn = sqlite3.connect(
+        str(path), check_same_thread=False, cached_statements=_STATEMENT_CACHE_SIZE, factory=_Connection,
+    )
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    conn.execute("PRAGMA synchronous=NORMAL")  # Durable across app crashes in WAL mode, fsync only at checkpoints
+    conn.execute(f"PRAGMA mmap_size={int(settings.sqlite_mmap_size_mb) * 1024 * 1024}")
+    conn.execute(f"PRAGMA cache_size={-int(settings.sqlite_cache_size_mb) * 1024}")  # Negative = KiB
+    with _all_conns_lock:
+        _all_conns.add(conn)
+    return conn
+
+
+def _thread_conns() -> dict[str, sqlite3.Connection]:
+    if getattr(_local, "generation", None) != _generation:
+        _local.conns = {}
+        _local.depth = {}
+        _local.generation = _generation
+    return _local.conns
+
+
+@contextmanager
+def connection(path: Path):
+    """Yield this thread's connection to *path*, opening it on first use."""
+    conns = _thread_conns()
+    key = str(path)
+    conn = conns.get(key)
+    if conn is None:
+        conn = conns[key] = _open(path)
+    depth = _local.depth
+    depth[key] = depth.get(key, 0) + 1
+    try:
+        yield conn
+    finally:
+        depth[key] -= 1
+        if depth[key] == 0 and conn.in_transaction:
+            conn.rollback()
+
+
+def close_all():
+    """Close every pooled connection (app shutdown). Threads reopen lazily if used again."""
+    global _generation
+    with _all_conns_lock:
+        conns = list(_all_conns)
+        _all_conns.clear()
+        _generation += 1
+    for conn in conns:
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
@@ -2,15 +2,30 @@
 LLM API usage tracker — logs every API call and provides usage stats.
 
 Tracks: tokens used, request count, audio seconds, costs per day.
+
+Logging is write-behind: ``log_llm_usage`` / ``log_whisper_usage`` only put a
+row on a bounded queue. A writer thread inserts queued rows in batches (every
+``usage_flush_interval_ms`` or ``usage_batch_size`` rows, whichever comes
+first). When the queue is full the caller waits briefly and then writes its
+row itself, so a stuck writer slows callers down instead of losing rows.
+
+Every batch also updates ``usage_daily`` (day × provider × model × call_type
+counters) in the same transaction. ``get_usage_stats`` reads only those
+rollups, so raw ``groq_usage`` rows older than ``usage_raw_retention_days``
+can be compacted away without changing any total.
 """
 
+import atexit
+import queue
 import sqlite3
 import logging
-from contextlib import contextmanager
+import threading
+import time
 from datetime import datetime, timezone
 from pathlib import Path
 
 from app.config import settings
+from app.core import sqlite_pool
 
 logger = logging.getLogger(__name__)
 
@@ -30,16 +45,8 @@ FREE_MODELS = {"llama3.1-8b", "google/gemma-3-27b-it:free", "meta-llama/llama-3.
 DEFAULT_PRICING = {"input": 0.50 / 1_000_000, "output": 0.70 / 1_000_000}
 
 
-@contextmanager
 def _conn():
-    DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.connect(str(DB_PATH))
-    conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA journal_mode=WAL")
-    try:
-        yield conn
-    finally:
-        conn.close()
+    return sqlite_pool.connection(DB_PATH)
 
 
 def init_usage_table():
@@ -68,9 +75,194 @@ def init_usage_table():
         except sqlite3.OperationalError:
             conn.execute("ALTER TABLE groq_usage ADD COLUMN provider TEXT DEFAULT 'groq'")
             conn.execute("CREATE INDEX IF NOT EXISTS idx_usage_provider ON groq_usage(provider)")
+
+        # Migration: daily rollups, backfilled once from the raw rows
+        has_rollups = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'usage_daily'"
+        ).fetchone()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS usage_daily (
+                day TEXT NOT NULL,
+                provider TEXT NOT NULL,
+                model TEXT NOT NULL,
+                call_type TEXT NOT NULL,
+                requests INTEGER NOT NULL DEFAULT 0,
+                input_tokens INTEGER NOT NULL DEFAULT 0,
+                output_tokens INTEGER NOT NULL DEFAULT 0,
+                total_tokens INTEGER NOT NULL DEFAULT 0,
+                audio_seconds REAL NOT NULL DEFAULT 0,
+                estimated_cost REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, provider, model, call_type)
+            ) WITHOUT ROWID;
+        """)
+        if not has_rollups:
+            conn.execute("""
+                INSERT INTO usage_daily
+                SELECT DATE(timestamp), COALESCE(provider, 'groq'), model, call_type, COUNT(*),
+                       COALESCE(SUM(input_tokens), 0), COALESCE(SUM(output_tokens), 0),
+                       COALESCE(SUM(total_tokens), 0), COALESCE(SUM(audio_seconds), 0),
+                       COALESCE(SUM(estimated_cost), 0)
+                FROM groq_usage
+                GROUP BY DATE(timestamp), COALESCE(provider, 'groq'), model, call_type
+            """)
         conn.commit()
 
 
+_INSERT_SQL = (
+    "INSERT INTO groq_usage (timestamp, call_type, model, input_tokens, output_tokens, total_tokens, "
+    "audio_seconds, estimated_cost, provider) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+_ROLLUP_SQL = """
+    INSERT INTO usage_daily (day, provider, model, call_type, requests, input_tokens, output_tokens,
+                             total_tokens, audio_seconds, estimated_cost)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (day, provider, model, call_type) DO UPDATE SET
+        requests = requests + excluded.requests,
+        input_tokens = input_tokens + excluded.input_tokens,
+        output_tokens = output_tokens + excluded.output_tokens,
+        total_tokens = total_tokens + excluded.total_tokens,
+        audio_seconds = audio_seconds + excluded.audio_seconds,
+        estimated_cost = estimated_cost + excluded.estimated_cost
+"""
+_COMPACT_EVERY = 24 * 3600  # Seconds between compaction runs on the writer thread
+_ENQUEUE_TIMEOUT = 1.0  # Seconds a caller waits for queue space before writing itself
+
+_usage_queue: queue.Queue | None = None
+_usage_queue_lock = threading.Lock()
+_queue_stats = {"queued": 0, "written": 0, "batches": 0, "direct_writes": 0, "failed": 0}
+_queue_stats_lock = threading.Lock()
+
+
+def _count(key: str, n: int = 1):
+    with _queue_stats_lock:
+        _queue_stats[key] += n
+
+
+def _get_usage_queue() -> queue.Queue:
+    global _usage_queue
+    if _usage_queue is None:
+        with _usage_queue_lock:
+            if _usage_queue is None:
+                q = queue.Queue(maxsize=settings.usage_queue_max_rows)
+                threading.Thread(target=_write_loop, args=(q,), name="usage-writer", daemon=True).start()
+                atexit.register(flush_usage)  # Scripts without the FastAPI lifespan
+                _usage_queue = q
+    return _usage_queue
+
+
+def _rollup(rows: list[tuple]) -> list[tuple]:
+    """Sum raw usage rows per (day, provider, model, call_type)."""
+    totals: dict[tuple, list] = {}
+    for timestamp, call_type, model, input_tokens, output_tokens, total_tokens, audio_seconds, cost, provider in rows:
+        key = (timestamp[:10], provider or "groq", model, call_type)  # UTC ISO timestamps: [:10] == DATE()
+        t = totals.setdefault(key, [0, 0, 0, 0, 0.0, 0.0])
+        t[0] += 1
+        t[1] += input_tokens
+        t[2] += output_tokens
+        t[3] += total_tokens
+        t[4] += audio_seconds
+        t[5] += cost
+    return [(*key, *t) for key, t in totals.items()]
+
+
+def _insert_rows(rows: list[tuple]):
+    try:
+        with _conn() as conn:
+            conn.executemany(_INSERT_SQL, rows)
+            conn.executemany(_ROLLUP_SQL, _rollup(rows))
+            conn.commit()
+        _count("written", len(rows))
+    except sqlite3.Error as e:
+        _count("failed", len(rows))
+        logger.warning(f"Failed to write {len(rows)} usage row(s): {e}")
+
+
+def _write_loop(q: queue.Queue):
+    interval = settings.usage_flush_interval_ms / 1000
+    last_compaction = None
+    while True:
+        if settings.usage_raw_retention_days and (
+            last_compaction is None or time.monotonic() - last_compaction >= _COMPACT_EVERY
+        ):
+            last_compaction = time.monotonic()
+            try:
+                compact_usage()
+            except sqlite3.Error as e:
+                logger.warning(f"Usage compaction failed: {e}")
+        try:
+            item = q.get(timeout=_COMPACT_EVERY)
+        except queue.Empty:
+            continue
+        batch, flushed = [], []
+        deadline = time.monotonic() + interval
+        # Collect until the batch is full, the interval is up or a flush is requested
+        while True:
+            if isinstance(item, threading.Event):
+                flushed.append(item)
+                break
+            batch.append(item)
+            remaining = deadline - time.monotonic()
+            if len(batch) >= settings.usage_batch_size or remaining <= 0:
+                break
+            try:
+                item = q.get(timeout=remaining)
+            except queue.Empty:
+                break
+        if batch:
+            _insert_rows(batch)
+            _count("batches")
+        for event in flushed:
+            event.set()
+
+
+def _enqueue(row: tuple):
+    try:
+        _get_usage_queue().put(row, timeout=_ENQUEUE_TIMEOUT)
+        _count("queued")
+    except queue.Full:
+        # Backpressure: the writer can't keep up, so this caller pays for its own write
+        _count("direct_writes")
+        _insert_rows([row])
+
+
+def flush_usage(timeout: float = 10.0) -> bool:
+    """Wait until every usage row logged so far is written. False on timeout."""
+    if _usage_queue is None:
+        return True
+    done = threading.Event()
+    try:
+        _usage_queue.put(done, timeout=timeout)
+    except queue.Full:
+        return False
+    return done.wait(timeout)
+
+
+def compact_usage(retention_days: int | None = None) -> int:
+    """Delete raw usage rows older than *retention_days* (their totals stay in usage_daily).
+
+    Returns the number of rows deleted.
+    """
+    days = settings.usage_raw_retention_days if retention_days is None else retention_days
+    if days <= 0:
+        return 0
+    with _conn() as conn:
+        deleted = conn.execute(
+            "DELETE FROM groq_usage WHERE timestamp < DATE('now', ?)", (f"-{int(days)} days",)
+        ).rowcount
+        conn.commit()
+    if deleted:
+        logger.info(f"Compacted {deleted} raw usage row(s) older than {days} days")
+    return deleted
+
+
+def get_usage_queue_stats() -> dict:
+    """Write-behind counters for /health."""
+    with _queue_stats_lock:
+        stats = dict(_queue_stats)
+    stats["pending"] = _usage_queue.qsize() if _usage_queue is not None else 0
+    return stats
+
+
 def log_llm_usage(
     model: str,
     input_tokens: int = 0,
@@ -85,14 +277,8 @@ def log_llm_usage(
         pricing = PRICING.get(model, DEFAULT_PRICING)
         cost = input_tokens * pricing.get("input", 0) + output_tokens * pricing.get("output", 0)
 
-    with _conn() as conn:
-        now = datetime.now(timezone.utc).isoformat()
-        conn.execute(
-            "INSERT INTO groq_usage (timestamp, call_type, model, input_tokens, output_tokens, total_tokens, estimated_cost, provider) "
-            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-            (now, "chat", model, input_tokens, output_tokens, total_tokens or (input_tokens + output_tokens), cost, provider),
-        )
-        conn.commit()
+    now = datetime.now(timezone.utc).isoformat()
+    _enqueue((now, "chat", model, input_tokens, output_tokens, total_tokens or (input_tokens + output_tokens), 0, cost, provider))
 
 
 def log_whisper_usage(model: str, audio_seconds: float):
@@ -100,68 +286,43 @@ def log_whisper_usage(model: str, audio_seconds: float):
     pricing = PRICING.get(model, {})
     cost = audio_seconds * pricing.get("per_second", 0)
 
-    with _conn() as conn:
-        now = datetime.now(timezone.utc).isoformat()
-        conn.execute(
-            "INSERT INTO groq_usage (timestamp, call_type, model, audio_seconds, estimated_cost) "
-            "VALUES (?, ?, ?, ?, ?)",
-            (now, "whisper", model, audio_seconds, cost),
-        )
-        conn.commit()
+    now = datetime.now(timezone.utc).isoformat()
+    _enqueue((now, "whisper", model, 0, 0, 0, audio_seconds, cost, "groq"))
 
 
 def get_usage_stats() -> dict:
-    """Get comprehensive usage statistics."""
+    """Get comprehensive usage statistics (from the daily rollups)."""
+    totals = """
+        SELECT
+            COALESCE(SUM(requests), 0) as requests,
+            COALESCE(SUM(input_tokens), 0) as input_tokens,
+            COALESCE(SUM(output_tokens), 0) as output_tokens,
+            COALESCE(SUM(total_tokens), 0) as total_tokens,
+            COALESCE(SUM(audio_seconds), 0) as audio_seconds,
+            COALESCE(SUM(estimated_cost), 0) as cost
+        FROM usage_daily
+    """
     with _conn() as conn:
         # Today's usage
-        today_stats = conn.execute("""
-            SELECT
-                COUNT(*) as requests,
-                COALESCE(SUM(input_tokens), 0) as input_tokens,
-                COALESCE(SUM(output_tokens), 0) as output_tokens,
-                COALESCE(SUM(total_tokens), 0) as total_tokens,
-                COALESCE(SUM(audio_seconds), 0) as audio_seconds,
-                COALESCE(SUM(estimated_cost), 0) as cost
-            FROM groq_usage
-            WHERE DATE(timestamp) = DATE('now')
-        """).fetchone()
+        today_stats = conn.execute(totals + " WHERE day = DATE('now')").fetchone()
 
         # This month's usage
-        month_stats = conn.execute("""
-            SELECT
-                COUNT(*) as requests,
-                COALESCE(SUM(input_tokens), 0) as input_tokens,
-                COALESCE(SUM(output_tokens), 0) as output_tokens,
-                COALESCE(SUM(total_tokens), 0) as total_tokens,
-                COALESCE(SUM(audio_seconds), 0) as audio_seconds,
-                COALESCE(SUM(estimated_cost), 0) as cost
-            FROM groq_usage
-            WHERE strftime('%Y-%m', timestamp) = strftime('%Y-%m', 'now')
-        """).fetchone()
+        month_stats = conn.execute(totals + " WHERE day >= strftime('%Y-%m-01', 'now')").fetchone()
 
         # All time
-        total_stats = conn.execute("""
-            SELECT
-                COUNT(*) as requests,
-                COALESCE(SUM(input_tokens), 0) as input_tokens,
-                COALESCE(SUM(output_tokens), 0) as output_tokens,
-                COALESCE(SUM(total_tokens), 0) as total_tokens,
-                COALESCE(SUM(audio_seconds), 0) as audio_seconds,
-                COALESCE(SUM(estimated_cost), 0) as cost
-            FROM groq_usage
-        """).fetchone()
+        total_stats = conn.execute(totals).fetchone()
 
         # Daily usage (last 30 days)
         daily_usage = conn.execute("""
             SELECT
-                DATE(timestamp) as day,
-                COUNT(*) as requests,
-                COALESCE(SUM(total_tokens), 0) as tokens,
-                COALESCE(SUM(audio_seconds), 0) as audio_seconds,
-                COALESCE(SUM(estimated_cost), 0) as cost
-            FROM groq_usage
-            WHERE timestamp >= DATE('now', '-30 days')
-            GROUP BY DATE(timestamp)
+                day,
+                SUM(requests) as requests,
+                SUM(total_tokens) as tokens,
+                SUM(audio_seconds) as audio_seconds,
+                SUM(estimated_cost) as cost
+            FROM usage_daily
+            WHERE day >= DATE('now', '-30 days')
+            GROUP BY day
             ORDER BY day ASC
         """).fetchall()
 
@@ -170,12 +331,12 @@ def get_usage_stats() -> dict:
             SELECT
                 model,
                 call_type,
-                COALESCE(provider, 'groq') as provider,
-                COUNT(*) as requests,
-                COALESCE(SUM(total_tokens), 0) as tokens,
-                COALESCE(SUM(audio_seconds), 0) as audio_seconds,
-                COALESCE(SUM(estimated_cost), 0) as cost
-            FROM groq_usage
+                provider,
+                SUM(requests) as requests,
+                SUM(total_tokens) as tokens,
+                SUM(audio_seconds) as audio_seconds,
+                SUM(estimated_cost) as cost
+            FROM usage_daily
             GROUP BY model, call_type, provider
             ORDER BY requests DESC
         """).fetchall()
@@ -183,14 +344,14 @@ def get_usage_stats() -> dict:
         # Usage by provider (aggregated)
         provider_usage = conn.execute("""
             SELECT
-                COALESCE(provider, 'groq') as provider,
-                COUNT(*) as requests,
-                COALESCE(SUM(input_tokens), 0) as input_tokens,
-                COALESCE(SUM(output_tokens), 0) as output_tokens,
-                COALESCE(SUM(total_tokens), 0) as total_tokens,
-                COALESCE(SUM(audio_seconds), 0) as audio_seconds,
-                COALESCE(SUM(estimated_cost), 0) as cost
-            FROM groq_usage
+                provider,
+                SUM(requests) as requests,
+                SUM(input_tokens) as input_tokens,
+                SUM(output_tokens) as output_tokens,
+                SUM(total_tokens) as total_tokens,
+                SUM(audio_seconds) as audio_seconds,
+                SUM(estimated_cost) as cost
+            FROM usage_daily
             GROUP BY provider
             ORDER BY requests DESC
         """).fetchall()
@@ -198,12 +359,12 @@ def get_usage_stats() -> dict:
         # Today by provider
         today_by_provider = conn.execute("""
             SELECT
-                COALESCE(provider, 'groq') as provider,
-                COUNT(*) as requests,
-                COALESCE(SUM(total_tokens), 0) as total_tokens,
-                COALESCE(SUM(estimated_cost), 0) as cost
-            FROM groq_usage
-            WHERE DATE(timestamp) = DATE('now')
+                provider,
+                SUM(requests) as requests,
+                SUM(total_tokens) as total_tokens,
+                SUM(estimated_cost) as cost
+            FROM usage_daily
+            WHERE day = DATE('now')
             GROUP BY provider
             ORDER BY requests DESC
         """).fetchall()
@@ -211,12 +372,12 @@ def get_usage_stats() -> dict:
         # This month by provider
         month_by_provider = conn.execute("""
             SELECT
-                COALESCE(provider, 'groq') as provider,
-                COUNT(*) as requests,
-                COALESCE(SUM(total_tokens), 0) as total_tokens,
-                COALESCE(SUM(estimated_cost), 0) as cost
-            FROM groq_usage
-            WHERE strftime('%Y-%m', timestamp) = strftime('%Y-%m', 'now')
+                provider,
+                SUM(requests) as requests,
+                SUM(total_tokens) as total_tokens,
+                SUM(estimated_cost) as cost
+            FROM usage_daily
+            WHERE day >= strftime('%Y-%m-01', 'now')
             GROUP BY provider
             ORDER BY requests DESC
         """).fetchall()
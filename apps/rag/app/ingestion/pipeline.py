@@ -8,6 +8,7 @@ from app.core.embeddings import embed_batch
 from app.core.vectorstore import get_or_create_collection
 from app.ingestion.chunking.strategies import get_chunker, Chunk
 from app.ingestion.processors.registry import registry
+from app.retrieval import bm25_index, result_cache
 
 logger = logging.getLogger(__name__)
 
@@ -186,6 +187,8 @@ def ingest_file(
         embeddings=embeddings,
         metadatas=metadatas,
     )
+    _update_keyword_index(collection_name, ids, plain_texts)
+    result_cache.bump_generation(collection_name)
 
     logger.info(f"Stored {len(all_chunks)} chunks in collection '{collection_name}'")
 
@@ -285,6 +288,8 @@ def ingest_text_blocks(
         embeddings=embeddings,
         metadatas=metadatas,
     )
+    _update_keyword_index(collection_name, ids, plain_texts)
+    result_cache.bump_generation(collection_name)
 
     logger.info(f"Stored {len(all_chunks)} chunks in collection '{collection_name}'")
 
@@ -319,6 +324,18 @@ def ingest_batch(
     return results
 
 
+def _update_keyword_index(collection_name: str, ids: list[str], texts: list[str]):
+    """Add freshly stored chunks to the BM25 index.
+
+    Failures are logged, not raised: the chunks are already in ChromaDB and the
+    index is rebuilt from there on the next search if it falls out of sync.
+    """
+    try:
+        bm25_index.add_documents(collection_name, ids, texts)
+    except Exception as e:
+        logger.warning(f"BM25 index update failed for '{collection_name}': {e}")
+
+
 def _build_embedding_text(content: str, metadata: dict) -> str:
     """Build enriched text for embedding with source context.
 
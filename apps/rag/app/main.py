@@ -129,6 +129,19 @@ async def lifespan(app: FastAPI):
 
     # Shutdown
     logger.info("Shutting down RAG service...")
+    from app.core.llm import close_async_clients
+    await close_async_clients()
+    from app.services.chat_service import stop_summarizer, stop_title_generator
+    stop_summarizer()
+    stop_title_generator()
+    from app.core.usage_tracker import flush_usage
+    if not flush_usage():
+        logger.warning("Queued usage rows were not all written before shutdown")
+    from app.core.database import flush_deferred_writes
+    if not flush_deferred_writes():
+        logger.warning("Deferred chat database writes did not finish before shutdown")
+    from app.core.sqlite_pool import close_all
+    close_all()
 
 
 app = FastAPI(
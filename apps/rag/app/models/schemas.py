@@ -39,6 +39,7 @@ class QueryRequest(BaseModel):
     top_k: int = Field(default=15, ge=1, le=50)
     include_sources: bool = True
     temperature: float = Field(default=0.3, ge=0.0, le=2.0)
+    use_cache: bool = True  # False bypasses the retrieval result cache (debugging)
 
 
 class SourceReference(BaseModel):
@@ -82,6 +83,7 @@ class AgentCreate(BaseModel):
     top_k: int = Field(default=15, ge=1, le=50)
     icon: str = "E"
     use_multi_query: bool = True
+    neighbor_window: int = Field(default=1, ge=0, le=5)
 
 
 class AgentUpdate(BaseModel):
@@ -93,6 +95,7 @@ class AgentUpdate(BaseModel):
     top_k: int | None = Field(default=None, ge=1, le=50)
     icon: str | None = None
     use_multi_query: bool | None = None
+    neighbor_window: int | None = Field(default=None, ge=0, le=5)
 
 
 class AgentInfo(BaseModel):
@@ -105,5 +108,6 @@ class AgentInfo(BaseModel):
     top_k: int = 15
     icon: str = "E"
     use_multi_query: bool = True
+    neighbor_window: int = 1
     created_at: str = ""
     updated_at: str = ""
@@ -0,0 +1,398 @@
+"""
+Persistent BM25 inverted index, maintained incrementally per collection.
+
+Postings, document lengths and document frequencies are stored in a SQLite
+file next to the ChromaDB store. Ingestion and deletion update the index in
+place and bump a per-collection version; queries are scored by a
+``SparseBM25`` matrix that is loaded from the postings once per version and
+kept in memory, instead of re-reading and re-tokenizing every chunk.
+"""
+
+import heapq
+import logging
+import re
+import sqlite3
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = Path(settings.chroma_persist_dir).parent / "bm25.db"
+
+# Okapi BM25 parameters (same defaults as rank_bm25.BM25Okapi)
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+REBUILD_PAGE_SIZE = 1000  # Chunks fetched per page when (re)building from ChromaDB
+_SQL_BATCH = 500          # Stay below SQLite's bound-parameter limit
+
+_schema_ready_for: str | None = None
+_schema_lock = threading.Lock()
+_rebuild_lock = threading.Lock()
+
+# collection -> (version, SparseBM25) loaded from the persisted postings
+_scorers: dict[str, tuple[int, object]] = {}
+_scorers_lock = threading.Lock()
+
+
+def tokenize(text: str) -> list[str]:
+    """Simple tokenization for BM25 (Unicode-aware for Dutch/multilingual text)."""
+    return re.findall(r'\w+', text.lower(), flags=re.UNICODE)
+
+
+def _ensure_schema(conn: sqlite3.Connection):
+    global _schema_ready_for
+    if _schema_ready_for == str(DB_PATH):
+        return
+    with _schema_lock:
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS bm25_stats (
+                collection TEXT PRIMARY KEY,
+                doc_count INTEGER NOT NULL DEFAULT 0,
+                total_length INTEGER NOT NULL DEFAULT 0,
+                version INTEGER NOT NULL DEFAULT 0
+            );
+
+            CREATE TABLE IF NOT EXISTS bm25_docs (
+                collection TEXT NOT NULL,
+                chunk_id TEXT NOT NULL,
+                length INTEGER NOT NULL,
+                PRIMARY KEY (collection, chunk_id)
+            ) WITHOUT ROWID;
+
+            CREATE TABLE IF NOT EXISTS bm25_terms (
+                collection TEXT NOT NULL,
+                term TEXT NOT NULL,
+                df INTEGER NOT NULL,
+                PRIMARY KEY (collection, term)
+            ) WITHOUT ROWID;
+
+            CREATE TABLE IF NOT EXISTS bm25_postings (
+                collection TEXT NOT NULL,
+                term TEXT NOT NULL,
+                chunk_id TEXT NOT NULL,
+                tf INTEGER NOT NULL,
+                PRIMARY KEY (collection, term, chunk_id)
+            ) WITHOUT ROWID;
+
+            CREATE INDEX IF NOT EXISTS idx_bm25_postings_chunk ON bm25_postings(collection, chunk_id);
+        """)
+        # Migration: version counter used to invalidate in-memory scorers
+        try:
+            conn.execute("ALTER TABLE bm25_stats ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        except sqlite3.OperationalError:
+            pass  # Column already exists
+        conn.commit()
+        _schema_ready_for = str(DB_PATH)
+
+
+@contextmanager
+def _conn():
+    DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(DB_PATH), timeout=30.0)
+    conn.execute("PRAGMA journal_mode=WAL")
+    try:
+        _ensure_schema(conn)
+        yield conn
+    finally:
+        conn.close()
+
+
+def _batched(items: list, size: int = _SQL_BATCH):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _placeholders(n: int) -> str:
+    return ",".join("?" * n)
+
+
+# --- Index maintenance ---
+
+def _remove_chunks(conn: sqlite3.Connection, collection: str, chunk_ids: list[str]) -> int:
+    """Remove chunks from the index inside an open transaction. Returns chunks removed."""
+    removed_docs = 0
+    removed_length = 0
+    df_delta: Counter = Counter()
+
+    for batch in _batched(chunk_ids):
+        ph = _placeholders(len(batch))
+        row = conn.execute(
+            f"SELECT COUNT(*), COALESCE(SUM(length), 0) FROM bm25_docs "
+            f"WHERE collection = ? AND chunk_id IN ({ph})",
+            (collection, *batch),
+        ).fetchone()
+        if not row[0]:
+            continue
+        removed_docs += row[0]
+        removed_length += row[1]
+
+        for (term,) in conn.execute(
+            f"SELECT term FROM bm25_postings WHERE collection = ? AND chunk_id IN ({ph})",
+            (collection, *batch),
+        ):
+            df_delta[term] += 1
+
+        conn.execute(
+            f"DELETE FROM bm25_postings WHERE collection = ? AND chunk_id IN ({ph})",
+            (collection, *batch),
+        )
+        conn.execute(
+            f"DELETE FROM bm25_docs WHERE collection = ? AND chunk_id IN ({ph})",
+            (collection, *batch),
+        )
+
+    if not removed_docs:
+        return 0
+
+    conn.executemany(
+        "UPDATE bm25_terms SET df = df - ? WHERE collection = ? AND term = ?",
+        [(n, collection, term) for term, n in df_delta.items()],
+    )
+    conn.execute("DELETE FROM bm25_terms WHERE collection = ? AND df <= 0", (collection,))
+    conn.execute(
+        "UPDATE bm25_stats SET doc_count = doc_count - ?, total_length = total_length - ?, "
+        "version = version + 1 WHERE collection = ?",
+        (removed_docs, removed_length, collection),
+    )
+    return removed_docs
+
+
+def _add_chunks(conn: sqlite3.Connection, collection: str, chunk_ids: list[str], texts: list[str]):
+    """Index chunks inside an open transaction; re-adding an existing chunk ID replaces it."""
+    doc_rows = []
+    posting_rows = []
+    df_delta: Counter = Counter()
+    total_length = 0
+
+    for chunk_id, text in zip(chunk_ids, texts):
+        tf = Counter(tokenize(text or ""))
+        length = sum(tf.values())
+        total_length += length
+        doc_rows.append((collection, chunk_id, length))
+        for term, count in tf.items():
+            posting_rows.append((collection, term, chunk_id, count))
+            df_delta[term] += 1
+
+    # Re-adding an existing chunk ID replaces it instead of double-counting
+    _remove_chunks(conn, collection, list(chunk_ids))
+
+    conn.executemany(
+        "INSERT INTO bm25_docs (collection, chunk_id, length) VALUES (?, ?, ?)",
+        doc_rows,
+    )
+    conn.executemany(
+        "INSERT INTO bm25_postings (collection, term, chunk_id, tf) VALUES (?, ?, ?, ?)",
+        posting_rows,
+    )
+    conn.executemany(
+        "INSERT INTO bm25_terms (collection, term, df) VALUES (?, ?, ?) "
+        "ON CONFLICT(collection, term) DO UPDATE SET df = df + excluded.df",
+        [(collection, term, n) for term, n in df_delta.items()],
+    )
+    conn.execute(
+        "INSERT INTO bm25_stats (collection, doc_count, total_length) VALUES (?, ?, ?) "
+        "ON CONFLICT(collection) DO UPDATE SET "
+        "doc_count = doc_count + excluded.doc_count, "
+        "total_length = total_length + excluded.total_length, "
+        "version = version + 1",
+        (collection, len(doc_rows), total_length),
+    )
+
+
+def add_documents(collection: str, chunk_ids: list[str], texts: list[str]):
+    """Index (or re-index) chunks for a collection in a single transaction."""
+    if not chunk_ids:
+        return
+    with _conn() as conn:
+        _add_chunks(conn, collection, chunk_ids, texts)
+        conn.commit()
+
+
+def remove_documents(collection: str, chunk_ids: list[str]) -> int:
+    """Remove chunks from a collection's index. Returns chunks removed."""
+    if not chunk_ids:
+        return 0
+    with _conn() as conn:
+        removed = _remove_chunks(conn, collection, list(chunk_ids))
+        conn.commit()
+        return removed
+
+
+def _delete_collection(conn: sqlite3.Connection, collection: str):
+    for table in ("bm25_postings", "bm25_terms", "bm25_docs", "bm25_stats"):
+        conn.execute(f"DELETE FROM {table} WHERE collection = ?", (collection,))
+
+
+def drop_collection(collection: str):
+    """Remove the entire index for a collection."""
+    with _conn() as conn:
+        _delete_collection(conn, collection)
+        conn.commit()
+    with _scorers_lock:
+        _scorers.pop(collection, None)
+
+
+def indexed_count(collection: str) -> int | None:
+    """Number of indexed chunks, or None if the collection was never indexed."""
+    with _conn() as conn:
+        row = conn.execute(
+            "SELECT doc_count FROM bm25_stats WHERE collection = ?", (collection,)
+        ).fetchone()
+        return row[0] if row else None
+
+
+def rebuild_collection(collection: str) -> int:
+    """Rebuild a collection's index from the chunks stored in ChromaDB.
+
+    Used to backfill collections that existed before the index did, or that
+    drifted out of sync. Returns the number of chunks indexed.
+
+    The rebuild is one write transaction: readers keep seeing the old index
+    until the new one is complete, and it gets a single new version, higher
+    than any a reader may have cached a scorer for.
+    """
+    from app.core.vectorstore import get_or_create_collection
+
+    col = get_or_create_collection(collection)
+    total = col.count()
+    indexed = 0
+    with _conn() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute("SELECT version FROM bm25_stats WHERE collection = ?", (collection,)).fetchone()
+        version = (row[0] if row else 0) + 1
+        _delete_collection(conn, collection)
+        for offset in range(0, total, REBUILD_PAGE_SIZE):
+            page = col.get(include=["documents"], limit=REBUILD_PAGE_SIZE, offset=offset)
+            if not page["ids"]:
+                break
+            _add_chunks(conn, collection, page["ids"], page["documents"] or [""] * len(page["ids"]))
+            indexed += len(page["ids"])
+        # Also records an empty collection as indexed, so it is not rebuilt on every search
+        conn.execute(
+            "INSERT INTO bm25_stats (collection, version) VALUES (?, ?) "
+            "ON CONFLICT(collection) DO UPDATE SET version = excluded.version",
+            (collection, version),
+        )
+        conn.commit()
+    with _scorers_lock:
+        _scorers.pop(collection, None)
+    logger.info(f"BM25 index rebuilt for '{collection}': {indexed} chunks")
+    return indexed
+
+
+def sync_collection(collection: str, chroma_count: int) -> None:
+    """Make sure the index covers *collection*; rebuild when it is missing or out of sync."""
+    current = indexed_count(collection)
+    if current == chroma_count:
+        return
+    with _rebuild_lock:
+        current = indexed_count(collection)
+        if current == chroma_count:
+            return
+        if current is None:
+            logger.info(f"BM25 index missing for '{collection}', building from ChromaDB")
+        else:
+            logger.warning(
+                f"BM25 index for '{collection}' out of sync ({current} indexed vs "
+                f"{chroma_count} in ChromaDB), rebuilding"
+            )
+        rebuild_collection(collection)
+
+
+# --- Query ---
+
+def _load_scorer(conn: sqlite3.Connection, collection: str):
+    """Build a SparseBM25 for a collection from its persisted postings."""
+    import numpy as np
+    from scipy import sparse
+
+    from app.retrieval.bm25_scorer import SparseBM25
+
+    doc_ids = [r[0] for r in conn.execute(
+        "SELECT chunk_id FROM bm25_docs WHERE collection = ?", (collection,)
+    )]
+    vocabulary = [r[0] for r in conn.execute(
+        "SELECT term FROM bm25_terms WHERE collection = ?", (collection,)
+    )]
+    doc_pos = {chunk_id: i for i, chunk_id in enumerate(doc_ids)}
+    term_pos = {term: i for i, term in enumerate(vocabulary)}
+
+    rows, cols, data = [], [], []
+    for term, chunk_id, tf in conn.execute(
+        "SELECT term, chunk_id, tf FROM bm25_postings WHERE collection = ?", (collection,)
+    ):
+        rows.append(doc_pos[chunk_id])
+        cols.append(term_pos[term])
+        data.append(tf)
+
+    counts = sparse.csr_matrix(
+        (np.asarray(data, dtype=np.float32), (rows, cols)),
+        shape=(len(doc_ids), len(vocabulary)),
+    )
+    return SparseBM25(doc_ids, vocabulary, counts)
+
+
+def _get_scorer(conn: sqlite3.Connection, collection: str, version: int):
+    with _scorers_lock:
+        cached = _scorers.get(collection)
+        if cached and cached[0] == version:
+            return cached[1]
+    scorer = _load_scorer(conn, collection)
+    with _scorers_lock:
+        _scorers[collection] = (version, scorer)
+    logger.info(f"BM25 scorer loaded for '{collection}': {scorer.n_docs} chunks (v{version})")
+    return scorer
+
+
+def search(
+    collection_names: list[str],
+    query: str,
+    top_k: int,
+) -> list[tuple[str, str, float]]:
+    """Score the query against the combined index of *collection_names*.
+
+    IDF uses document frequencies summed across the collections, so term
+    weights match a single index built over all of them; length normalization
+    uses each collection's own average chunk length. Returns (collection,
+    chunk_id, score) tuples for the best *top_k* chunks with a positive score.
+    """
+    from app.retrieval.bm25_scorer import bm25_idf
+
+    query_terms = Counter(tokenize(query))
+    if not query_terms or not collection_names:
+        return []
+
+    with _conn() as conn:
+        # One read transaction so versions and postings come from the same snapshot
+        conn.execute("BEGIN")
+        versions = conn.execute(
+            f"SELECT collection, version FROM bm25_stats "
+            f"WHERE collection IN ({_placeholders(len(collection_names))}) AND doc_count > 0",
+            collection_names,
+        ).fetchall()
+        scorers = [(col, _get_scorer(conn, col, version)) for col, version in versions]
+        conn.commit()
+
+    n_docs = sum(scorer.n_docs for _, scorer in scorers)
+    if not n_docs:
+        return []
+
+    weights = {}
+    for term, qtf in query_terms.items():
+        df = sum(scorer.doc_freq(term) for _, scorer in scorers)
+        if df:
+            weights[term] = qtf * bm25_idf(n_docs, df)
+    if not weights:
+        return []
+
+    hits = [
+        (col, chunk_id, score)
+        for col, scorer in scorers
+        for chunk_id, score in scorer.top_k(weights, top_k)
+    ]
+    return heapq.nlargest(top_k, hits, key=lambda hit: hit[2])
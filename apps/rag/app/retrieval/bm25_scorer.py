@@ -0,0 +1,131 @@
+"""
+Vectorized BM25 scoring over a sparse term-document matrix.
+
+The corpus is stored as a term-major CSR matrix whose entries are the
+length-normalized, saturated term frequencies of Okapi BM25. Scoring a query
+is then a single sparse vector-matrix product that only touches the rows of
+the query's terms, and top-k selection uses ``argpartition`` instead of a full
+sort over every document.
+"""
+
+import math
+from collections import Counter
+
+import numpy as np
+from scipy import sparse
+
+from app.retrieval.bm25_index import BM25_B, BM25_K1, tokenize
+
+
+def bm25_idf(n_docs: int, df: int) -> float:
+    """Non-negative BM25 IDF.
+
+    IDF depends on the corpus size, so the persistent index stores only
+    document frequencies and IDF is derived at query time. The ``+1`` keeps
+    very common terms at a small positive weight instead of rank_bm25's
+    negative-IDF epsilon floor, which needs the average IDF of the whole
+    vocabulary.
+    """
+    return math.log((n_docs - df + 0.5) / (df + 0.5) + 1.0)
+
+
+class SparseBM25:
+    """BM25 scorer holding a corpus as a CSR term-document matrix."""
+
+    def __init__(
+        self,
+        doc_ids: list[str],
+        vocabulary: list[str],
+        counts: sparse.spmatrix,
+        k1: float = BM25_K1,
+        b: float = BM25_B,
+    ):
+        """Build from a (documents x terms) matrix of raw term counts."""
+        counts = sparse.csr_matrix(counts, dtype=np.float32)
+        counts.sum_duplicates()
+
+        self.doc_ids = doc_ids
+        self.term_index = {term: i for i, term in enumerate(vocabulary)}
+        self.n_docs = counts.shape[0]
+        self.k1 = k1
+        self.b = b
+
+        lengths = np.asarray(counts.sum(axis=1)).ravel()
+        self.total_length = int(lengths.sum())
+        avgdl = self.total_length / self.n_docs if self.n_docs and self.total_length else 1.0
+        self.doc_freqs = np.diff(counts.tocsc().indptr).astype(np.int64)
+
+        # Saturate every stored tf in place: tf * (k1 + 1) / (tf + k1 * norm(doc))
+        norms = k1 * (1 - b + b * lengths / avgdl)
+        row_of_entry = np.repeat(np.arange(self.n_docs), np.diff(counts.indptr))
+        tf = counts.data
+        counts.data = (tf * (k1 + 1) / (tf + norms[row_of_entry])).astype(np.float32)
+
+        # Term-major so a query only reads the rows of its own terms
+        self.matrix = counts.T.tocsr()
+
+    @classmethod
+    def from_texts(cls, doc_ids: list[str], texts: list[str], **kwargs) -> "SparseBM25":
+        """Tokenize raw texts with the same tokenizer as the persistent index."""
+        vocabulary: dict[str, int] = {}
+        rows, cols, data = [], [], []
+        for doc_idx, text in enumerate(texts):
+            for term, tf in Counter(tokenize(text or "")).items():
+                rows.append(doc_idx)
+                cols.append(vocabulary.setdefault(term, len(vocabulary)))
+                data.append(tf)
+        counts = sparse.csr_matrix(
+            (np.asarray(data, dtype=np.float32), (rows, cols)),
+            shape=(len(texts), len(vocabulary)),
+        )
+        return cls(doc_ids, list(vocabulary), counts, **kwargs)
+
+    def doc_freq(self, term: str) -> int:
+        idx = self.term_index.get(term)
+        return int(self.doc_freqs[idx]) if idx is not None else 0
+
+    def term_weights(self, query: str) -> dict[str, float]:
+        """Query term weights (query tf x IDF) using this corpus' own statistics."""
+        weights = {}
+        for term, qtf in Counter(tokenize(query)).items():
+            df = self.doc_freq(term)
+            if df:
+                weights[term] = qtf * bm25_idf(self.n_docs, df)
+        return weights
+
+    def top_k(self, weights: dict[str, float], k: int) -> list[tuple[str, float]]:
+        """Return the *k* best (doc_id, score) pairs with a positive score.
+
+        *weights* maps query terms to their weight (query tf x IDF). Passing
+        weights in lets callers score several collections with IDF computed
+        over their combined statistics.
+        """
+        cols, vals = [], []
+        for term, weight in weights.items():
+            idx = self.term_index.get(term)
+            if idx is not None and weight:
+                cols.append(idx)
+                vals.append(weight)
+        if not cols or k <= 0:
+            return []
+
+        query_vec = sparse.csr_matrix(
+            (np.asarray(vals, dtype=np.float32), ([0] * len(cols), cols)),
+            shape=(1, self.matrix.shape[0]),
+        )
+        scores = query_vec @ self.matrix
+        doc_idx, doc_scores = scores.indices, scores.data
+
+        if len(doc_scores) > k:
+            part = np.argpartition(-doc_scores, k - 1)[:k]
+            doc_idx, doc_scores = doc_idx[part], doc_scores[part]
+        order = np.argsort(-doc_scores, kind="stable")
+
+        return [
+            (self.doc_ids[doc_idx[i]], float(doc_scores[i]))
+            for i in order
+            if doc_scores[i] > 0
+        ]
+
+    def search(self, query: str, k: int) -> list[tuple[str, float]]:
+        return self.top_k(self.term_weights(query), k)
@@ -0,0 +1,119 @@
+"""
+Cross-encoder backends for re-ranking.
+
+``torch`` loads sentence-transformers' ``CrossEncoder``. ``onnx`` runs an
+exported (optionally int8-quantized) copy of the same model with ONNX Runtime
+and the Rust ``tokenizers`` library, which avoids PyTorch entirely and is
+considerably faster on CPU-only hosts. Both expose
+``predict(pairs, batch_size=...)`` returning one relevance logit per
+(query, passage) pair, so callers don't care which one is loaded.
+"""
+
+import logging
+from pathlib import Path
+
+import numpy as np
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class OnnxCrossEncoder:
+    """Cross-encoder inference on ONNX Runtime."""
+
+    def __init__(self, session, tokenizer, max_length: int = 512):
+        self.session = session
+        self.input_names = {i.name for i in session.get_inputs()}
+        self.tokenizer = tokenizer
+        self.tokenizer.enable_truncation(max_length=max_length, strategy="longest_first")
+        self.tokenizer.no_padding()  # Padding is done per batch in predict()
+        self.pad_id = tokenizer.token_to_id("[PAD]") or 0
+
+    @classmethod
+    def load(cls, model_name: str, onnx_file: str, max_length: int, threads: int = 0) -> "OnnxCrossEncoder":
+        """Load *onnx_file* — a local path, or a file inside the *model_name* hub repo."""
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        local = Path(onnx_file)
+        if local.is_file():
+            model_path = local
+            tokenizer_path = local.parent / "tokenizer.json"
+        else:
+            from huggingface_hub import hf_hub_download
+            model_path = Path(hf_hub_download(model_name, onnx_file))
+            tokenizer_path = Path(hf_hub_download(model_name, "tokenizer.json"))
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads > 0:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        session = ort.InferenceSession(str(model_path), sess_options=options, providers=["CPUExecutionProvider"])
+        return cls(session, Tokenizer.from_file(str(tokenizer_path)), max_length)
+
+    def predict(self, pairs: list[tuple[str, str]], batch_size: int = 16) -> np.ndarray:
+        """Score (query, passage) pairs, returning logits in input order.
+
+        Pairs are sorted by token length and each batch is padded only to its
+        own longest pair, so short passages don't pay for long ones.
+        """
+        if not pairs:
+            return np.zeros(0, dtype=np.float32)
+
+        encodings = self.tokenizer.encode_batch([(q, p) for q, p in pairs])
+        order = sorted(range(len(encodings)), key=lambda i: len(encodings[i].ids))
+        scores = np.empty(len(pairs), dtype=np.float32)
+
+        for start in range(0, len(order), batch_size):
+            idx = order[start:start + batch_size]
+            width = max(len(encodings[i].ids) for i in idx)
+            input_ids = np.full((len(idx), width), self.pad_id, dtype=np.int64)
+            attention_mask = np.zeros((len(idx), width), dtype=np.int64)
+            token_type_ids = np.zeros((len(idx), width), dtype=np.int64)
+            for row, i in enumerate(idx):
+                enc = encodings[i]
+                n = len(enc.ids)
+                input_ids[row, :n] = enc.ids
+                attention_mask[row, :n] = 1
+                token_type_ids[row, :n] = enc.type_ids
+
+            feeds = {
+                "input_ids": input_ids,
+                "attention_mask": attention_mask,
+                "token_type_ids": token_type_ids,
+            }
+            logits = self.session.run(None, {k: v for k, v in feeds.items() if k in self.input_names})[0]
+            scores[idx] = np.asarray(logits, dtype=np.float32).reshape(len(idx), -1)[:, 0]
+
+        return scores
+
+
+def _load_torch_cross_encoder():
+    from sentence_transformers import CrossEncoder
+
+    if settings.reranker_threads > 0:
+        import torch
+        torch.set_num_threads(settings.reranker_threads)
+    return CrossEncoder(settings.reranker_model, max_length=settings.reranker_max_length)
+
+
+def load_cross_encoder():
+    """Load the configured cross-encoder backend, falling back to torch if ONNX fails."""
+    if settings.reranker_backend.lower() == "onnx":
+        try:
+            model = OnnxCrossEncoder.load(
+                settings.reranker_model,
+                settings.reranker_onnx_file,
+                max_length=settings.reranker_max_length,
+                threads=settings.reranker_threads,
+            )
+            logger.info(f"Loaded ONNX cross-encoder: {settings.reranker_model} ({settings.reranker_onnx_file})")
+            return model
+        except Exception as e:
+            logger.warning(f"ONNX cross-encoder unavailable ({e}), falling back to sentence-transformers")
+
+    model = _load_torch_cross_encoder()
+    logger.info(f"Loaded cross-encoder model: {settings.reranker_model}")
+    return model
@@ -0,0 +1,102 @@
+"""
+Cache of final ``retrieve()`` results, invalidated per collection.
+
+Every write to a collection (ingest, document delete, micro-chunk cleanup,
+collection removal) bumps that collection's generation and a global one.
+Cache keys include the generations of the collections a query searched — or
+the global generation when it searched all of them — so entries for a changed
+collection simply stop matching and age out of the LRU.
+
+Generations live in process memory. Writes from another process (e.g.
+``scripts/bulk_ingest.py``) are only picked up once entries expire after the TTL.
+"""
+
+import dataclasses
+import threading
+import time
+from collections import OrderedDict
+
+_generations: dict[str, int] = {}
+_global_generation = 0
+_generation_lock = threading.Lock()
+
+_CHUNK_OVERHEAD_BYTES = 400  # Rough per-chunk cost of the dataclass, metadata dict and key
+
+
+def bump_generation(collection_name: str):
+    """Invalidate cached results that searched *collection_name* (or all collections)."""
+    global _global_generation
+    with _generation_lock:
+        _generations[collection_name] = _generations.get(collection_name, 0) + 1
+        _global_generation += 1
+
+
+def generation_key(collection_names: list[str] | None) -> tuple:
+    """Current generations for a set of collections; None means all collections."""
+    with _generation_lock:
+        if not collection_names:
+            return ("*", _global_generation)
+        return tuple((name, _generations.get(name, 0)) for name in sorted(set(collection_names)))
+
+
+class RetrievalResultCache:
+    """LRU of retrieval results bounded by an estimate of their memory use, with a TTL."""
+
+    def __init__(self, max_bytes: int, ttl_seconds: float):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[tuple, tuple[list, int, float]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _copy(chunks: list) -> list:
+        # Callers mutate relevance_score/metadata, so never hand out the cached objects
+        return [dataclasses.replace(c, metadata=dict(c.metadata)) for c in chunks]
+
+    @staticmethod
+    def _size(chunks: list) -> int:
+        return sum(len(c.content) + _CHUNK_OVERHEAD_BYTES for c in chunks)
+
+    def get(self, key: tuple) -> list | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] < time.monotonic():
+                self._discard(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._copy(entry[0])
+
+    def put(self, key: tuple, chunks: list):
+        size = self._size(chunks)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (self._copy(chunks), size, time.monotonic() + self.ttl_seconds)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._discard(next(iter(self._entries)))
+
+    def _discard(self, key: tuple):
+        """Remove an entry. Caller holds ``self._lock``."""
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries),
+                "size_mb": round(self._bytes / 1024 / 1024, 2),
+            }
@@ -1,42 +1,152 @@
 import logging
 import re
 import threading
-from dataclasses import dataclass
-
-from rank_bm25 import BM25Okapi
+import time
+from collections import OrderedDict
+from collections.abc import Generator, Hashable
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeout
+from dataclasses import dataclass, replace
+from typing import Any
 
 from app.config import settings
 from app.core.embeddings import embed_text, embed_batch
 from app.core.vectorstore import get_or_create_collection, list_collections
 from app.core.llm import generate
+from app.retrieval import bm25_index, result_cache
+from app.retrieval.reranker import load_cross_encoder
 
 logger = logging.getLogger(__name__)
 
 _cross_encoder = None
 _cross_encoder_lock = threading.Lock()
+_search_pool: ThreadPoolExecutor | None = None
+_search_pool_lock = threading.Lock()
+_expansion_pool: ThreadPoolExecutor | None = None
+_expansion_pool_lock = threading.Lock()
 
 
 def _get_cross_encoder():
-    """Lazy-load cross-encoder model (singleton)."""
+    """Lazy-load cross-encoder model (singleton, torch or ONNX backend per settings)."""
     global _cross_encoder
     if _cross_encoder is None:
         with _cross_encoder_lock:
             if _cross_encoder is None:
                 try:
-                    from sentence_transformers import CrossEncoder
-                    _cross_encoder = CrossEncoder("cross-encoder/ms-marco-MiniLM-L-6-v2")
-                    logger.info("Loaded cross-encoder model: ms-marco-MiniLM-L-6-v2")
+                    _cross_encoder = load_cross_encoder()
                 except Exception as e:
                     logger.warning(f"Failed to load cross-encoder: {e}")
     return _cross_encoder
 
 
+def _get_search_pool() -> ThreadPoolExecutor:
+    """Bounded thread pool for concurrent per-collection Chroma queries (singleton)."""
+    global _search_pool
+    if _search_pool is None:
+        with _search_pool_lock:
+            if _search_pool is None:
+                _search_pool = ThreadPoolExecutor(
+                    max_workers=settings.retrieval_max_workers,
+                    thread_name_prefix="chroma-search",
+                )
+    return _search_pool
+
+
+def _get_expansion_pool() -> ThreadPoolExecutor:
+    """Thread pool for multi-query LLM calls, kept apart from the search pool (singleton)."""
+    global _expansion_pool
+    if _expansion_pool is None:
+        with _expansion_pool_lock:
+            if _expansion_pool is None:
+                _expansion_pool = ThreadPoolExecutor(
+                    max_workers=settings.retrieval_max_workers,
+                    thread_name_prefix="query-expansion",
+                )
+    return _expansion_pool
+
+
 @dataclass
 class RetrievedChunk:
     content: str
     metadata: dict
     relevance_score: float
     source_file: str
+    chunk_id: str = ""  # ChromaDB id; stable for the life of the chunk
+    collection: str = ""  # Collection the chunk was retrieved from
+
+
+class TTLCache:
+    """Bounded LRU with a per-entry TTL and hit/miss counters."""
+
+    def __init__(self, max_items: int, ttl_seconds: float):
+        self.max_items = max_items
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[Hashable, tuple[Any, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, keys: list[Hashable]) -> list[Any | None]:
+        now = time.monotonic()
+        found: list[Any | None] = []
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None and entry[1] < now:
+                    del self._entries[key]
+                    entry = None
+                if entry is None:
+                    found.append(None)
+                else:
+                    self._entries.move_to_end(key)
+                    found.append(entry[0])
+            hits = sum(1 for value in found if value is not None)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return found
+
+    def put_many(self, items: list[tuple[Hashable, Any]]):
+        expires = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            for key, value in items:
+                self._entries[key] = (value, expires)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "size": len(self._entries),
+            }
+
+
+# Cross-encoder scores keyed by (normalized query, chunk id). Chunk ids are
+# UUID-based and change whenever a document is re-ingested, so a cached score
+# can never belong to different content.
+_rerank_cache = TTLCache(settings.rerank_cache_size, settings.rerank_cache_ttl_seconds)
+
+# Multi-query expansions keyed by normalized question
+_expansion_cache = TTLCache(settings.multi_query_cache_size, settings.multi_query_cache_ttl_seconds)
+
+
+_result_cache = result_cache.RetrievalResultCache(
+    max_bytes=settings.retrieval_cache_max_mb * 1024 * 1024,
+    ttl_seconds=settings.retrieval_cache_ttl_seconds,
+)
+
+
+def get_rerank_cache_stats() -> dict:
+    return _rerank_cache.stats()
+
+
+def _normalize_query(query: str) -> str:
+    """Case-, punctuation- and whitespace-insensitive form of a query for cache keys."""
+    return " ".join(re.findall(r"\w+", query.lower()))
 
 
 MULTI_QUERY_PROMPT = """You are an AI assistant helping to retrieve relevant documents.
@@ -48,11 +158,6 @@ Reply with ONLY the 3 alternative questions, one per line. No numbering, no extr
 Original question: {question}"""
 
 
-def _tokenize(text: str) -> list[str]:
-    """Simple tokenization for BM25 (Unicode-aware for Dutch/multilingual text)."""
-    return re.findall(r'\w+', text.lower(), flags=re.UNICODE)
-
-
 def retrieve(
     query: str,
     collection_name: str | None = None,
@@ -60,37 +165,113 @@ def retrieve(
     top_k: int | None = None,
     use_multi_query: bool = True,
     use_hybrid: bool = True,
+    use_cache: bool = True,
+    neighbor_window: int | None = None,
 ) -> list[RetrievedChunk]:
     """
     Hybrid retrieval: combines semantic search (ChromaDB) with keyword search (BM25).
 
     Uses Reciprocal Rank Fusion (RRF) to merge rankings from both methods.
+    Results are cached until one of the searched collections changes;
+    pass ``use_cache=False`` to bypass the cache.
+    """
+    for stage, chunks in retrieve_staged(
+        query, collection_name, collection_names, top_k,
+        use_multi_query, use_hybrid, use_cache, neighbor_window,
+    ):
+        if stage == "final":
+            return chunks
+    return []
+
+
+def retrieve_staged(
+    query: str,
+    collection_name: str | None = None,
+    collection_names: list[str] | None = None,
+    top_k: int | None = None,
+    use_multi_query: bool = True,
+    use_hybrid: bool = True,
+    use_cache: bool = True,
+    neighbor_window: int | None = None,
+) -> Generator[tuple[str, list[RetrievedChunk]], None, None]:
+    """Staged variant of :func:`retrieve` for streaming callers.
+
+    Yields ``("provisional", chunks)`` with the original query's semantic hits
+    as soon as they are in — before multi-query, BM25, re-ranking and neighbor
+    expansion — then ``("final", chunks)``, exactly what ``retrieve`` returns.
+    Cache hits yield only the final stage.
     """
     top_k = top_k or settings.top_k
+    window = settings.neighbor_window if neighbor_window is None else neighbor_window
+    args = (query, collection_name, collection_names, top_k, use_multi_query, use_hybrid, window)
+    use_cache = use_cache and settings.retrieval_cache_enabled
+
+    key = None
+    if use_cache:
+        key = (
+            _normalize_query(query),
+            result_cache.generation_key(collection_names or ([collection_name] if collection_name else None)),
+            top_k,
+            use_multi_query,
+            use_hybrid,
+            window,
+        )
+        cached = _result_cache.get(key)
+        if cached is not None:
+            logger.info(f"Retrieval cache hit: {len(cached)} chunks")
+            yield "final", cached
+            return
+
+    for stage, chunks, complete in _retrieval_stages(*args):
+        if stage == "final" and key is not None and complete:
+            # Results that missed the multi-query budget aren't cached, so a repeat
+            # (with the expansion cached by then) gets the full result.
+            _result_cache.put(key, chunks)
+        yield stage, chunks
+
+
+def get_retrieval_cache_stats() -> dict:
+    return _result_cache.stats()
+
+
+def _retrieval_stages(
+    query: str,
+    collection_name: str | None,
+    collection_names: list[str] | None,
+    top_k: int,
+    use_multi_query: bool,
+    use_hybrid: bool,
+    neighbor_window: int = 1,
+) -> Generator[tuple[str, list[RetrievedChunk], bool], None, None]:
+    """Run the retrieval pipeline, yielding (stage, chunks, complete).
+
+    The provisional stage holds copies, since the pipeline goes on to rescore
+    the same chunk objects. complete is False when the multi-query
+    alternatives missed their latency budget.
+    """
     fetch_k = settings.max_context_chunks
+    started = time.monotonic()
 
-    # Build list of queries (original + alternatives)
-    queries = [query]
-    if use_multi_query:
-        try:
-            alt_queries = _generate_alternative_queries(query)
-            queries.extend(alt_queries)
-            logger.info(f"Multi-query: searching with {len(queries)} queries")
-        except Exception as e:
-            logger.warning(f"Multi-query generation failed, using original only: {e}")
+    # Multi-query expansion runs in the background while the original query is searched
+    expansion = _start_query_expansion(query) if use_multi_query else None
 
     # --- Semantic search ---
-    query_embeddings = embed_batch(queries)
+    semantic_results = _semantic_search([query], collection_name, collection_names, fetch_k)
 
-    semantic_results: list[RetrievedChunk] = []
-    for query_embedding in query_embeddings:
-        if collection_names:
-            results = _search_multiple_collections(collection_names, query_embedding, fetch_k)
-        elif collection_name:
-            results = _search_collection(collection_name, query_embedding, fetch_k)
-        else:
-            results = _search_all_collections(query_embedding, fetch_k)
-        semantic_results.extend(results)
+    provisional = sorted(_deduplicate_chunks(semantic_results), key=lambda c: c.relevance_score)[:top_k]
+    yield "provisional", [replace(c) for c in provisional], False
+
+    # BM25 only needs the original query, so run it while the expansion is pending
+    bm25_results = None
+    if use_hybrid and semantic_results:
+        bm25_results = _bm25_search(query, collection_name, collection_names, fetch_k)
+
+    complete = True
+    if expansion is not None:
+        alt_queries, complete = _await_query_expansion(expansion, started)
+        if alt_queries:
+            logger.info(f"Multi-query: searching with {len(alt_queries) + 1} queries")
+            semantic_results += _semantic_search(alt_queries, collection_name, collection_names, fetch_k)
 
     # Deduplicate semantic results
     semantic_deduped = _deduplicate_chunks(semantic_results)
@@ -98,7 +279,8 @@ def retrieve(
 
     # --- BM25 keyword search (if enabled and there are semantic results to compare against) ---
     if use_hybrid and semantic_deduped:
-        bm25_results = _bm25_search(query, collection_name, collection_names, fetch_k)
+        if bm25_results is None:
+            bm25_results = _bm25_search(query, collection_name, collection_names, fetch_k)
 
         if bm25_results:
             # Reciprocal Rank Fusion
@@ -126,10 +308,64 @@ def retrieve(
     result = relevant[:top_k]
 
     # Expand top results with surrounding chunks for richer context
-    result = _expand_with_neighbors(result, collection_name, collection_names)
+    result = _expand_with_neighbors(result, collection_name, collection_names, window=neighbor_window)
 
     logger.info(f"Retrieved {len(result)} chunks (threshold={threshold})")
-    return result
+    yield "final", result, complete
+
+
+def _semantic_search(
+    queries: list[str],
+    collection_name: str | None,
+    collection_names: list[str] | None,
+    fetch_k: int,
+) -> list[RetrievedChunk]:
+    query_embeddings = embed_batch(queries)
+    if collection_names:
+        return _search_multiple_collections(collection_names, query_embeddings, fetch_k)
+    if collection_name:
+        return _search_collection(collection_name, query_embeddings, fetch_k)
+    return _search_all_collections(query_embeddings, fetch_k)
+
+
+def _start_query_expansion(query: str) -> list[str] | Future:
+    """Return cached alternative queries, or a future generating them."""
+    key = _normalize_query(query)
+    cached = _expansion_cache.get_many([key])[0]
+    if cached is not None:
+        return cached
+
+    future = _get_expansion_pool().submit(_generate_alternative_queries, query)
+
+    def remember(f: Future):
+        # Also runs when the caller gave up waiting, so the next ask is a cache hit
+        if not f.cancelled() and f.exception() is None:
+            _expansion_cache.put_many([(key, f.result())])
+
+    future.add_done_callback(remember)
+    return future
+
+
+def _await_query_expansion(expansion: list[str] | Future, started: float) -> tuple[list[str], bool]:
+    """Wait for alternative queries until the multi-query latency budget runs out.
+
+    Returns (alternatives, complete); complete is False when the budget ran out
+    or the expansion failed, so the degraded result is not cached.
+    """
+    if isinstance(expansion, list):
+        return expansion, True
+    remaining = settings.multi_query_budget_seconds - (time.monotonic() - started)
+    try:
+        return expansion.result(timeout=max(remaining, 0.0)), True
+    except FuturesTimeout:
+        logger.info(
+            f"Multi-query expansion exceeded {settings.multi_query_budget_seconds}s budget, "
+            "continuing with the original query only"
+        )
+        return [], False
+    except Exception as e:
+        logger.warning(f"Multi-query generation failed, using original only: {e}")
+        return [], False
 
 
 def _cross_encoder_rerank(
@@ -151,15 +387,31 @@ def _cross_encoder_rerank(
     rest = chunks[max_candidates:]
 
     try:
-        pairs = [(query, c.content[:512]) for c in candidates]
-        scores = reranker.predict(pairs)
+        # Only score pairs we haven't seen; chunks without an id are always scored
+        query_key = _normalize_query(query)
+        keys = [(query_key, c.chunk_id) for c in candidates]
+        scores: list[float | None] = [None] * len(candidates)
+        cacheable = [i for i, key in enumerate(keys) if key[1]]
+        for i, score in zip(cacheable, _rerank_cache.get_many([keys[i] for i in cacheable])):
+            scores[i] = score
+
+        unscored = [i for i, score in enumerate(scores) if score is None]
+        if unscored:
+            pairs = [(query, candidates[i].content[:512]) for i in unscored]
+            fresh = reranker.predict(pairs, batch_size=settings.reranker_batch_size)
+            for i, score in zip(unscored, fresh):
+                scores[i] = float(score)
+            _rerank_cache.put_many([(keys[i], scores[i]) for i in unscored if keys[i][1]])
 
         for chunk, score in zip(candidates, scores):
             # Normalize cross-encoder logit to 0-1 range (lower = better to match cosine distance convention)
             chunk.relevance_score = max(0.0, 1.0 - (float(score) + 10) / 20.0)
 
         candidates.sort(key=lambda c: c.relevance_score)
-        logger.info(f"Cross-encoder re-ranked {len(candidates)} chunks")
+        logger.info(
+            f"Cross-encoder re-ranked {len(candidates)} chunks "
+            f"({len(candidates) - len(unscored)} scores from cache)"
+        )
         return candidates + rest
     except Exception as e:
         logger.warning(f"Cross-encoder re-ranking failed: {e}")
@@ -172,11 +424,8 @@ def _bm25_search(
     collection_names: list[str] | None,
     top_k: int,
 ) -> list[RetrievedChunk]:
-    """Keyword search using BM25 over collection documents."""
-    BM25_MAX_DOCS = 10_000  # Cap to prevent OOM on large collections
-
+    """Keyword search using the persistent BM25 index of the target collections."""
     try:
-        # Gather all documents from target collections
         target_collections = []
         if collection_names:
             target_collections = collection_names
@@ -190,55 +439,52 @@ def _bm25_search(
                 if not (c.name if hasattr(c, "name") else str(c)).startswith("chatfiles-")
             ]
 
-        all_docs = []
-        all_metadatas = []
-        all_collection_names = []
-
+        # Backfill the index for collections created before it existed
+        searchable = []
         for col_name in target_collections:
-            if len(all_docs) >= BM25_MAX_DOCS:
-                logger.warning(f"BM25: hit {BM25_MAX_DOCS} doc cap, skipping remaining collections")
-                break
             try:
-                col = get_or_create_collection(col_name)
-                count = col.count()
+                count = get_or_create_collection(col_name).count()
                 if count == 0:
                     continue
-                # Get documents from collection (capped to prevent OOM)
-                fetch_limit = min(count, BM25_MAX_DOCS - len(all_docs))
-                result = col.get(include=["documents", "metadatas"], limit=fetch_limit)
-                if result["documents"]:
-                    all_docs.extend(result["documents"])
-                    all_metadatas.extend(result["metadatas"] or [{}] * len(result["documents"]))
-                    all_collection_names.extend([col_name] * len(result["documents"]))
+                bm25_index.sync_collection(col_name, count)
+                searchable.append(col_name)
             except Exception as e:
-                logger.warning(f"BM25: failed to read collection '{col_name}': {e}")
+                logger.warning(f"BM25: failed to index collection '{col_name}': {e}")
 
-        if not all_docs:
+        hits = bm25_index.search(searchable, query, top_k)
+        if not hits:
             return []
 
-        # Build BM25 index
-        tokenized_docs = [_tokenize(doc) for doc in all_docs]
-        bm25 = BM25Okapi(tokenized_docs)
-
-        # Score
-        tokenized_query = _tokenize(query)
-        scores = bm25.get_scores(tokenized_query)
+        # Fetch text + metadata for the top hits only
+        ids_by_collection: dict[str, list[str]] = {}
+        for col_name, chunk_id, _ in hits:
+            ids_by_collection.setdefault(col_name, []).append(chunk_id)
 
-        # Get top results
-        scored = list(enumerate(scores))
-        scored.sort(key=lambda x: x[1], reverse=True)
+        fetched: dict[tuple[str, str], tuple[str, dict]] = {}
+        for col_name, ids in ids_by_collection.items():
+            try:
+                result = get_or_create_collection(col_name).get(
+                    ids=ids, include=["documents", "metadatas"],
+                )
+                for i, chunk_id in enumerate(result["ids"]):
+                    metadata = result["metadatas"][i] if result["metadatas"] else {}
+                    fetched[(col_name, chunk_id)] = (result["documents"][i], metadata or {})
+            except Exception as e:
+                logger.warning(f"BM25: failed to read chunks from '{col_name}': {e}")
 
         results = []
-        for idx, score in scored[:top_k]:
-            if score <= 0:
+        for col_name, chunk_id, score in hits:
+            if (col_name, chunk_id) not in fetched:
                 continue
-            metadata = all_metadatas[idx] if idx < len(all_metadatas) else {}
+            content, metadata = fetched[(col_name, chunk_id)]
             results.append(RetrievedChunk(
-                content=all_docs[idx],
+                content=content,
                 metadata=metadata,
                 # Normalize BM25 score to a 0-1 range (lower = better, to match cosine distance)
                 relevance_score=max(0.0, 1.0 - min(score / 20.0, 1.0)),
                 source_file=metadata.get("source_file", "unknown"),
+                chunk_id=chunk_id,
+                collection=col_name,
             ))
 
         return results
@@ -304,68 +550,103 @@ def _generate_alternative_queries(question: str) -> list[str]:
 
 def _search_multiple_collections(
     collection_names: list[str],
-    query_embedding: list[float],
+    query_embeddings: list[list[float]],
     top_k: int,
 ) -> list[RetrievedChunk]:
-    """Search across a specific set of collections (for Agent mode)."""
+    """Search across a specific set of collections (for Agent mode).
+
+    Collections are searched concurrently, each with one Chroma query for all
+    query embeddings. Results are returned query-major (all collections for
+    query 1, then query 2, ...) — the order the old per-query loop produced,
+    so deduplication picks the same chunks.
+    """
+    if len(collection_names) == 1:
+        per_collection = [_search_collection_per_query(collection_names[0], query_embeddings, top_k)]
+    else:
+        per_collection = list(_get_search_pool().map(
+            lambda name: _search_collection_per_query(name, query_embeddings, top_k),
+            collection_names,
+        ))
+
     all_results: list[RetrievedChunk] = []
-    for name in collection_names:
-        results = _search_collection(name, query_embedding, top_k)
-        all_results.extend(results)
+    for qi in range(len(query_embeddings)):
+        for results in per_collection:
+            all_results.extend(results[qi])
     return all_results
 
 
 def _search_all_collections(
-    query_embedding: list[float],
+    query_embeddings: list[list[float]],
     top_k: int,
 ) -> list[RetrievedChunk]:
     """Search across all collections."""
-    all_results: list[RetrievedChunk] = []
-    collections = list_collections()
-    for col in collections:
+    names = []
+    for col in list_collections():
         name = col.name if hasattr(col, "name") else str(col)
         if name.startswith("chatfiles-"):
             continue  # Skip session attachment collections in global search
-        results = _search_collection(name, query_embedding, top_k)
-        all_results.extend(results)
-    return all_results
+        names.append(name)
+    if not names:
+        return []
+    return _search_multiple_collections(names, query_embeddings, top_k)
 
 
 def _search_collection(
     collection_name: str,
-    query_embedding: list[float],
+    query_embeddings: list[list[float]],
     top_k: int,
 ) -> list[RetrievedChunk]:
-    """Search a single collection."""
+    """Search a single collection with one or more query embeddings."""
+    return [
+        chunk
+        for results in _search_collection_per_query(collection_name, query_embeddings, top_k)
+        for chunk in results
+    ]
+
+
+def _search_collection_per_query(
+    collection_name: str,
+    query_embeddings: list[list[float]],
+    top_k: int,
+) -> list[list[RetrievedChunk]]:
+    """Query a collection once for all embeddings; returns one result list per embedding."""
+    empty: list[list[RetrievedChunk]] = [[] for _ in query_embeddings]
     try:
         collection = get_or_create_collection(collection_name)
 
-        if collection.count() == 0:
-            return []
+        count = collection.count()
+        if count == 0:
+            return empty
 
         results = collection.query(
-            query_embeddings=[query_embedding],
-            n_results=min(top_k, collection.count()),
+            query_embeddings=query_embeddings,
+            n_results=min(top_k, count),
             include=["documents", "metadatas", "distances"],
         )
 
-        chunks: list[RetrievedChunk] = []
-        if results["documents"] and results["documents"][0]:
-            for i, doc in enumerate(results["documents"][0]):
-                metadata = results["metadatas"][0][i] if results["metadatas"] else {}
-                distance = results["distances"][0][i] if results["distances"] else 1.0
+        per_query: list[list[RetrievedChunk]] = []
+        for qi in range(len(query_embeddings)):
+            chunks: list[RetrievedChunk] = []
+            docs = results["documents"][qi] if results["documents"] else []
+            ids = results["ids"][qi] if results["ids"] else []
+            for i, doc in enumerate(docs or []):
+                metadata = results["metadatas"][qi][i] if results["metadatas"] else {}
+                distance = results["distances"][qi][i] if results["distances"] else 1.0
 
                 chunks.append(RetrievedChunk(
                     content=doc,
                     metadata=metadata,
                     relevance_score=distance,
                     source_file=metadata.get("source_file", "unknown"),
+                    chunk_id=ids[i] if i < len(ids) else "",
+                    collection=collection_name,
                 ))
+            per_query.append(chunks)
 
-        return chunks
+        return per_query
     except Exception as e:
         logger.error(f"Search failed in collection '{collection_name}': {e}")
-        return []
+        return empty
 
 
 def _deduplicate_chunks(chunks: list[RetrievedChunk]) -> list[RetrievedChunk]:
@@ -390,11 +671,12 @@ def _expand_with_neighbors(
     """Expand top-ranked chunks with their neighboring chunks from the same document.
 
     When a chunk matches, the surrounding chunks often contain important
-    context.  This fetches chunk_index ± window from the same document
-    and merges them into a single expanded chunk, giving the LLM a
-    wider view of the passage.
+    context.  Chunk ids are deterministic (``{document_id}_chunk_{i}``), so
+    the ids of chunk_index ± window are fetched with a single
+    ``collection.get(ids=...)`` per collection and merged into one expanded
+    chunk, giving the LLM a wider view of the passage.
     """
-    if not chunks:
+    if not chunks or window <= 0:
         return chunks
 
     # Only expand the top 3 most relevant chunks to avoid bloating context
@@ -402,7 +684,6 @@ def _expand_with_neighbors(
     to_expand = chunks[:MAX_EXPAND]
     rest = chunks[MAX_EXPAND:]
 
-    # Group chunks by (collection_name_hint, document_id)
     expand_requests: list[tuple[RetrievedChunk, str, int]] = []
     for chunk in to_expand:
         doc_id = chunk.metadata.get("document_id", "")
@@ -413,51 +694,30 @@ def _expand_with_neighbors(
     if not expand_requests:
         return chunks
 
-    # Determine which collections to search
-    target_collections = []
-    if collection_names:
-        target_collections = collection_names
-    elif collection_name:
-        target_collections = [collection_name]
-    else:
-        cols = list_collections()
-        target_collections = [c.name if hasattr(c, "name") else str(c) for c in cols]
-
-    # Build a cache of neighbor chunks per collection
-    neighbor_cache: dict[str, dict] = {}  # col_name -> {doc_id -> {chunk_idx -> content}}
-
-    needed_lookups: dict[str, set[tuple[str, int]]] = {}  # col -> set of (doc_id, idx)
+    # Neighbor ids per collection. Chunks know their collection; only chunks
+    # without one fall back to looking in every target collection.
+    fallback_collections: list[str] | None = None
+    ids_by_collection: dict[str, set[str]] = {}
     for chunk, doc_id, chunk_idx in expand_requests:
-        for col in target_collections:
-            if col not in needed_lookups:
-                needed_lookups[col] = set()
-            for offset in range(-window, window + 1):
-                if offset != 0:
-                    needed_lookups[col].add((doc_id, chunk_idx + offset))
-
-    for col_name, lookups in needed_lookups.items():
-        if not lookups:
-            continue
+        if chunk.collection:
+            cols = [chunk.collection]
+        else:
+            if fallback_collections is None:
+                fallback_collections = _target_collections(collection_name, collection_names)
+            cols = fallback_collections
+        neighbor_ids = {
+            f"{doc_id}_chunk_{chunk_idx + offset}"
+            for offset in range(-window, window + 1)
+            if offset != 0 and chunk_idx + offset >= 0
+        }
+        for col in cols:
+            ids_by_collection.setdefault(col, set()).update(neighbor_ids)
+
+    neighbors: dict[str, str] = {}  # chunk id -> content
+    for col_name, ids in ids_by_collection.items():
         try:
-            collection = get_or_create_collection(col_name)
-            # Group by document_id
-            doc_ids_needed = {doc_id for doc_id, _ in lookups}
-            for doc_id in doc_ids_needed:
-                indices_needed = {idx for d, idx in lookups if d == doc_id}
-                result = collection.get(
-                    where={"document_id": doc_id},
-                    include=["documents", "metadatas"],
-                )
-                if not result["ids"]:
-                    continue
-                if col_name not in neighbor_cache:
-                    neighbor_cache[col_name] = {}
-                if doc_id not in neighbor_cache[col_name]:
-                    neighbor_cache[col_name][doc_id] = {}
-                for i, meta in enumerate(result["metadatas"] or []):
-                    ci = meta.get("chunk_index")
-                    if ci is not None and int(ci) in indices_needed:
-                        neighbor_cache[col_name][doc_id][int(ci)] = result["documents"][i]
+            result = get_or_create_collection(col_name).get(ids=sorted(ids), include=["documents"])
+            neighbors.update(zip(result["ids"], result["documents"] or []))
         except Exception as e:
             logger.debug(f"Neighbor lookup failed for '{col_name}': {e}")
 
@@ -466,22 +726,17 @@ def _expand_with_neighbors(
     seen_content = set()
     for chunk, doc_id, chunk_idx in expand_requests:
         parts = []
-        for col in target_collections:
-            cache = neighbor_cache.get(col, {}).get(doc_id, {})
-            # Previous chunk
-            for offset in range(-window, 0):
-                prev = cache.get(chunk_idx + offset)
-                if prev and prev[:100] not in seen_content:
-                    parts.append(prev)
+        for offset in range(-window, 0):
+            prev = neighbors.get(f"{doc_id}_chunk_{chunk_idx + offset}")
+            if prev and prev[:100] not in seen_content:
+                parts.append(prev)
 
         parts.append(chunk.content)
 
-        for col in target_collections:
-            cache = neighbor_cache.get(col, {}).get(doc_id, {})
-            for offset in range(1, window + 1):
-                nxt = cache.get(chunk_idx + offset)
-                if nxt and nxt[:100] not in seen_content:
-                    parts.append(nxt)
+        for offset in range(1, window + 1):
+            nxt = neighbors.get(f"{doc_id}_chunk_{chunk_idx + offset}")
+            if nxt and nxt[:100] not in seen_content:
+                parts.append(nxt)
 
         merged_content = "\n\n".join(parts)
         seen_content.add(merged_content[:100])
@@ -491,6 +746,8 @@ def _expand_with_neighbors(
             metadata=chunk.metadata,
             relevance_score=chunk.relevance_score,
             source_file=chunk.source_file,
+            chunk_id=chunk.chunk_id,
+            collection=chunk.collection,
         ))
 
     # Add non-expanded chunks, skipping duplicates
@@ -500,3 +757,11 @@ def _expand_with_neighbors(
             seen_content.add(chunk.content[:100])
 
     return expanded
+
+
+def _target_collections(collection_name: str | None, collection_names: list[str] | None) -> list[str]:
+    if collection_names:
+        return collection_names
+    if collection_name:
+        return [collection_name]
+    return [c.name if hasattr(c, "name") else str(c) for c in list_collections()]
@@ -1,60 +1,30 @@
+import asyncio
 import logging
-import re
-from collections.abc import Generator
+import threading
+import time
+from collections.abc import AsyncGenerator, Generator
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import replace
+from functools import partial
 
 from app.config import settings
 from app.core.database import (
     create_session,
-    get_session,
     get_agent,
-    add_message,
     get_messages,
-    get_recent_context,
+    get_messages_since,
+    get_turn_context,
     update_session_title,
     get_session_metadata,
     update_session_metadata,
+    record_turn,
+    defer_write,
 )
-from app.core.llm import generate, generate_stream, get_active_provider
-from app.retrieval.retriever import retrieve
-
-# HTML → Markdown conversion for LLMs that output HTML despite instructions
-_STRIP_TAG_RE = re.compile(r"<\/?(div|span|br|table|tr|td|th|thead|tbody|blockquote|hr)[\s/]*>", re.IGNORECASE)
-
-
-def _clean_llm_output(text: str) -> str:
-    """Convert HTML in LLM output to clean Markdown."""
-    # 0. Preserve <followup> tags — extract them before cleaning
-    followups = re.findall(r"<followup>.*?</followup>", text, flags=re.DOTALL | re.IGNORECASE)
-    text = re.sub(r"<followup>.*?</followup>", "", text, flags=re.DOTALL | re.IGNORECASE)
-
-    # 1. Convert semantic HTML to Markdown equivalents (handle tags with attributes)
-    text = re.sub(r"<strong[^>]*>(.*?)</strong>", r"**\1**", text, flags=re.DOTALL | re.IGNORECASE)
-    text = re.sub(r"<b[^>]*>(.*?)</b>", r"**\1**", text, flags=re.DOTALL | re.IGNORECASE)
-    text = re.sub(r"<em[^>]*>(.*?)</em>", r"*\1*", text, flags=re.DOTALL | re.IGNORECASE)
-    text = re.sub(r"<i[^>]*>(.*?)</i>", r"*\1*", text, flags=re.DOTALL | re.IGNORECASE)
-    for level in range(1, 7):
-        hashes = "#" * min(level + 1, 4)
-        text = re.sub(rf"<h{level}[^>]*>(.*?)</h{level}>", rf"\n{hashes} \1\n", text, flags=re.DOTALL | re.IGNORECASE)
-    text = re.sub(r"<li[^>]*>(.*?)</li>", r"\n- \1", text, flags=re.DOTALL | re.IGNORECASE)
-    text = re.sub(r"<p[^>]*>(.*?)</p>", r"\1\n\n", text, flags=re.DOTALL | re.IGNORECASE)
-
-    # 2. Strip remaining non-semantic HTML tags
-    text = re.sub(r"<\/?(ul|ol)[^>]*>", "\n", text, flags=re.IGNORECASE)
-    text = _STRIP_TAG_RE.sub("\n", text)
-
-    # 3. Clean up any leftover HTML tags (with or without attributes)
-    text = re.sub(r"<\/?[a-z][a-z0-9]*[^>]*>", "", text, flags=re.IGNORECASE)
-
-    # 4. Normalize whitespace
-    text = re.sub(r"[ \t]+\n", "\n", text)
-    text = re.sub(r"\n{3,}", "\n\n", text)
-    text = re.sub(r"(\n- )\n+(?=- )", r"\1", text)
-
-    # 5. Re-append followup tags
-    text = text.strip()
-    if followups:
-        text += "\n" + "\n".join(followups)
-    return text
+from app.core.llm import generate, generate_stream_async, get_active_provider, get_prompt_token_budget
+from app.retrieval.retriever import retrieve, retrieve_staged
+from app.services.output_cleaner import StreamingCleaner, clean_llm_output
+from app.services.prompt_budget import count_tokens, prompt_token_stats, truncate_tokens
+from app.services.speculation import SpeculativeGeneration, chunk_overlap, speculation_stats
 
 logger = logging.getLogger(__name__)
 
@@ -63,6 +33,10 @@ TITLE_PROMPT = (
     "Reply with ONLY the title, nothing else. Question: {question}"
 )
 
+RECENT_VERBATIM = 6  # Last messages sent verbatim in the prompt; older ones are summarized
+SUMMARY_REFRESH_EVERY = 10  # Aged-out messages not yet in the summary before a background refresh
+SUMMARY_SOURCE_LIMIT = 200  # Most messages folded into the summary per LLM call
+
 SUMMARIZE_PROMPT = """Summarize the following conversation into a concise summary that captures all key topics, questions asked, and answers given. Keep it under 500 words. This summary will be used as context for future questions.
 
 Conversation:
@@ -70,6 +44,16 @@ Conversation:
 
 Summary:"""
 
+ROLLING_SUMMARY_PROMPT = """Below is a summary of a conversation so far, followed by the messages that came after it. Rewrite the summary so it also covers the new messages, keeping all key topics, questions asked, and answers given. Keep it under 500 words. This summary will be used as context for future questions.
+
+Summary so far:
+{summary}
+
+New messages:
+{conversation}
+
+Updated summary:"""
+
 CHAT_SYSTEM_PROMPT = """Je bent een deskundige assistent voor fitness, coaching en voeding. Je voert een natuurlijk gesprek op basis van de beschikbare documenten en je eigen expertise.
 
 ANTWOORDSTIJL — pas aan op de vraag:
@@ -145,19 +129,39 @@ def _retrieve_chunks(
     agent: dict | None,
     session_id: str,
     top_k: int,
+    session_meta: dict | None = None,
 ) -> tuple[list, list]:
     """Shared retrieval logic for chat() and chat_stream().
 
     Returns (att_chunks, kb_chunks) — attachment chunks and knowledge-base chunks.
+    *session_meta* is the session's parsed metadata if the caller already has it.
     """
+    for stage, att_chunks, kb_chunks in _retrieve_chunks_staged(
+        search_query, collection, agent, session_id, top_k, session_meta,
+    ):
+        if stage == "final":
+            return att_chunks, kb_chunks
+    return [], []
+
+
+def _retrieve_chunks_staged(
+    search_query: str,
+    collection: str | None,
+    agent: dict | None,
+    session_id: str,
+    top_k: int,
+    session_meta: dict | None = None,
+) -> Generator[tuple[str, list, list], None, None]:
+    """Staged form of _retrieve_chunks: yields ("provisional", att, kb) with
+    early semantic hits for the knowledge base, then ("final", att, kb)."""
     agent_collections = agent.get("collections", []) if agent else []
     multi_q = agent.get("use_multi_query", True) if agent else True
-    session_meta = get_session_metadata(session_id)
+    window = agent.get("neighbor_window") if agent else None
+    if session_meta is None:
+        session_meta = get_session_metadata(session_id)
     attachment_collection = session_meta.get("attachment_collection")
 
     att_chunks = []
-    kb_chunks = []
-
     if attachment_collection:
         # Pass 1: generous attachment chunks (no multi-query for speed)
         att_chunks = retrieve(
@@ -168,40 +172,200 @@ def _retrieve_chunks(
         )
         # Pass 2: KB chunks — agent collections, session collection, or global
         if agent_collections:
-            kb_chunks = retrieve(
-                query=search_query,
-                collection_names=agent_collections,
-                top_k=top_k,
-                use_multi_query=multi_q,
-            )
+            scope = {"collection_names": agent_collections}
         elif collection:
-            kb_chunks = retrieve(
-                query=search_query,
-                collection_name=collection,
-                top_k=top_k,
-                use_multi_query=multi_q,
-            )
+            scope = {"collection_name": collection}
         else:
-            kb_chunks = retrieve(
-                query=search_query,
-                top_k=top_k,
-                use_multi_query=multi_q,
-            )
+            scope = {}
     else:
         # No attachments — standard retrieval
-        search_collection_name = collection if not agent_collections else None
-        search_collection_names = agent_collections if agent_collections else None
-        kb_chunks = retrieve(
-            query=search_query,
-            collection_name=search_collection_name,
-            collection_names=search_collection_names,
-            top_k=top_k,
-            use_multi_query=multi_q,
+        scope = {
+            "collection_name": collection if not agent_collections else None,
+            "collection_names": agent_collections if agent_collections else None,
+        }
+
+    for stage, kb_chunks in retrieve_staged(
+        query=search_query,
+        top_k=top_k,
+        use_multi_query=multi_q,
+        neighbor_window=window,
+        **scope,
+    ):
+        if stage == "final" and not kb_chunks and agent_collections and not attachment_collection:
+            kb_chunks = retrieve(query=search_query, top_k=top_k, use_multi_query=multi_q, neighbor_window=window)
+        yield stage, att_chunks, kb_chunks
+
+
+def _build_user_prompt(question: str, att_chunks: list, kb_chunks: list, history_section: str) -> str:
+    """Numbered context + source list prompt — attachment chunks first for priority."""
+    source_parts = []
+    seen_sources = set()
+
+    def _build_context(chunk_list, start_idx=1):
+        parts = []
+        idx = start_idx
+        for chunk in chunk_list:
+            parts.append(f"[{idx}] {chunk.content}")
+            key = chunk.source_file
+            if key not in seen_sources:
+                seen_sources.add(key)
+                mi = []
+                if chunk.metadata.get("page_number"):
+                    mi.append(f"page {chunk.metadata['page_number']}")
+                if chunk.metadata.get("section_header"):
+                    mi.append(f"section: {chunk.metadata['section_header']}")
+                s = f"- [{idx}] {key}"
+                if mi:
+                    s += f" ({', '.join(mi)})"
+                source_parts.append(s)
+            idx += 1
+        return "\n\n".join(parts), idx
+
+    if att_chunks:
+        att_context, next_idx = _build_context(att_chunks, 1)
+        kb_context, _ = _build_context(kb_chunks, next_idx)
+        sources_text = "\n".join(source_parts) if source_parts else "(geen bronnen)"
+        return CHAT_PROMPT_TEMPLATE_WITH_ATTACHMENTS.format(
+            attachment_context=att_context or "(geen passages uit bijlage)",
+            kb_context=kb_context or "(geen aanvullende context)",
+            sources=sources_text,
+            history_section=history_section,
+            question=question,
+        )
+
+    context, _ = _build_context(kb_chunks, 1)
+    context = context or "(geen documenten gevonden)"
+    sources_text = "\n".join(source_parts) if source_parts else "(geen bronnen)"
+    return CHAT_PROMPT_TEMPLATE.format(
+        context=context,
+        sources=sources_text,
+        history_section=history_section,
+        question=question,
+    )
+
+
+class _Blank(dict):
+    def __missing__(self, key):
+        return ""
+
+
+_CHUNK_OVERHEAD_TOKENS = 30  # "[n] " marker, separator and the chunk's line in the source list
+_MIN_CHUNK_TOKENS = 100  # Less room than this left: drop the chunk instead of compressing it
+
+
+def _fit_prompt(
+    question: str, att_chunks: list, kb_chunks: list, history_section: str, system_prompt: str,
+) -> tuple[list, list, str, dict]:
+    """Build the user prompt within the provider token budget.
+
+    The system prompt, instructions and question are always sent whole. History
+    gets at most PROMPT_HISTORY_SHARE of the budget, keeping its most recent
+    part. Chunks fill the rest in order, attachment chunks first, each list
+    best-ranked first: the chunk that no longer fits is shortened, and the
+    lower-ranked ones after it are dropped.
+
+    Returns (att_chunks, kb_chunks, prompt, breakdown). The chunk lists are the
+    ones in the prompt, so citations and sources stay numbered alike.
+    """
+    budget = get_prompt_token_budget()
+    template = CHAT_PROMPT_TEMPLATE_WITH_ATTACHMENTS if att_chunks else CHAT_PROMPT_TEMPLATE
+    system_tokens = count_tokens(system_prompt)
+    instruction_tokens = count_tokens(template.format_map(_Blank(question=question)))
+    available = budget - system_tokens - instruction_tokens
+
+    history_cap = int(budget * settings.prompt_history_share)
+    history_tokens = count_tokens(history_section)
+    history_truncated = history_tokens > history_cap
+    if history_truncated:
+        history_section = "CONVERSATION HISTORY (most recent part):\n…" + truncate_tokens(
+            history_section, history_cap - 20, keep_end=True,
         )
-        if not kb_chunks and agent_collections:
-            kb_chunks = retrieve(query=search_query, top_k=top_k, use_multi_query=multi_q)
+        history_tokens = count_tokens(history_section)
+    available -= history_tokens
+
+    kept = {"attachments": [], "kb": []}
+    used = {"attachments": 0, "kb": 0}
+    dropped = compressed = 0
+    for part, chunks in (("attachments", att_chunks), ("kb", kb_chunks)):
+        for chunk in chunks:
+            if available < _MIN_CHUNK_TOKENS:
+                dropped += 1
+                continue
+            cost = count_tokens(chunk.content) + _CHUNK_OVERHEAD_TOKENS
+            if cost > available:
+                chunk = replace(
+                    chunk, content=truncate_tokens(chunk.content, available - _CHUNK_OVERHEAD_TOKENS) + " …",
+                )
+                cost = available
+                compressed += 1
+            kept[part].append(chunk)
+            used[part] += cost
+            available -= cost
+
+    prompt = _build_user_prompt(question, kept["attachments"], kept["kb"], history_section)
+    breakdown = {
+        "budget": budget,
+        "total": system_tokens + count_tokens(prompt),
+        "system": system_tokens,
+        "instructions": instruction_tokens,
+        "history": history_tokens,
+        "attachments": used["attachments"],
+        "kb": used["kb"],
+        "chunks_kept": len(kept["attachments"]) + len(kept["kb"]),
+        "chunks_dropped": dropped,
+        "chunks_compressed": compressed,
+        "history_truncated": history_truncated,
+    }
+    return kept["attachments"], kept["kb"], prompt, breakdown
+
+
+def _record_prompt_tokens(breakdown: dict, session_id: str):
+    """Log the turn's prompt token breakdown and add it to the /health totals."""
+    prompt_token_stats.record(breakdown)
+    logger.info(
+        f"Prompt tokens for session {session_id[:8]}: {breakdown['total']}/{breakdown['budget']} "
+        f"(system {breakdown['system']}, instructions {breakdown['instructions']}, history {breakdown['history']}"
+        f"{' truncated' if breakdown['history_truncated'] else ''}, attachments {breakdown['attachments']}, "
+        f"kb {breakdown['kb']}; {breakdown['chunks_kept']} chunks kept, {breakdown['chunks_dropped']} dropped, "
+        f"{breakdown['chunks_compressed']} compressed)"
+    )
+
+
+def _source_refs(chunks: list) -> list[dict]:
+    """Source references sent to the client and stored with the answer."""
+    return [
+        {
+            "filename": chunk.source_file,
+            "chunk_text": chunk.content[:200] + "..." if len(chunk.content) > 200 else chunk.content,
+            "relevance_score": round(1 - chunk.relevance_score, 4),
+            "metadata": chunk.metadata,
+        }
+        for chunk in chunks
+    ]
+
+
+_pipeline_pool: ThreadPoolExecutor | None = None
+_pipeline_pool_lock = threading.Lock()
 
-    return att_chunks, kb_chunks
+
+def _get_pipeline_pool() -> ThreadPoolExecutor:
+    """Bounded pool for the blocking steps of the streaming chat (singleton).
+
+    Retrieval (BM25, cross-encoder), prompt token counting and SQLite calls run
+    here, so an open SSE stream only occupies a thread while it is doing work.
+    """
+    global _pipeline_pool
+    if _pipeline_pool is None:
+        with _pipeline_pool_lock:
+            if _pipeline_pool is None:
+                _pipeline_pool = ThreadPoolExecutor(
+                    max_workers=settings.chat_pipeline_max_workers, thread_name_prefix="chat-pipeline",
+                )
+    return _pipeline_pool
+
+
+async def _in_pipeline(fn, *args, **kwargs):
+    return await asyncio.get_running_loop().run_in_executor(_get_pipeline_pool(), partial(fn, *args, **kwargs))
 
 
 def start_session(collection: str | None = None, agent_id: str | None = None) -> dict:
@@ -224,7 +388,8 @@ def chat(
     5. Save messages to DB
     """
     top_k = top_k or settings.top_k
-    session = get_session(session_id)
+    # Session, message count, recent messages and cached summary in one read
+    session = get_turn_context(session_id, _history_tail())
     if not session:
         raise ValueError(f"Session '{session_id}' not found")
 
@@ -241,111 +406,69 @@ def chat(
             logger.info(f"Using agent '{agent.get('name', 'unknown')}' (collections: {agent.get('collections', [])})")
 
     # 1. Get conversation history with smart context management
-    all_messages = get_messages(session_id, limit=200)
-    history_section = _build_history_section(all_messages, session_id)
+    history_section = _build_history_section(session)
 
     # 2. Retrieve relevant chunks using question + recent context
-    recent = get_recent_context(session_id, max_messages=6)
-    search_query = _build_search_query(question, recent)
+    search_query = _build_search_query(question, session["recent"][-RECENT_VERBATIM:])
 
-    att_chunks, kb_chunks = _retrieve_chunks(search_query, collection, agent, session_id, top_k)
-    chunks = att_chunks + kb_chunks
+    att_chunks, kb_chunks = _retrieve_chunks(search_query, collection, agent, session_id, top_k, session["metadata"])
 
-    # 3. Build prompt
-    source_parts = []
-    seen_sources = set()
-
-    def _build_context(chunk_list, start_idx=1):
-        parts = []
-        nonlocal seen_sources
-        idx = start_idx
-        for chunk in chunk_list:
-            parts.append(f"[{idx}] {chunk.content}")
-            key = chunk.source_file
-            if key not in seen_sources:
-                seen_sources.add(key)
-                mi = []
-                if chunk.metadata.get("page_number"):
-                    mi.append(f"page {chunk.metadata['page_number']}")
-                if chunk.metadata.get("section_header"):
-                    mi.append(f"section: {chunk.metadata['section_header']}")
-                s = f"- [{idx}] {key}"
-                if mi:
-                    s += f" ({', '.join(mi)})"
-                source_parts.append(s)
-            idx += 1
-        return "\n\n".join(parts), idx
-
-    if att_chunks:
-        att_context, next_idx = _build_context(att_chunks, 1)
-        kb_context, _ = _build_context(kb_chunks, next_idx)
-        sources_text = "\n".join(source_parts) if source_parts else "(geen bronnen)"
-        user_prompt = CHAT_PROMPT_TEMPLATE_WITH_ATTACHMENTS.format(
-            attachment_context=att_context or "(geen passages uit bijlage)",
-            kb_context=kb_context or "(geen aanvullende context)",
-            sources=sources_text,
-            history_section=history_section,
-            question=question,
-        )
-    else:
-        context, _ = _build_context(kb_chunks, 1)
-        context = context or "(geen documenten gevonden)"
-        sources_text = "\n".join(source_parts) if source_parts else "(geen bronnen)"
-        user_prompt = CHAT_PROMPT_TEMPLATE.format(
-            context=context,
-            sources=sources_text,
-            history_section=history_section,
-            question=question,
-        )
-
-    # 4. Generate answer (use agent system prompt if available)
+    # 3. Build prompt within the token budget (use agent system prompt if available)
     system_prompt = agent["system_prompt"] if agent else CHAT_SYSTEM_PROMPT
-    answer = _clean_llm_output(generate(
-        prompt=user_prompt,
-        system=system_prompt,
-        temperature=temperature,
-    ))
+    att_chunks, kb_chunks, user_prompt, prompt_tokens = _fit_prompt(
+        question, att_chunks, kb_chunks, history_section, system_prompt,
+    )
+    _record_prompt_tokens(prompt_tokens, session_id)
+    chunks = att_chunks + kb_chunks
 
-    # 5. Build source references
-    sources = []
-    for chunk in chunks:
-        sources.append({
-            "filename": chunk.source_file,
-            "chunk_text": chunk.content[:200] + "..." if len(chunk.content) > 200 else chunk.content,
-            "relevance_score": round(1 - chunk.relevance_score, 4),
-            "metadata": chunk.metadata,
-        })
+    # 4. Generate answer (a new session's title is generated alongside it)
+    title_future = _start_title(session, question)
+    try:
+        answer = clean_llm_output(generate(
+            prompt=user_prompt,
+            system=system_prompt,
+            temperature=temperature,
+        ))
+    except BaseException:
+        if title_future is not None:
+            title_future.cancel()  # No turn to title
+        raise
 
-    # 6. Save messages to DB
-    add_message(session_id, "user", question)
-    add_message(session_id, "assistant", answer, sources=sources)
+    # 5. Build source references
+    sources = _source_refs(chunks)
 
-    # 7. Auto-generate title for new sessions
-    if not all_messages:
-        _auto_title(session_id, question)
+    # 6. Save the turn (and the title of a new session) in one transaction
+    record_turn(session_id, question, answer, sources=sources, title=_title_if_ready(session_id, title_future))
+    _schedule_summary(session, session_id)
 
     return {
         "answer": answer,
         "sources": sources,
         "session_id": session_id,
         "model_used": get_active_provider(),
+        "prompt_tokens": prompt_tokens,
     }
 
 
-def chat_stream(
+async def chat_stream(
     session_id: str,
     question: str,
     top_k: int | None = None,
     temperature: float = 0.3,
-) -> Generator[dict, None, None]:
+) -> AsyncGenerator[dict, None]:
     """
     Streaming chat pipeline - yields SSE events:
-    - {"event": "sources", "data": [...]}   (retrieved sources)
-    - {"event": "token", "data": "..."}     (each token)
+    - {"event": "sources", "data": [...]}   (provisional hits, then the final re-ranked sources)
+    - {"event": "delta", "data": {"offset": n, "text": "..."}}  (cleaned text from offset n on)
+    - {"event": "content", "data": "..."}   (full cleaned text, periodic resync)
     - {"event": "done", "data": {...}}      (final metadata)
+
+    Runs on the event loop: LLM tokens come from the async provider clients and
+    blocking steps are awaited on the bounded pipeline pool.
     """
     top_k = top_k or settings.top_k
-    session = get_session(session_id)
+    # Session, message count, recent messages and cached summary in one read
+    session = await _in_pipeline(get_turn_context, session_id, _history_tail())
     if not session:
         raise ValueError(f"Session '{session_id}' not found")
 
@@ -355,185 +478,179 @@ def chat_stream(
     agent = None
     agent_id = session.get("agent_id")
     if agent_id:
-        agent = get_agent(agent_id)
+        agent = await _in_pipeline(get_agent, agent_id)
         if agent:
             top_k = agent.get("top_k", top_k)
             temperature = agent.get("temperature", temperature)
 
-    # 1. Get conversation history
-    all_messages = get_messages(session_id, limit=200)
-    history_section = _build_history_section(all_messages, session_id)
+    # 1. Get conversation history (loaded with the session; summaries are refreshed after the turn)
+    history_section = _build_history_section(session)
 
     # 2. Yield search status
     yield {"event": "status", "data": "Documenten doorzoeken..."}
 
-    # 3. Retrieve relevant chunks
-    recent = get_recent_context(session_id, max_messages=6)
-    search_query = _build_search_query(question, recent)
-
-    att_chunks, kb_chunks = _retrieve_chunks(search_query, collection, agent, session_id, top_k)
-    chunks = att_chunks + kb_chunks
+    # 3. Retrieve relevant chunks — provisional semantic hits are sent as
+    # sources right away and replaced by the re-ranked set when it is final.
+    # In speculative mode the answer is already generated on the provisional hits.
+    search_query = _build_search_query(question, session["recent"][-RECENT_VERBATIM:])
 
-    # Build source references
-    sources = []
-    for chunk in chunks:
-        sources.append({
-            "filename": chunk.source_file,
-            "chunk_text": chunk.content[:200] + "..." if len(chunk.content) > 200 else chunk.content,
-            "relevance_score": round(1 - chunk.relevance_score, 4),
-            "metadata": chunk.metadata,
-        })
+    system_prompt = agent["system_prompt"] if agent else CHAT_SYSTEM_PROMPT
+    provider_info = {"name": "unknown"}
 
-    # Yield status + sources with quality indication
-    if not chunks:
-        yield {"event": "status", "data": "Geen relevante documenten gevonden — antwoord op basis van algemene kennis"}
-    else:
-        n_sources = len(set(s["filename"] for s in sources))
-        avg_score = sum(s["relevance_score"] for s in sources) / len(sources) if sources else 0
-        if att_chunks:
-            yield {"event": "status", "data": f"{len(att_chunks)} passages uit bijlage + {len(kb_chunks)} uit kennisbank"}
-        elif avg_score < 0.4:
-            yield {"event": "status", "data": f"{len(chunks)} passages gevonden (lage relevantie) in {n_sources} document(en)"}
-        else:
-            yield {"event": "status", "data": f"{len(chunks)} passages gevonden in {n_sources} document(en)"}
-    yield {"event": "sources", "data": sources}
-    yield {"event": "status", "data": "Antwoord genereren..."}
+    speculation = None
+    spec_att, spec_kb, spec_prompt, spec_tokens = [], [], "", {}
+    spec_provider_info = {"name": "unknown"}
 
-    # 3. Build prompt — attachment chunks first for priority
-    source_parts = []
-    seen_sources = set()
+    async def _speculative_stream():
+        async for token in generate_stream_async(
+            prompt=spec_prompt, system=system_prompt, temperature=temperature, provider_info=spec_provider_info,
+        ):
+            yield token
 
-    def _build_ctx(chunk_list, start_idx=1):
-        parts = []
-        nonlocal seen_sources
-        idx = start_idx
-        for chunk in chunk_list:
-            parts.append(f"[{idx}] {chunk.content}")
-            key = chunk.source_file
-            if key not in seen_sources:
-                seen_sources.add(key)
-                mi = []
-                if chunk.metadata.get("page_number"):
-                    mi.append(f"page {chunk.metadata['page_number']}")
-                if chunk.metadata.get("section_header"):
-                    mi.append(f"section: {chunk.metadata['section_header']}")
-                s = f"- [{idx}] {key}"
-                if mi:
-                    s += f" ({', '.join(mi)})"
-                source_parts.append(s)
-            idx += 1
-        return "\n\n".join(parts), idx
+    att_chunks, kb_chunks = [], []
+    stages = _retrieve_chunks_staged(search_query, collection, agent, session_id, top_k, session["metadata"])
 
-    if att_chunks:
-        att_context, next_idx = _build_ctx(att_chunks, 1)
-        kb_context, _ = _build_ctx(kb_chunks, next_idx)
-        sources_text = "\n".join(source_parts) if source_parts else "(geen bronnen)"
-        user_prompt = CHAT_PROMPT_TEMPLATE_WITH_ATTACHMENTS.format(
-            attachment_context=att_context or "(geen passages uit bijlage)",
-            kb_context=kb_context or "(geen aanvullende context)",
-            sources=sources_text,
-            history_section=history_section,
-            question=question,
-        )
-    else:
-        context, _ = _build_ctx(kb_chunks, 1)
-        context = context or "(geen documenten gevonden)"
-        sources_text = "\n".join(source_parts) if source_parts else "(geen bronnen)"
-        user_prompt = CHAT_PROMPT_TEMPLATE.format(
-            context=context,
-            sources=sources_text,
-            history_section=history_section,
-            question=question,
+    # From here on the speculative run streams in a task of its own: every way out
+    # of this generator (client disconnect at a yield, a failing step) cancels it
+    title_future = None
+    streamed = False
+    try:
+        while (step := await _in_pipeline(next, stages, None)) is not None:
+            stage, att_chunks, kb_chunks = step
+            if stage == "provisional" and (att_chunks or kb_chunks):
+                if settings.speculative_generation_enabled:
+                    spec_att, spec_kb, spec_prompt, spec_tokens = await _in_pipeline(
+                        _fit_prompt, question, att_chunks, kb_chunks, history_section, system_prompt,
+                    )
+                    speculation = SpeculativeGeneration(_speculative_stream)
+                    speculation_stats.record_start()
+                yield {"event": "sources", "data": _source_refs(att_chunks + kb_chunks)}
+                yield {"event": "status", "data": f"{len(att_chunks) + len(kb_chunks)} passages gevonden, herrangschikken..."}
+
+        # Fit the final chunks to the token budget; the lists that come back are the ones in the prompt
+        att_chunks, kb_chunks, user_prompt, prompt_tokens = await _in_pipeline(
+            _fit_prompt, question, att_chunks, kb_chunks, history_section, system_prompt,
         )
 
-    system_prompt = agent["system_prompt"] if agent else CHAT_SYSTEM_PROMPT
+        # Keep the speculative answer only if the final top-k hardly changed; its
+        # [n] citations refer to the provisional chunks, so those become the sources
+        if speculation is not None:
+            overlap = chunk_overlap(spec_att + spec_kb, att_chunks + kb_chunks)
+            kept = overlap >= settings.speculative_overlap_threshold
+            speculation_stats.record_outcome(overlap, kept, time.monotonic() - speculation.started)
+            logger.info(f"Speculative generation {'kept' if kept else 'restarted'} (overlap {overlap:.2f})")
+            if kept:
+                att_chunks, kb_chunks, prompt_tokens = spec_att, spec_kb, spec_tokens
+                provider_info = spec_provider_info
+            else:
+                speculation.cancel()
+                speculation = None
+        chunks = att_chunks + kb_chunks
+        _record_prompt_tokens(prompt_tokens, session_id)
+
+        # Build source references
+        sources = _source_refs(chunks)
+
+        # Yield status + sources with quality indication
+        if not chunks:
+            yield {"event": "status", "data": "Geen relevante documenten gevonden — antwoord op basis van algemene kennis"}
+        else:
+            n_sources = len(set(s["filename"] for s in sources))
+            avg_score = sum(s["relevance_score"] for s in sources) / len(sources) if sources else 0
+            if att_chunks:
+                yield {"event": "status", "data": f"{len(att_chunks)} passages uit bijlage + {len(kb_chunks)} uit kennisbank"}
+            elif avg_score < 0.4:
+                yield {"event": "status", "data": f"{len(chunks)} passages gevonden (lage relevantie) in {n_sources} document(en)"}
+            else:
+                yield {"event": "status", "data": f"{len(chunks)} passages gevonden in {n_sources} document(en)"}
+        yield {"event": "sources", "data": sources}
+        yield {"event": "status", "data": "Antwoord genereren..."}
+
+        # 3. Generate on the fitted prompt (unless the speculative run already does)
+        if speculation is not None:
+            token_stream = speculation.tokens()
+        else:
+            token_stream = generate_stream_async(
+                prompt=user_prompt, system=system_prompt,
+                temperature=temperature, provider_info=provider_info,
+            )
 
-    # 4. Stream the answer — server cleans HTML, client just displays
-    full_answer = []
-    provider_info = {"name": "unknown"}
-    prev_clean = ""
-    token_count = 0
-    for token in generate_stream(
-        prompt=user_prompt, system=system_prompt,
-        temperature=temperature, provider_info=provider_info,
-    ):
-        full_answer.append(token)
-        token_count += 1
-        # Every 3 tokens, send the full cleaned text so far
-        if token_count % 3 == 0 or token.endswith(("\n", ".", "!", "?")):
-            raw = "".join(full_answer)
-            # Chop off any incomplete HTML tag at the end (but not math like "< 5")
-            last_lt = raw.rfind("<")
-            if last_lt != -1 and ">" not in raw[last_lt:]:
-                tail = raw[last_lt:]
-                if len(tail) > 1 and (tail[1:2].isalpha() or tail[1:2] == "/"):
-                    raw = raw[:last_lt]
-            clean = _clean_llm_output(raw)
-            if clean != prev_clean:
-                yield {"event": "content", "data": clean}
-                prev_clean = clean
-
-    raw_answer = "".join(full_answer)
-    answer = _clean_llm_output(raw_answer)
-
-    # 5. Save messages to DB
-    add_message(session_id, "user", question)
-    assistant_msg = add_message(session_id, "assistant", answer, sources=sources)
-
-    # 6. Auto-title
-    if not all_messages:
-        _auto_title(session_id, question)
+        # 4. Stream the answer — server cleans HTML incrementally, client applies deltas.
+        # A new session's title only depends on the question, so it is generated alongside.
+        title_future = _start_title(session, question)
+        cleaner = StreamingCleaner()
+        token_count = 0
+        async for token in token_stream:
+            cleaner.feed(token)
+            token_count += 1
+            # Every 3 tokens, send what changed in the cleaned text
+            if token_count % 3 == 0 or token.endswith(("\n", ".", "!", "?")):
+                for event in cleaner.flush():
+                    yield event
+        streamed = True
+    finally:
+        if speculation is not None:
+            speculation.cancel()
+        if not streamed and title_future is not None:
+            title_future.cancel()  # No turn to title
+
+    answer = clean_llm_output(cleaner.raw)
+
+    # 5. Save the turn (and the title of a new session) in one transaction
+    _, assistant_msg = await _in_pipeline(
+        record_turn, session_id, question, answer, sources=sources, title=_title_if_ready(session_id, title_future),
+    )
+    _schedule_summary(session, session_id)
 
     yield {"event": "done", "data": {
         "session_id": session_id,
         "message_id": assistant_msg["id"],
         "model_used": provider_info["name"],
         "answer": answer,
+        "prompt_tokens": prompt_tokens,
     }}
 
 
-def get_chat_history(session_id: str) -> list[dict]:
+def get_chat_history(session_id: str, include_sources: bool = True) -> list[dict]:
     """Get all messages in a session."""
-    return get_messages(session_id)
+    return get_messages(session_id, include_sources=include_sources)
+
+
+def _history_tail() -> int:
+    """How many recent messages a turn loads: enough to send a short conversation whole."""
+    return max(settings.summarize_after_messages, RECENT_VERBATIM)
 
 
-def _build_history_section(messages: list[dict], session_id: str) -> str:
+def _build_history_section(context: dict) -> str:
     """
-    Build the history section for the prompt.
-    For long conversations, summarizes older messages and keeps recent ones verbatim.
-    Summary is CACHED in session metadata to avoid regenerating on every message.
-    Only re-summarizes every 10 new messages.
+    Build the history section for the prompt from a get_turn_context() result.
+    For long conversations, older messages are represented by the rolling
+    summary in the session metadata, which is refreshed in the background
+    after the turn (_schedule_summary). Aged-out messages the summary does not
+    cover yet get a cheap extractive summary, so a turn never waits on an LLM.
     """
-    if not messages:
+    total = context["message_count"]
+    messages = context["recent"]
+    if not total:
         return "CONVERSATION: (first question in this conversation)"
 
-    total = len(messages)
-
     if total <= settings.summarize_after_messages:
         # Short conversation: include everything
         history_text = _format_messages(messages)
         return f"CONVERSATION HISTORY:\n{history_text}"
 
     # Long conversation: summarize older messages, keep recent ones
-    split_point = total - 6  # Keep last 6 messages verbatim
-    older_messages = messages[:split_point]
-    recent_messages = messages[split_point:]
-
-    # Check for cached summary — only regenerate every 10 new messages
-    meta = get_session_metadata(session_id)
-    cached_summary = meta.get("summary")
-    summary_at_count = meta.get("summary_at_count", 0)
-
-    if cached_summary and (total - summary_at_count) < 10:
-        # Use cached summary (no LLM call)
-        summary = cached_summary
-    else:
-        # Generate new summary and cache it
-        summary = _summarize_conversation(older_messages)
-        update_session_metadata(session_id, {
-            "summary": summary,
-            "summary_at_count": total,
-        })
+    older_loaded = messages[:-RECENT_VERBATIM]
+    recent_messages = messages[-RECENT_VERBATIM:]
+
+    summary, covers, _ = _summary_state(context["metadata"])
+    # Aged-out messages not folded into the summary yet, as far as the loaded tail reaches
+    gap = min(total - RECENT_VERBATIM - covers, len(older_loaded))
+    unsummarized = older_loaded[len(older_loaded) - gap:] if gap > 0 else []
+    if not summary:
+        summary = _extractive_summary(unsummarized)
+    elif unsummarized:
+        summary = f"{summary}\n\n{_extractive_summary(unsummarized, 'Topics discussed since')}"
 
     recent_text = _format_messages(recent_messages)
 
@@ -543,20 +660,107 @@ def _build_history_section(messages: list[dict], session_id: str) -> str:
     )
 
 
-def _summarize_conversation(messages: list[dict]) -> str:
-    """Summarize a list of messages into a concise summary."""
-    conversation = _format_messages(messages)
+def _extractive_summary(messages: list[dict], label: str = "Topics discussed") -> str:
+    """Stand-in for an LLM summary: the user's questions, shortened."""
+    questions = [" ".join(m["content"].split())[:150] for m in messages if m["role"] == "user"]
+    return f"{label}: " + "; ".join(questions) if questions else f"{label}: (earlier questions)"
+
+
+def _summary_state(meta: dict) -> tuple[str | None, int, str | None]:
+    """(summary, number of oldest messages it covers, created_at of the last one) from session metadata."""
+    summary = meta.get("summary")
+    if not summary:
+        return None, 0, None
+    if "summary_until" in meta:
+        return summary, meta.get("summary_covers", 0), meta["summary_until"]
+    # Cached before rolling summaries: it covered all but the verbatim tail at summary_at_count
+    return summary, max(meta.get("summary_at_count", 0) - RECENT_VERBATIM, 0), None
+
+
+_summary_pool: ThreadPoolExecutor | None = None
+_summary_pool_lock = threading.Lock()
+_summaries_pending: set[str] = set()  # Sessions with a refresh queued or running
+
+
+def _get_summary_pool() -> ThreadPoolExecutor:
+    """Small pool for background summary refreshes (singleton), apart from the request path."""
+    global _summary_pool
+    if _summary_pool is None:
+        with _summary_pool_lock:
+            if _summary_pool is None:
+                _summary_pool = ThreadPoolExecutor(
+                    max_workers=settings.summary_max_workers, thread_name_prefix="chat-summarizer",
+                )
+    return _summary_pool
+
+
+def _schedule_summary(context: dict, session_id: str, new_messages: int = 2):
+    """After a turn: queue a summary refresh once enough messages aged out of the verbatim tail."""
+    total = context["message_count"] + new_messages
+    if total <= settings.summarize_after_messages:
+        return
+    _, covers, _ = _summary_state(context["metadata"])
+    if total - RECENT_VERBATIM - covers < SUMMARY_REFRESH_EVERY:
+        return
+    with _summary_pool_lock:
+        if session_id in _summaries_pending:
+            return
+        _summaries_pending.add(session_id)
+    _get_summary_pool().submit(_refresh_summary, session_id)
+
+
+def _refresh_summary(session_id: str):
+    """Fold the messages that aged out of the verbatim tail into the session's summary.
+
+    Only messages after ``summary_until`` are sent, with the previous summary,
+    in batches of SUMMARY_SOURCE_LIMIT. Each batch is saved as it completes.
+    """
     try:
-        summary = generate(
-            prompt=SUMMARIZE_PROMPT.format(conversation=conversation),
-            temperature=0.3,
-        )
-        return summary.strip()
+        context = get_turn_context(session_id, tail=0)
+        if context is None:
+            return  # Session deleted meanwhile
+        summary, covers, until = _summary_state(context["metadata"])
+        if until is None:
+            summary, covers = None, 0  # Unknown position (old cache format): rebuild from the start
+        pending = context["message_count"] - RECENT_VERBATIM - covers
+        while pending > 0:
+            batch = get_messages_since(session_id, until, limit=min(pending, SUMMARY_SOURCE_LIMIT))
+            if not batch:
+                break
+            summary = _summarize_conversation(batch, previous=summary)
+            covers += len(batch)
+            until = batch[-1]["created_at"]
+            pending -= len(batch)
+            update_session_metadata(session_id, {
+                "summary": summary,
+                "summary_covers": covers,
+                "summary_until": until,
+            })
     except Exception as e:
-        logger.warning(f"Summarization failed: {e}")
-        # Fallback: just take user messages
-        user_msgs = [m["content"] for m in messages if m["role"] == "user"]
-        return "Topics discussed: " + "; ".join(user_msgs[:5])
+        logger.warning(f"Background summary for session {session_id[:8]} failed: {e}")
+    finally:
+        with _summary_pool_lock:
+            _summaries_pending.discard(session_id)
+
+
+def stop_summarizer():
+    """Drop queued summary refreshes (shutdown); running ones finish, the rest is redone later."""
+    global _summary_pool
+    with _summary_pool_lock:
+        if _summary_pool is not None:
+            _summary_pool.shutdown(wait=False, cancel_futures=True)
+            _summary_pool = None
+        _summaries_pending.clear()
+
+
+def _summarize_conversation(messages: list[dict], previous: str | None = None) -> str:
+    """Summarize *messages*, folding them into the *previous* summary if there is one."""
+    conversation = _format_messages(messages)
+    if previous:
+        prompt = ROLLING_SUMMARY_PROMPT.format(summary=previous, conversation=conversation)
+    else:
+        prompt = SUMMARIZE_PROMPT.format(conversation=conversation)
+    return generate(prompt=prompt, temperature=0.3).strip()
 
 
 def _format_messages(messages: list[dict]) -> str:
@@ -586,15 +790,68 @@ def _build_search_query(question: str, history: list[dict]) -> str:
     return query[:500]
 
 
-def _auto_title(session_id: str, question: str):
+_title_pool: ThreadPoolExecutor | None = None
+_title_pool_lock = threading.Lock()
+
+
+def _get_title_pool() -> ThreadPoolExecutor:
+    """Small pool for new-session title LLM calls (singleton), so they never hold a chat-pipeline thread."""
+    global _title_pool
+    if _title_pool is None:
+        with _title_pool_lock:
+            if _title_pool is None:
+                _title_pool = ThreadPoolExecutor(
+                    max_workers=settings.title_max_workers, thread_name_prefix="chat-title",
+                )
+    return _title_pool
+
+
+def _start_title(context: dict, question: str) -> Future | None:
+    """Start generating the title of a new session; None for a session that already has messages."""
+    if context["message_count"]:
+        return None
+    return _get_title_pool().submit(_generate_title, question)
+
+
+def stop_title_generator():
+    """Drop queued title generations (shutdown); the session keeps its default title."""
+    global _title_pool
+    with _title_pool_lock:
+        if _title_pool is not None:
+            _title_pool.shutdown(wait=False, cancel_futures=True)
+            _title_pool = None
+
+
+def _generate_title(question: str) -> str | None:
     """Generate a short title for the session based on the first question."""
     try:
         title = generate(
             prompt=TITLE_PROMPT.format(question=question),
             temperature=0.3,
         )
-        title = title.strip().strip('"').strip("'")[:60]
-        if title:
-            update_session_title(session_id, title)
+        return title.strip().strip('"').strip("'")[:60] or None
     except Exception as e:
         logger.warning(f"Failed to auto-generate title: {e}")
+        return None
+
+
+def _title_if_ready(session_id: str, title_future: Future | None) -> str | None:
+    """The generated title if it is already there, to be written with the turn.
+
+    A title that is still being generated is written by the background writer
+    once it arrives, so the answer never waits on it. A title cancelled by
+    stop_title_generator() is skipped; the session keeps its default title.
+    """
+    if title_future is None or title_future.cancelled():
+        return None
+    if title_future.done():
+        return title_future.result()
+
+    def _write_late(future: Future):
+        if future.cancelled():
+            return
+        if title := future.result():
+            defer_write(update_session_title, session_id, title)
+
+    title_future.add_done_callback(_write_late)
+    return None
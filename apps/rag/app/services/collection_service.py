@@ -7,6 +7,7 @@ from app.core.vectorstore import (
     list_collections,
 )
 from app.models.schemas import CollectionInfo
+from app.retrieval import bm25_index, result_cache
 
 logger = logging.getLogger(__name__)
 
@@ -57,6 +58,8 @@ def remove_collection(name: str) -> bool:
     """Delete a collection and all its contents, including folders."""
     try:
         delete_collection(name)
+        _drop_keyword_index(name)
+        result_cache.bump_generation(name)
         # Also clean up folders and document-folder mappings from SQLite
         from app.core.database import delete_collection_folders
         removed = delete_collection_folders(name)
@@ -142,6 +145,8 @@ def cleanup_micro_chunks(collection_name: str, min_chars: int = 50) -> dict:
             for batch_start in range(0, len(ids_to_delete), 500):
                 batch = ids_to_delete[batch_start:batch_start + 500]
                 collection.delete(ids=batch)
+            _remove_from_keyword_index(collection_name, ids_to_delete)
+            result_cache.bump_generation(collection_name)
 
         remaining = collection.count()
         logger.info(
@@ -173,8 +178,25 @@ def delete_document(collection_name: str, document_id: str) -> int:
 
         if ids_to_delete:
             collection.delete(ids=ids_to_delete)
+            _remove_from_keyword_index(collection_name, ids_to_delete)
+            result_cache.bump_generation(collection_name)
 
         return len(ids_to_delete)
     except Exception as e:
         logger.error(f"Failed to delete document '{document_id}': {e}")
         return 0
+
+
+def _remove_from_keyword_index(collection_name: str, chunk_ids: list[str]):
+    """Keep the BM25 index in sync after chunks were deleted from ChromaDB."""
+    try:
+        bm25_index.remove_documents(collection_name, chunk_ids)
+    except Exception as e:
+        logger.warning(f"BM25 index update failed for '{collection_name}': {e}")
+
+
+def _drop_keyword_index(collection_name: str):
+    try:
+        bm25_index.drop_collection(collection_name)
+    except Exception as e:
+        logger.warning(f"Failed to drop BM25 index for '{collection_name}': {e}")
@@ -0,0 +1,255 @@
+"""
+Cleaning of LLM answers: HTML that models emit despite instructions is turned
+into Markdown.
+
+``clean_llm_output`` cleans a complete answer. ``StreamingCleaner`` does the
+same while the answer streams in. Once a paragraph is complete (no open tag
+spans the break) it is cleaned once and frozen, so every flush only re-cleans
+the unfinished tail. The client receives ``delta`` events instead of the full
+text each time.
+"""
+
+import re
+
+# HTML → Markdown conversion for LLMs that output HTML despite instructions.
+# One scan finds every tag; pairs are then resolved on the tag list with the
+# semantics the old regex chain had: per tag kind, the leftmost opener pairs
+# with the nearest following closer (non-greedy), openers match by prefix
+# ("<b" also catches "<br"), unpaired tags fall through to the block/strip rules.
+_TAG_SPLIT_RE = re.compile(r"(</?[a-zA-Z][^>]*>)")
+_OPENER_RE = re.compile(r"<(strong|b|em|i|h[1-6]|li|p)")
+_CLOSERS = {f"</{kind}>": kind for kind in ("strong", "b", "em", "i", "li", "p", *(f"h{n}" for n in range(1, 7)))}
+_REWRITES = {
+    "strong": ("**", "**"),
+    "b": ("**", "**"),
+    "em": ("*", "*"),
+    "i": ("*", "*"),
+    "li": ("\n- ", ""),
+    "p": ("", "\n\n"),
+    **{f"h{n}": (f"\n{'#' * min(n + 1, 4)} ", "\n") for n in range(1, 7)},
+}
+# Unpaired layout tags become line breaks, anything else is dropped
+_BLOCK_TAG_RE = re.compile(
+    r"</?(?:ul|ol)[^>]*>|</?(?:div|span|br|table|tr|td|th|thead|tbody|blockquote|hr)[\s/]*>", re.IGNORECASE,
+)
+_FOLLOWUP_OPEN, _FOLLOWUP_CLOSE = "<followup>", "</followup>"
+# A stray "<" right before a tag ("<<p>x</p>", "</<b>") or inside one
+# ("a<b <span>") makes the result depend on the order of the rewrites, which
+# only the sequential chain reproduces. Over-matching is harmless.
+_TAG_OVERLAP_RE = re.compile(r"</?</?[a-zA-Z]|</?[a-zA-Z][^<>]*<")
+
+_TRAILING_SPACE_RE = re.compile(r"[ \t]+\n")
+_BLANK_LINES_RE = re.compile(r"\n{3,}")
+_LIST_GAP_RE = re.compile(r"(\n- )\n+(?=- )")
+
+
+def clean_llm_output(text: str) -> str:
+    """Convert HTML in LLM output to clean Markdown, keeping <followup> tags at the end."""
+    followups = []
+    if "<" in text:
+        if _TAG_OVERLAP_RE.search(text):
+            return _clean_sequential(text)
+        text, followups = _rewrite_tags(_TAG_SPLIT_RE.split(text))
+
+    # Normalize whitespace
+    text = _TRAILING_SPACE_RE.sub("\n", text)
+    text = _BLANK_LINES_RE.sub("\n\n", text)
+    text = _LIST_GAP_RE.sub(r"\1", text)
+
+    text = text.strip()
+    if followups:
+        text += "\n" + "\n".join(followups)
+    return text
+
+
+def _rewrite_tags(parts: list[str]) -> tuple[str, list[str]]:
+    """Rewrite the tags in *parts* (text at even, tags at odd indices) in place."""
+    # <followup>…</followup> blocks are cut out verbatim, everything inside included
+    followups = []
+    opener = None
+    for idx in range(1, len(parts), 2):
+        tag = parts[idx].lower()
+        if tag == _FOLLOWUP_OPEN and opener is None:
+            opener = idx
+        elif tag == _FOLLOWUP_CLOSE and opener is not None:
+            followups.append("".join(parts[opener:idx + 1]))
+            parts[opener:idx + 1] = [""] * (idx + 1 - opener)
+            opener = None
+
+    pending: dict[str, int] = {}
+    paired = set()
+    for idx in range(1, len(parts), 2):
+        tag = parts[idx].lower()
+        if not tag:
+            continue
+        if tag[1] == "/":
+            kind = _CLOSERS.get(tag)
+            if kind is not None and kind in pending:
+                opened = pending.pop(kind)
+                parts[opened], parts[idx] = _REWRITES[kind]
+                paired.add(opened)
+                paired.add(idx)
+        else:
+            m = _OPENER_RE.match(tag)
+            if m:
+                pending.setdefault(m.group(1), idx)
+
+    for idx in range(1, len(parts), 2):
+        if idx not in paired and parts[idx]:
+            parts[idx] = "\n" if _BLOCK_TAG_RE.fullmatch(parts[idx]) else ""
+    return "".join(parts), followups
+
+
+# The original one-regex-per-rule chain, the reference for the rewriter above
+_SEQ_FOLLOWUP_RE = re.compile(r"<followup>.*?</followup>", re.DOTALL | re.IGNORECASE)
+_SEQ_RULES = [
+    (re.compile(r"<strong[^>]*>(.*?)</strong>", re.DOTALL | re.IGNORECASE), r"**\1**"),
+    (re.compile(r"<b[^>]*>(.*?)</b>", re.DOTALL | re.IGNORECASE), r"**\1**"),
+    (re.compile(r"<em[^>]*>(.*?)</em>", re.DOTALL | re.IGNORECASE), r"*\1*"),
+    (re.compile(r"<i[^>]*>(.*?)</i>", re.DOTALL | re.IGNORECASE), r"*\1*"),
+    *(
+        (re.compile(rf"<h{n}[^>]*>(.*?)</h{n}>", re.DOTALL | re.IGNORECASE), rf"\n{'#' * min(n + 1, 4)} \1\n")
+        for n in range(1, 7)
+    ),
+    (re.compile(r"<li[^>]*>(.*?)</li>", re.DOTALL | re.IGNORECASE), r"\n- \1"),
+    (re.compile(r"<p[^>]*>(.*?)</p>", re.DOTALL | re.IGNORECASE), r"\1\n\n"),
+    (re.compile(r"<\/?(ul|ol)[^>]*>", re.IGNORECASE), "\n"),
+    (re.compile(r"<\/?(div|span|br|table|tr|td|th|thead|tbody|blockquote|hr)[\s/]*>", re.IGNORECASE), "\n"),
+    (re.compile(r"<\/?[a-z][a-z0-9]*[^>]*>", re.IGNORECASE), ""),
+]
+
+
+def _clean_sequential(text: str) -> str:
+    followups = _SEQ_FOLLOWUP_RE.findall(text)
+    text = _SEQ_FOLLOWUP_RE.sub("", text)
+    for pattern, replacement in _SEQ_RULES:
+        text = pattern.sub(replacement, text)
+
+    text = _TRAILING_SPACE_RE.sub("\n", text)
+    text = _BLANK_LINES_RE.sub("\n\n", text)
+    text = _LIST_GAP_RE.sub(r"\1", text)
+
+    text = text.strip()
+    if followups:
+        text += "\n" + "\n".join(followups)
+    return text
+
+
+# Tags whose open/close pair must not straddle a commit point
+_PAIRED_TAG_RE = re.compile(r"<(/?)(strong|b|em|i|h[1-6]|li|p|followup)\b[^>]*>", re.IGNORECASE)
+_OPEN_TAG_AT_END_RE = re.compile(r"<[a-zA-Z/][^>]*$")
+
+
+def _tags_closed(text: str) -> bool:
+    """True if *text* can be cleaned on its own: no unterminated tag, no open pair, no followups."""
+    if _OPEN_TAG_AT_END_RE.search(text) or "<followup" in text.lower():
+        return False
+    depth: dict[str, int] = {}
+    for m in _PAIRED_TAG_RE.finditer(text):
+        name = m.group(2).lower()
+        depth[name] = depth.get(name, 0) + (-1 if m.group(1) else 1)
+    return not any(depth.values())
+
+
+def _utf16_len(text: str) -> int:
+    # Delta offsets index JavaScript strings, which count UTF-16 code units
+    return len(text.encode("utf-16-le")) // 2
+
+
+class StreamingCleaner:
+    """Incremental ``clean_llm_output`` for a token stream, emitting SSE events.
+
+    ``flush()`` returns ``{"event": "delta", "data": {"offset", "text"}}``: the
+    client keeps its first ``offset`` characters (UTF-16 units) and appends
+    ``text``. Usually that is a pure append; when a closing tag turns the tail
+    into Markdown the splice starts a little earlier. Every ``RESYNC_EVERY``
+    events the full text is sent as a ``content`` event instead.
+    """
+
+    RESYNC_EVERY = 200
+    LONG_TAIL_CHARS = 1500  # Past this, single line breaks are commit points too
+
+    def __init__(self):
+        self._parts: list[str] = []
+        self._tail = ""  # Raw text not frozen yet
+        self._stable = ""  # Cleaned text of the frozen paragraphs
+        self._sep = ""  # Separator between the frozen text and the tail
+        self._client = ""  # Text the client currently has
+        self._client_utf16 = 0
+        self._fixed = 0  # Prefix of _client known to equal the frozen text
+        self._events = 0
+
+    @property
+    def raw(self) -> str:
+        return "".join(self._parts)
+
+    def feed(self, token: str):
+        self._parts.append(token)
+        self._tail += token
+
+    def _commit(self):
+        """Freeze the tail up to its last complete paragraph, if no tag spans it."""
+        tail = self._tail
+        cut = tail.rfind("\n\n")
+        if cut <= 0 and len(tail) > self.LONG_TAIL_CHARS:
+            cut = tail.rfind("\n")
+        if cut <= 0:
+            return
+        while cut > 0 and tail[cut - 1] == "\n":
+            cut -= 1
+        if cut == 0:
+            return
+        end = cut
+        while end < len(tail) and tail[end] == "\n":
+            end += 1
+        if end == len(tail) or not _tags_closed(tail[:cut]):
+            return  # More line breaks may follow, or an open tag continues past the break
+
+        cleaned = clean_llm_output(tail[:cut])
+        sep = "\n\n" if end - cut >= 2 else "\n"
+        if cleaned:
+            self._stable += (self._sep if self._stable else "") + cleaned
+            self._sep = sep
+        elif self._stable and len(sep) > len(self._sep):
+            self._sep = sep
+        self._tail = tail[end:]
+
+    def _display(self) -> str:
+        tail = self._tail
+        # Chop off any incomplete HTML tag at the end (but not math like "< 5")
+        last_lt = tail.rfind("<")
+        if last_lt != -1 and ">" not in tail[last_lt:]:
+            rest = tail[last_lt:]
+            if len(rest) > 1 and (rest[1:2].isalpha() or rest[1:2] == "/"):
+                tail = tail[:last_lt]
+        tail = clean_llm_output(tail)
+        if tail.startswith("\n"):  # Only followup tags left, appended like clean_llm_output does
+            return self._stable + tail
+        if self._stable and tail:
+            return self._stable + self._sep + tail
+        return self._stable or tail
+
+    def flush(self) -> list[dict]:
+        """Events that bring the client up to date with the cleaned text so far."""
+        self._commit()
+        display = self._display()
+        client = self._client
+        if display == client:
+            return []
+
+        self._events += 1
+        if self._events % self.RESYNC_EVERY == 0:
+            event = {"event": "content", "data": display}
+            self._client_utf16 = _utf16_len(display)
+        else:
+            # Only the tail after the previously frozen text can differ
+            i = min(self._fixed, len(client), len(display))
+            n = min(len(client), len(display))
+            while i < n and client[i] == display[i]:
+                i += 1
+            offset = self._client_utf16 - _utf16_len(client[i:])
+            event = {"event": "delta", "data": {"offset": offset, "text": display[i:]}}
+            self._client_utf16 = offset + _utf16_len(display[i:])
+        self._client = display
+        self._fixed = len(self._stable)
+        return [event]
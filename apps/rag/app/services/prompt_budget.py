@@ -0,0 +1,108 @@
+"""
+Token counting for chat prompts, and per-turn prompt token statistics.
+
+Counts use tiktoken's cl100k_base encoding. The chat models (Llama, gpt-oss,
+Gemma) have tokenizers of their own, so a count is an estimate, but a much
+closer one than characters / 4. That ratio is the fallback when tiktoken or its
+encoding file is unavailable; the file is downloaded on first use, so set
+TIKTOKEN_CACHE_DIR to ship it with an offline deployment.
+"""
+
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+_ENCODING_NAME = "cl100k_base"
+
+_encoding = None
+_encoding_loaded = False  # Also set after a failed load, so it is not retried on every call
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding():
+    """The tiktoken encoding (singleton), or None if it cannot be loaded."""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        with _encoding_lock:
+            if not _encoding_loaded:
+                try:
+                    import tiktoken
+
+                    _encoding = tiktoken.get_encoding(_ENCODING_NAME)
+                except Exception as e:
+                    logger.warning(f"tiktoken unavailable, estimating prompt tokens as characters / 4: {e}")
+                _encoding_loaded = True
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    # Documents may contain special-token text such as <|endoftext|>: count it as plain text
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int, keep_end: bool = False) -> str:
+    """*text* cut to at most *max_tokens* tokens, keeping its start (or its end)."""
+    if max_tokens <= 0:
+        return ""
+    encoding = _get_encoding()
+    if encoding is None:
+        limit = max_tokens * 4
+        if len(text) <= limit:
+            return text
+        return text[-limit:] if keep_end else text[:limit]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[-max_tokens:] if keep_end else tokens[:max_tokens])
+
+
+class PromptTokenStats:
+    """Where prompt tokens go: per-part totals over all turns, and how often the budget cut something."""
+
+    PARTS = ("system", "instructions", "history", "attachments", "kb")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.turns = 0
+        self.tokens = dict.fromkeys(self.PARTS + ("total",), 0)
+        self.turns_trimmed = 0
+        self.chunks_dropped = 0
+        self.chunks_compressed = 0
+        self.history_truncated = 0
+
+    def record(self, breakdown: dict):
+        with self._lock:
+            self.turns += 1
+            for part in self.tokens:
+                self.tokens[part] += breakdown.get(part, 0)
+            self.chunks_dropped += breakdown["chunks_dropped"]
+            self.chunks_compressed += breakdown["chunks_compressed"]
+            self.history_truncated += breakdown["history_truncated"]
+            if breakdown["chunks_dropped"] or breakdown["chunks_compressed"] or breakdown["history_truncated"]:
+                self.turns_trimmed += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.tokens["total"]
+            return {
+                "turns": self.turns,
+                "avg_tokens": {part: round(n / self.turns) if self.turns else 0 for part, n in self.tokens.items()},
+                "share": {part: round(self.tokens[part] / total, 4) if total else 0.0 for part in self.PARTS},
+                "turns_trimmed": self.turns_trimmed,
+                "chunks_dropped": self.chunks_dropped,
+                "chunks_compressed": self.chunks_compressed,
+                "history_truncated": self.history_truncated,
+            }
+
+
+prompt_token_stats = PromptTokenStats()
+
+
+def get_prompt_token_stats() -> dict:
+    return prompt_token_stats.stats()
@@ -18,6 +18,7 @@ def execute_query(request: QueryRequest) -> QueryResponse:
         collection_name=request.collection,
         top_k=request.top_k,
         use_multi_query=True,
+        use_cache=request.use_cache,
     )
 
     if not chunks:
@@ -64,6 +65,7 @@ def execute_query_stream(request: QueryRequest) -> Generator[str, None, None]:
         collection_name=request.collection,
         top_k=request.top_k,
         use_multi_query=True,
+        use_cache=request.use_cache,
     )
 
     if not chunks:
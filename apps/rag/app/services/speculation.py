@@ -0,0 +1,115 @@
+"""
+Speculative answer generation for the chat stream.
+
+With ``speculative_generation_enabled`` the chat stream starts the LLM on the
+provisional (semantic-only) chunks while BM25, re-ranking and neighbor
+expansion are still running. Tokens are buffered, not sent. Once the final
+top-k is known it is compared with the provisional set: if enough of the
+final chunks were already in the prompt (``speculative_overlap_threshold``)
+the buffered tokens are flushed and the stream carries on, otherwise the
+speculative run is cancelled and generation restarts on the final chunks.
+
+Outcomes and observed overlaps are counted so the threshold can be tuned
+against real traffic (see ``/health``).
+"""
+
+import asyncio
+import threading
+import time
+from collections.abc import AsyncGenerator, AsyncIterator, Callable
+
+_DONE = object()
+
+
+def chunk_overlap(provisional: list, final: list) -> float:
+    """Fraction of the final chunks that were already among the provisional ones."""
+    if not final:
+        return 1.0 if not provisional else 0.0
+    seen = {_chunk_key(c) for c in provisional}
+    return sum(1 for c in final if _chunk_key(c) in seen) / len(final)
+
+
+def _chunk_key(chunk) -> str:
+    # Neighbor expansion rewrites content, the chunk id stays the same
+    return chunk.chunk_id or f"{chunk.source_file}:{hash(chunk.content)}"
+
+
+class SpeculativeGeneration:
+    """Consumes an async token stream in a background task, buffering until read or cancelled."""
+
+    def __init__(self, stream_factory: Callable[[], AsyncIterator[str]]):
+        self._tokens: asyncio.Queue = asyncio.Queue()
+        self.started = time.monotonic()
+        self._task = asyncio.create_task(self._run(stream_factory))
+
+    async def _run(self, stream_factory: Callable[[], AsyncIterator[str]]):
+        try:
+            async for token in stream_factory():
+                self._tokens.put_nowait(token)
+        except Exception as e:
+            self._tokens.put_nowait(e)
+        finally:
+            # Cancelling the task unwinds the provider stream, which closes its HTTP response
+            self._tokens.put_nowait(_DONE)
+
+    def cancel(self):
+        self._task.cancel()
+
+    async def tokens(self) -> AsyncGenerator[str, None]:
+        """Buffered tokens first, then live ones until the stream ends."""
+        while True:
+            item = await self._tokens.get()
+            if item is _DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+
+class SpeculationStats:
+    """Counts kept vs. restarted speculative runs and the overlaps that decided them."""
+
+    BUCKETS = 10
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = 0
+        self.kept = 0
+        self.restarted = 0
+        self.head_start_seconds = 0.0
+        self.overlap_histogram = [0] * (self.BUCKETS + 1)
+
+    def record_start(self):
+        with self._lock:
+            self.started += 1
+
+    def record_outcome(self, overlap: float, kept: bool, head_start: float):
+        with self._lock:
+            self.overlap_histogram[int(overlap * self.BUCKETS)] += 1
+            if kept:
+                self.kept += 1
+                self.head_start_seconds += head_start
+            else:
+                self.restarted += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            decided = self.kept + self.restarted
+            return {
+                "started": self.started,
+                "kept": self.kept,
+                "restarted": self.restarted,
+                "keep_rate": round(self.kept / decided, 4) if decided else 0.0,
+                "avg_head_start_seconds": round(self.head_start_seconds / self.kept, 3) if self.kept else 0.0,
+                # Overlap of each decided run, in 0.1 buckets: shows the keep rate other thresholds would give
+                "overlap_histogram": {
+                    f"{i / self.BUCKETS:.1f}": n for i, n in enumerate(self.overlap_histogram)
+                },
+            }
+
+
+speculation_stats = SpeculationStats()
+
+
+def get_speculation_stats() -> dict:
+    return speculation_stats.stats()
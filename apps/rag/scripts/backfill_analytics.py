@@ -0,0 +1,33 @@
+"""
+Backfill (or re-sync) the materialized analytics counters in chat.db.
+
+The analytics dashboard reads counters that are kept up to date as chats are
+saved. init_db() fills them once when the tables are first created; run this
+to rebuild them from the sessions, messages and feedback tables, for example
+after restoring a backup or editing chat.db by hand.
+
+Usage:
+    cd apps/rag
+    python -m scripts.backfill_analytics
+"""
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.core import database
+
+
+def main():
+    database.init_db()
+    print(f"Rebuilding analytics counters in {database.DB_PATH}")
+    t0 = time.perf_counter()
+    totals = database.rebuild_analytics()
+    print(f"  done in {time.perf_counter() - t0:.2f}s")
+    for name, value in sorted(totals.items()):
+        print(f"  {name:<18} {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Benchmark: SparseBM25 (CSR mat-vec + argpartition) vs. the old rank_bm25 path.
+
+The old retriever rebuilt a BM25Okapi index from every chunk on each query,
+then called get_scores() and fully sorted the result. This script measures
+that path, rank_bm25 with a prebuilt index, and SparseBM25 on a synthetic
+Zipf-distributed corpus.
+
+Usage:
+    cd apps/rag
+    pip install rank-bm25   # only needed for the baseline
+    python -m scripts.bench_bm25
+    python -m scripts.bench_bm25 --sizes 10000 100000 1000000 --queries 50
+    python -m scripts.bench_bm25 --baseline-max 100000
+"""
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from scipy import sparse
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.retrieval.bm25_scorer import SparseBM25
+
+
+def synth_corpus(n_docs: int, tokens_per_doc: int, vocab_size: int, seed: int):
+    """Return (vocabulary, documents x terms count matrix) with Zipfian term frequencies."""
+    rng = np.random.default_rng(seed)
+    vocabulary = [f"term{i}" for i in range(vocab_size)]
+    term_ids = (rng.zipf(1.2, size=n_docs * tokens_per_doc) - 1) % vocab_size
+    doc_ids = np.repeat(np.arange(n_docs), tokens_per_doc)
+    counts = sparse.csr_matrix(
+        (np.ones(len(term_ids), dtype=np.float32), (doc_ids, term_ids)),
+        shape=(n_docs, vocab_size),
+    )
+    counts.sum_duplicates()
+    return vocabulary, counts
+
+
+def to_token_lists(vocabulary: list[str], counts: sparse.csr_matrix) -> list[list[str]]:
+    docs = []
+    for row in range(counts.shape[0]):
+        start, end = counts.indptr[row], counts.indptr[row + 1]
+        tokens = []
+        for term, tf in zip(counts.indices[start:end], counts.data[start:end]):
+            tokens.extend([vocabulary[term]] * int(tf))
+        docs.append(tokens)
+    return docs
+
+
+def make_queries(vocabulary: list[str], n: int, seed: int) -> list[str]:
+    """Mix of frequent and mid/rare terms, 2-6 terms per query."""
+    rng = np.random.default_rng(seed + 1)
+    queries = []
+    for _ in range(n):
+        k = int(rng.integers(2, 7))
+        ids = np.concatenate([rng.integers(0, 50, size=1), rng.integers(50, 5000, size=k - 1)])
+        queries.append(" ".join(vocabulary[i] for i in ids))
+    return queries
+
+
+def _pct(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def _report(label: str, timings: list[float]):
+    ms = [t * 1000 for t in timings]
+    print(
+        f"    {label:<34} p50 {statistics.median(ms):9.2f} ms   "
+        f"p95 {_pct(ms, 95):9.2f} ms   mean {statistics.mean(ms):9.2f} ms"
+    )
+
+
+def bench_size(n_docs: int, args):
+    print(f"\n=== {n_docs:,} chunks ===")
+    t0 = time.perf_counter()
+    vocabulary, counts = synth_corpus(n_docs, args.tokens, args.vocab, args.seed)
+    print(f"  corpus generated in {time.perf_counter() - t0:.1f}s ({counts.nnz:,} postings)")
+    queries = make_queries(vocabulary, args.queries, args.seed)
+    doc_ids = [f"doc_chunk_{i}" for i in range(n_docs)]
+
+    t0 = time.perf_counter()
+    scorer = SparseBM25(doc_ids, vocabulary, counts)
+    print(f"  SparseBM25 build: {time.perf_counter() - t0:.2f}s (one-off per index version)")
+
+    timings = []
+    for q in queries:
+        t0 = time.perf_counter()
+        scorer.search(q, args.top_k)
+        timings.append(time.perf_counter() - t0)
+    _report("SparseBM25 query", timings)
+
+    if n_docs > args.baseline_max:
+        print(f"  rank_bm25 baseline skipped (> --baseline-max {args.baseline_max:,})")
+        return
+
+    try:
+        from rank_bm25 import BM25Okapi
+    except ImportError:
+        print("  rank_bm25 not installed — baseline skipped (pip install rank-bm25)")
+        return
+
+    token_lists = to_token_lists(vocabulary, counts)
+
+    # Old retriever path: build the index on every query, score, full sort
+    timings = []
+    for q in queries[:args.rebuild_queries]:
+        t0 = time.perf_counter()
+        bm25 = BM25Okapi(token_lists)
+        scores = bm25.get_scores(q.split())
+        scored = sorted(enumerate(scores), key=lambda x: x[1], reverse=True)[:args.top_k]
+        timings.append(time.perf_counter() - t0)
+    _report(f"rank_bm25 rebuild+score ({len(timings)} q)", timings)
+
+    # rank_bm25 with a prebuilt index (isolates get_scores + sort)
+    bm25 = BM25Okapi(token_lists)
+    timings = []
+    for q in queries:
+        t0 = time.perf_counter()
+        scores = bm25.get_scores(q.split())
+        scored = sorted(enumerate(scores), key=lambda x: x[1], reverse=True)[:args.top_k]
+        timings.append(time.perf_counter() - t0)
+    _report("rank_bm25 prebuilt score+sort", timings)
+
+    # Ranking overlap between the two scorers (IDF variants differ slightly)
+    overlaps = []
+    for q in queries:
+        ours = {doc_id for doc_id, _ in scorer.search(q, args.top_k)}
+        theirs = {doc_ids[i] for i in np.argsort(-bm25.get_scores(q.split()))[:args.top_k]}
+        overlaps.append(len(ours & theirs) / max(len(theirs), 1))
+    print(f"    top-{args.top_k} overlap with rank_bm25: {statistics.mean(overlaps):.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark BM25 scoring engines")
+    parser.add_argument("--sizes", type=int, nargs="*", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=50, help="Queries per corpus size")
+    parser.add_argument("--rebuild-queries", type=int, default=3, help="Queries for the rebuild-per-query baseline")
+    parser.add_argument("--tokens", type=int, default=150, help="Tokens per chunk (~1000 chars)")
+    parser.add_argument("--vocab", type=int, default=50_000)
+    parser.add_argument("--top-k", type=int, default=15)
+    parser.add_argument("--baseline-max", type=int, default=100_000, help="Largest corpus to run rank_bm25 on")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    for n in args.sizes:
+        bench_size(n, args)
+
+
+if __name__ == "__main__":
+    main()
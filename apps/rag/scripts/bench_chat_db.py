@@ -0,0 +1,141 @@
+"""
+Benchmark: chat.db overhead of one chat turn, fresh connections vs. pooled.
+
+Replays the SQLite calls a chat() turn makes (get_turn_context, get_agent,
+record_turn, log_llm_usage) against a temporary database. It runs them once
+with the old behaviour, a new connection plus PRAGMAs per call and default
+synchronous=FULL, and once with app.core.sqlite_pool. Sessions are pre-filled
+with --history messages, each answer carrying --source-count sources.
+--separate-writes saves the turn the way it was done before record_turn: two
+add_message calls and update_session_title, each its own transaction.
+--full-reads loads the turn the way it was done before get_turn_context:
+get_session, get_messages(limit=200) with all sources decoded,
+get_recent_context and get_session_metadata twice.
+
+Usage:
+    cd apps/rag
+    python -m scripts.bench_chat_db
+    python -m scripts.bench_chat_db --turns 500 --history 40 --threads 4
+    python -m scripts.bench_chat_db --separate-writes
+    python -m scripts.bench_chat_db --history 150 --full-reads
+"""
+import argparse
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.core import database, sqlite_pool, usage_tracker
+
+
+@contextmanager
+def _fresh_connection(path: Path):
+    """What database._conn / usage_tracker._conn did before the pool."""
+    conn = sqlite3.connect(str(path))
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def _sources(n: int) -> list[dict]:
+    return [
+        {"filename": f"schema{i}.pdf", "chunk_id": f"c{i}", "chunk_text": "Tekst uit het document. " * 40,
+         "relevance_score": 0.8}
+        for i in range(n)
+    ]
+
+
+def one_turn(session_id: str, agent_id: str, turn: int, args):
+    if args.full_reads:
+        database.get_session(session_id)
+        database.get_messages(session_id, limit=200)
+        database.get_recent_context(session_id, max_messages=6)
+        database.get_session_metadata(session_id)  # Retrieval (attachments)
+        database.get_session_metadata(session_id)  # History summary cache
+    else:
+        database.get_turn_context(session_id, tail=20)
+    database.get_agent(agent_id)
+    question = f"Vraag {turn}: hoeveel sets per week?"
+    answer = "Antwoord met 10–20 sets per week [1]. " * 20
+    sources = _sources(args.source_count)
+    if args.separate_writes:
+        database.add_message(session_id, "user", question)
+        database.add_message(session_id, "assistant", answer, sources=sources)
+        database.update_session_title(session_id, f"Sets per week {turn}")
+    else:
+        database.record_turn(session_id, question, answer, sources=sources, title=f"Sets per week {turn}")
+    usage_tracker.log_llm_usage("llama-3.3-70b-versatile", 2000, 400, provider="groq")
+
+
+def run(label: str, args, sessions: list[str], agent_id: str) -> list[float]:
+    def worker(idx: int) -> list[float]:
+        times = []
+        for turn in range(args.turns // args.threads):
+            t0 = time.perf_counter()
+            one_turn(sessions[(idx + turn) % len(sessions)], agent_id, turn, args)
+            times.append(time.perf_counter() - t0)
+        return times
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        times = [t for ts in pool.map(worker, range(args.threads)) for t in ts]
+    wall = time.perf_counter() - t0
+    times.sort()
+    print(f"  {label:<22} per turn p50 {statistics.median(times) * 1000:6.2f} ms   "
+          f"p95 {times[int(0.95 * (len(times) - 1))] * 1000:6.2f} ms   {len(times) / wall:7.0f} turns/s")
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per-turn chat.db overhead")
+    parser.add_argument("--turns", type=int, default=300)
+    parser.add_argument("--history", type=int, default=20, help="Messages already in each session")
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--separate-writes", action="store_true", help="Save the turn without record_turn")
+    parser.add_argument("--full-reads", action="store_true", help="Load the turn without get_turn_context")
+    parser.add_argument("--source-count", type=int, default=10, help="Sources stored with each answer")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_PATH = usage_tracker.DB_PATH = Path(tmp) / "chat.db"
+        database.init_db()
+        usage_tracker.init_usage_table()
+        agent_id = database.create_agent("Coach", "Je bent een trainingscoach.")["id"]
+        sessions = [database.create_session(agent_id=agent_id)["id"] for _ in range(args.sessions)]
+        for session_id in sessions:
+            for i in range(0, args.history, 2):
+                database.record_turn(
+                    session_id, f"Bericht {i} " * 30, f"Bericht {i + 1} " * 30, sources=_sources(args.source_count),
+                )
+
+        print(
+            f"{args.turns} turns over {args.sessions} sessions ({args.history} messages each), {args.threads} thread(s), "
+            f"{'separate write transactions' if args.separate_writes else 'record_turn'}, "
+            f"{'full reads' if args.full_reads else 'get_turn_context'}"
+        )
+        pooled_connection = sqlite_pool.connection
+        sqlite_pool.connection = _fresh_connection
+        try:
+            before = run("fresh connection/call", args, sessions, agent_id)
+        finally:
+            sqlite_pool.connection = pooled_connection
+        after = run("pooled per thread", args, sessions, agent_id)
+        usage_tracker.flush_usage()  # Before the temporary database goes away
+        sqlite_pool.close_all()
+
+    print(f"  p50 speedup {statistics.median(before) / statistics.median(after):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
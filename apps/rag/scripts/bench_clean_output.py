@@ -0,0 +1,53 @@
+"""
+Benchmark: clean_llm_output, single-pass rewriter vs. the sequential regex chain.
+
+Times both on the golden corpus of recorded answers (tests/golden) and on the
+short paragraph tails that StreamingCleaner re-cleans at every flush, and
+checks that every output is identical.
+
+Usage:
+    cd apps/rag
+    python -m scripts.bench_clean_output
+    python -m scripts.bench_clean_output --number 5000
+"""
+import argparse
+import json
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.services.output_cleaner import _clean_sequential, clean_llm_output
+
+GOLDEN = Path(__file__).parent.parent / "tests" / "golden" / "clean_llm_output.json"
+
+
+def _per_call_us(fn, texts: list[str], number: int) -> float:
+    def run():
+        for t in texts:
+            fn(t)
+    best = min(timeit.repeat(run, number=number, repeat=3))
+    return best / (number * len(texts)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark clean_llm_output")
+    parser.add_argument("--number", type=int, default=2000, help="Passes over each text set")
+    args = parser.parse_args()
+
+    answers = [case["raw"] for case in json.loads(GOLDEN.read_text(encoding="utf-8"))]
+    tails = [a.split("\n\n")[-1] for a in answers]
+    sets = (("golden answers", answers), ("stream tails", tails), ("full corpus joined", ["\n\n".join(answers)]))
+
+    mismatches = sum(clean_llm_output(t) != _clean_sequential(t) for _, texts in sets for t in texts)
+    print(f"{len(answers)} answers; outputs identical: {mismatches == 0}")
+    for label, texts in sets:
+        number = max(1, args.number // len(texts)) if len(texts) == 1 else args.number
+        old = _per_call_us(_clean_sequential, texts, number)
+        new = _per_call_us(clean_llm_output, texts, number)
+        print(f"  {label:<20} regex chain {old:8.1f} µs   single pass {new:8.1f} µs   speedup {old / new:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Benchmark: sequential vs. pipelined embedding batches against a fake Ollama.
+
+Starts a local HTTP stub that implements /api/embed with a simulated latency
+(fixed overhead + per-character cost) and a limited number of server workers,
+so the point where Ollama saturates is visible. Then embeds the same corpus
+with the old one-batch-at-a-time path and with the async dispatcher at
+several concurrency limits, checking that results come back in order.
+
+Usage:
+    cd apps/rag
+    python -m scripts.bench_embeddings
+    python -m scripts.bench_embeddings --texts 2000 --concurrency 2 4 8 16 --server-workers 8
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.config import settings
+from app.core import embeddings
+
+
+def fake_vector(text: str, dim: int) -> list[float]:
+    return [float(zlib.crc32(text.encode("utf-8")))] + [0.0] * (dim - 1)
+
+
+def start_stub(args) -> ThreadingHTTPServer:
+    workers = threading.Semaphore(args.server_workers)
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+            with workers:  # Requests beyond the worker count queue up, like a saturated Ollama
+                time.sleep(args.overhead_ms / 1000 + args.us_per_char * sum(len(t) for t in texts) / 1e6)
+            payload = json.dumps({
+                "model": body.get("model", ""),
+                "embeddings": [fake_vector(t, args.dim) for t in texts],
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *a):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run(label: str, fn, texts: list[str], dim: int, baseline: float | None) -> float:
+    t0 = time.perf_counter()
+    result = fn(texts)
+    elapsed = time.perf_counter() - t0
+    ordered = all(v[0] == fake_vector(t, dim)[0] for t, v in zip(texts, result))
+    speedup = f"{baseline / elapsed:5.2f}x" if baseline else "  1.00x"
+    print(f"  {label:<28} {elapsed:7.2f}s   {len(texts) / elapsed:8.0f} texts/s   {speedup}   order ok: {ordered}")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark embedding dispatch against a fake Ollama")
+    parser.add_argument("--texts", type=int, default=1000)
+    parser.add_argument("--chars", type=int, default=1000, help="Characters per text (~ chunk size)")
+    parser.add_argument("--concurrency", type=int, nargs="*", default=[2, 4, 8])
+    parser.add_argument("--server-workers", type=int, default=4, help="Requests the stub serves in parallel")
+    parser.add_argument("--overhead-ms", type=float, default=30.0, help="Fixed latency per request")
+    parser.add_argument("--us-per-char", type=float, default=4.0, help="Latency per input character")
+    parser.add_argument("--dim", type=int, default=1024)
+    args = parser.parse_args()
+
+    server = start_stub(args)
+    settings.ollama_base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    settings.embedding_cache_enabled = False
+
+    texts = [f"{i:06d} " + "x" * (args.chars - 7) for i in range(args.texts)]
+    print(
+        f"{args.texts} texts x {args.chars} chars; stub: {args.server_workers} workers, "
+        f"{args.overhead_ms:.0f} ms + {args.us_per_char} us/char per request"
+    )
+
+    baseline = run("sequential (batch 50)", embeddings._embed_sequential, texts, args.dim, None)
+    for n in args.concurrency:
+        settings.embedding_max_concurrency = n
+        run(f"pipelined, concurrency {n}", embeddings._embed_uncached, texts, args.dim, baseline)
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Benchmark: cross-encoder re-ranking latency, torch vs. ONNX Runtime.
+
+Reranks the same (query, 10 candidates) sets the retriever sends per turn with
+sentence-transformers and with one or more ONNX exports of the model, and
+reports p50/p95 latency per rerank call plus agreement with the torch ranking
+(top-1 match and top-k overlap).
+
+Passages come from --corpus (a text file, passages separated by blank lines)
+or a small built-in Dutch/English sample. Models are downloaded from the
+Hugging Face hub on first use.
+
+Usage:
+    cd apps/rag
+    python -m scripts.bench_reranker
+    python -m scripts.bench_reranker --onnx-files onnx/model.onnx onnx/model_quint8_avx2.onnx --threads 4
+    python -m scripts.bench_reranker --corpus ./data/sample.txt --queries 100 --max-length 256
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.config import settings
+from app.retrieval.reranker import OnnxCrossEncoder
+
+SAMPLE_PASSAGES = [
+    "Squats en deadlifts zijn samengestelde oefeningen die kracht in de benen en rug opbouwen.",
+    "Een eiwitinname van 1,6 tot 2,2 gram per kilo lichaamsgewicht ondersteunt spiergroei.",
+    "Slaap van zeven tot negen uur per nacht is essentieel voor herstel na zware trainingen.",
+    "Progressive overload means gradually increasing weight, volume or intensity over time.",
+    "Creatine monohydraat is het best onderzochte supplement voor kracht en spiermassa.",
+    "Cardio in zone 2 verbetert de aerobe basis zonder het herstel van krachttraining te verstoren.",
+    "A caloric deficit of 300 to 500 kcal per day allows fat loss while preserving muscle mass.",
+    "Deload-weken verlagen tijdelijk het trainingsvolume om vermoeidheid te laten zakken.",
+    "Hydration affects performance: losing 2% of body weight in water reduces strength output.",
+    "Mobiliteitsoefeningen voor heupen en enkels verbeteren de diepte van de squat.",
+    "Training to failure on every set increases fatigue more than it increases hypertrophy.",
+    "Koolhydraten rond de training vullen glycogeen aan en verbeteren de prestaties bij hoog volume.",
+    "Rest periods of two to three minutes between heavy compound sets maximise strength gains.",
+    "Stress en slechte slaap verhogen cortisol, wat vetverlies en herstel kan vertragen.",
+    "Bench press technique: retract the shoulder blades, keep feet planted and control the descent.",
+    "Vezelrijke voeding verhoogt de verzadiging en helpt bij het volhouden van een calorietekort.",
+]
+
+SAMPLE_QUERIES = [
+    "hoeveel eiwit heb ik nodig voor spiergroei",
+    "how long should I rest between sets",
+    "wat doet slaap voor herstel",
+    "is creatine veilig en werkt het",
+    "how do I lose fat without losing muscle",
+    "waarom een deload week",
+    "squat diepte verbeteren",
+    "does cardio hurt strength training",
+]
+
+
+def load_passages(path: str | None) -> list[str]:
+    if not path:
+        return SAMPLE_PASSAGES
+    text = Path(path).read_text(encoding="utf-8")
+    return [p.strip() for p in text.split("\n\n") if len(p.strip()) > 50]
+
+
+def make_sets(passages: list[str], n: int, candidates: int, seed: int) -> list[list[tuple[str, str]]]:
+    rng = random.Random(seed)
+    sets = []
+    for i in range(n):
+        query = SAMPLE_QUERIES[i % len(SAMPLE_QUERIES)]
+        picked = rng.sample(passages, min(candidates, len(passages)))
+        sets.append([(query, p[:512]) for p in picked])  # Same char cap as the retriever
+    return sets
+
+
+def _pct(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def bench(label: str, model, sets, batch_size: int, warmup: int = 3) -> list[np.ndarray]:
+    for pairs in sets[:warmup]:
+        model.predict(pairs, batch_size=batch_size)
+    timings, all_scores = [], []
+    for pairs in sets:
+        t0 = time.perf_counter()
+        scores = model.predict(pairs, batch_size=batch_size)
+        timings.append((time.perf_counter() - t0) * 1000)
+        all_scores.append(np.asarray(scores, dtype=np.float32))
+    print(f"  {label:<40} p50 {statistics.median(timings):7.1f} ms   p95 {_pct(timings, 95):7.1f} ms")
+    return all_scores
+
+
+def agreement(reference: list[np.ndarray], other: list[np.ndarray], k: int) -> tuple[float, float]:
+    top1, overlap = [], []
+    for ref, got in zip(reference, other):
+        ref_order, got_order = np.argsort(-ref), np.argsort(-got)
+        top1.append(ref_order[0] == got_order[0])
+        overlap.append(len(set(ref_order[:k]) & set(got_order[:k])) / k)
+    return statistics.mean(top1), statistics.mean(overlap)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cross-encoder backends")
+    parser.add_argument("--model", default=settings.reranker_model)
+    parser.add_argument("--onnx-files", nargs="*", default=["onnx/model.onnx", "onnx/model_quint8_avx2.onnx"])
+    parser.add_argument("--corpus", help="Text file with passages separated by blank lines")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--candidates", type=int, default=10, help="Pairs per rerank call (retriever uses 10)")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--max-length", type=int, default=settings.reranker_max_length)
+    parser.add_argument("--batch-size", type=int, default=settings.reranker_batch_size)
+    parser.add_argument("--threads", type=int, default=settings.reranker_threads)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    sets = make_sets(load_passages(args.corpus), args.queries, args.candidates, args.seed)
+    print(f"{len(sets)} rerank calls x {len(sets[0])} pairs, max_length {args.max_length}, batch {args.batch_size}")
+
+    reference = None
+    try:
+        from sentence_transformers import CrossEncoder
+        if args.threads > 0:
+            import torch
+            torch.set_num_threads(args.threads)
+        reference = bench("torch (sentence-transformers)", CrossEncoder(args.model, max_length=args.max_length), sets, args.batch_size)
+    except ImportError:
+        print("  sentence-transformers not installed — torch baseline and agreement skipped")
+
+    for onnx_file in args.onnx_files:
+        try:
+            model = OnnxCrossEncoder.load(args.model, onnx_file, args.max_length, args.threads)
+        except Exception as e:
+            print(f"  {onnx_file}: failed to load ({e})")
+            continue
+        scores = bench(f"onnx {onnx_file}", model, sets, args.batch_size)
+        if reference is not None:
+            top1, overlap = agreement(reference, scores, args.top_k)
+            print(f"    agreement with torch: top-1 {top1:.1%}, top-{args.top_k} overlap {overlap:.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Benchmark: streaming HTML→Markdown cleaning, full re-clean vs. incremental.
+
+Simulates the token loop of chat_stream for a long training-plan answer
+(Markdown with some stray HTML, ~4 chars per token, a flush every 3 tokens or
+at a sentence end). The old path joins and cleans the whole answer at each
+flush and sends it as a full 'content' event. The new path uses
+StreamingCleaner and sends 'delta' events. Reports CPU time and SSE bytes
+sent, and checks that the client ends up with the same text.
+
+Usage:
+    cd apps/rag
+    python -m scripts.bench_stream_cleaning
+    python -m scripts.bench_stream_cleaning --tokens 8000 --html-ratio 0.5
+"""
+import argparse
+import json
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.services.output_cleaner import StreamingCleaner, clean_llm_output
+
+EXERCISES = ["squats", "deadlifts", "bench press", "rows", "overhead press", "lunges", "pull-ups", "hip thrusts"]
+
+
+def make_answer(tokens: int, html_ratio: float, seed: int) -> str:
+    rng = random.Random(seed)
+    blocks = []
+    week = 1
+    while sum(len(b) for b in blocks) < tokens * 4:
+        ex = rng.sample(EXERCISES, 3)
+        if rng.random() < html_ratio:
+            blocks.append(
+                f"<h2>Week {week}</h2>\n\n<p>Focus deze week op <strong>{ex[0]}</strong> met een RPE van "
+                f"{rng.randint(6, 9)} [{rng.randint(1, 5)}].</p>\n\n<ul>"
+                + "".join(f"<li>{e}: {rng.randint(3, 5)} sets x {rng.randint(5, 12)} reps</li>" for e in ex)
+                + "</ul>\n\n"
+            )
+        else:
+            blocks.append(
+                f"### Week {week}\n\nFocus deze week op **{ex[0]}** met een RPE van {rng.randint(6, 9)} "
+                f"[{rng.randint(1, 5)}]. Houd {rng.randint(2, 3)} minuten rust tussen zware sets.\n\n"
+                + "".join(f"- {e}: {rng.randint(3, 5)} sets x {rng.randint(5, 12)} reps\n" for e in ex)
+                + "\n"
+            )
+        week += 1
+    return "".join(blocks) + "<followup>Hoe pas ik dit schema aan voor thuis trainen?</followup>"
+
+
+def split_tokens(text: str, n: int) -> list[str]:
+    pieces = re.findall(r"\s*\S{1,4}|\s+", text)
+    return pieces[:n] if len(pieces) > n else pieces
+
+
+def _sse_bytes(event: dict) -> int:
+    return len(f"event: {event['event']}\ndata: {json.dumps(event['data'], ensure_ascii=False)}\n\n".encode())
+
+
+def _flush_due(i: int, token: str) -> bool:
+    return i % 3 == 0 or token.endswith(("\n", ".", "!", "?"))
+
+
+def run_full(tokens: list[str]) -> tuple[float, int, int, str]:
+    """The previous chat_stream loop: join + clean everything at each flush."""
+    t0 = time.perf_counter()
+    full, prev, sent, events = [], "", 0, 0
+    for i, token in enumerate(tokens, 1):
+        full.append(token)
+        if _flush_due(i, token):
+            raw = "".join(full)
+            last_lt = raw.rfind("<")
+            if last_lt != -1 and ">" not in raw[last_lt:]:
+                tail = raw[last_lt:]
+                if len(tail) > 1 and (tail[1:2].isalpha() or tail[1:2] == "/"):
+                    raw = raw[:last_lt]
+            clean = clean_llm_output(raw)
+            if clean != prev:
+                sent += _sse_bytes({"event": "content", "data": clean})
+                events += 1
+                prev = clean
+    return time.perf_counter() - t0, sent, events, prev
+
+
+def run_incremental(tokens: list[str]) -> tuple[float, int, int, str]:
+    t0 = time.perf_counter()
+    cleaner = StreamingCleaner()
+    client, sent, events = "", 0, 0
+    for i, token in enumerate(tokens, 1):
+        cleaner.feed(token)
+        if _flush_due(i, token):
+            for event in cleaner.flush():
+                sent += _sse_bytes(event)
+                events += 1
+                if event["event"] == "content":
+                    client = event["data"]
+                else:
+                    kept = client.encode("utf-16-le")[: event["data"]["offset"] * 2].decode("utf-16-le")
+                    client = kept + event["data"]["text"]
+    return time.perf_counter() - t0, sent, events, client
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark streaming output cleaning")
+    parser.add_argument("--tokens", type=int, default=4000)
+    parser.add_argument("--html-ratio", type=float, default=0.3, help="Share of blocks written as HTML")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    answer = make_answer(args.tokens, args.html_ratio, args.seed)
+    tokens = split_tokens(answer, args.tokens)
+    print(f"{len(tokens)} tokens, {sum(len(t) for t in tokens)} chars, {args.html_ratio:.0%} of blocks in HTML")
+
+    results = {}
+    for label, fn in (("full re-clean + content", run_full), ("incremental + delta", run_incremental)):
+        best = min((fn(tokens) for _ in range(args.repeat)), key=lambda r: r[0])
+        results[label] = best
+        elapsed, sent, events, _ = best
+        print(f"  {label:<26} {elapsed * 1000:8.1f} ms CPU   {sent / 1024:9.1f} KB sent   {events:5d} events")
+
+    (full_s, full_b, _, full_text), (inc_s, inc_b, _, inc_text) = results.values()
+    print(f"  speedup {full_s / inc_s:.1f}x CPU, {full_b / inc_b:.1f}x fewer bytes; same client text: {full_text == inc_text}")
+
+
+if __name__ == "__main__":
+    main()
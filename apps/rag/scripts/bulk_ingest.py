@@ -6,6 +6,7 @@ Usage:
     python -m scripts.bulk_ingest /pad/naar/documenten
     python -m scripts.bulk_ingest /pad/naar/documenten --collection mijn-project
     python -m scripts.bulk_ingest /pad/naar/documenten --collection mijn-project --extensions .pdf .docx .md
+    python -m scripts.bulk_ingest /pad/naar/documenten --embed-concurrency 8
 """
 import argparse
 import sys
@@ -14,6 +15,7 @@ from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+from app.config import settings
 from app.ingestion.pipeline import ingest_file
 from app.ingestion.processors.registry import registry
 
@@ -24,8 +26,15 @@ def main():
     parser.add_argument("--collection", "-c", default="default", help="Collectienaam (default: 'default')")
     parser.add_argument("--extensions", "-e", nargs="*", help="Alleen deze extensies verwerken (bijv. .pdf .md)")
     parser.add_argument("--dry-run", action="store_true", help="Toon wat er verwerkt zou worden zonder het uit te voeren")
+    parser.add_argument(
+        "--embed-concurrency", type=int,
+        help=f"Aantal embedding-batches tegelijk naar Ollama (default: {settings.embedding_max_concurrency})",
+    )
     args = parser.parse_args()
 
+    if args.embed_concurrency:
+        settings.embedding_max_concurrency = args.embed_concurrency
+
     source_dir = Path(args.path)
     if not source_dir.exists():
         print(f"Map niet gevonden: {source_dir}")
@@ -0,0 +1,54 @@
+"""
+Compact the LLM usage log: delete raw groq_usage rows older than N days.
+
+The totals of deleted rows stay in the usage_daily rollups, so the usage
+dashboard is unchanged. The app also does this once a day on its usage writer
+thread (USAGE_RAW_RETENTION_DAYS); this script is for one-off runs, optionally
+followed by VACUUM to give the space back to the filesystem (which also
+re-indexes the chat search, as VACUUM can renumber message rowids).
+
+Usage:
+    cd apps/rag
+    python -m scripts.compact_usage
+    python -m scripts.compact_usage --days 30 --vacuum
+"""
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.config import settings
+from app.core import database, usage_tracker
+
+
+def _counts() -> tuple[int, int]:
+    with usage_tracker._conn() as conn:
+        raw = conn.execute("SELECT COUNT(*) FROM groq_usage").fetchone()[0]
+        rollups = conn.execute("SELECT COUNT(*) FROM usage_daily").fetchone()[0]
+    return raw, rollups
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Delete old raw usage rows (daily rollups are kept)")
+    parser.add_argument("--days", type=int, default=settings.usage_raw_retention_days,
+                        help="Keep raw rows of the last N days")
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM chat.db afterwards")
+    args = parser.parse_args()
+
+    usage_tracker.init_usage_table()  # Creates and backfills usage_daily on first run
+    raw, rollups = _counts()
+    print(f"{usage_tracker.DB_PATH}: {raw} raw usage rows, {rollups} daily rollup rows")
+
+    deleted = usage_tracker.compact_usage(args.days)
+    print(f"  deleted {deleted} raw rows older than {args.days} days")
+
+    if args.vacuum:
+        with usage_tracker._conn() as conn:
+            conn.execute("VACUUM")
+        database.rebuild_search_index()
+        print("  vacuumed, search index rebuilt")
+
+
+if __name__ == "__main__":
+    main()
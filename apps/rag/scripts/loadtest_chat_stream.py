@@ -0,0 +1,219 @@
+"""
+Load test: many concurrent SSE chat streams against the async chat pipeline.
+
+By default everything runs in-process. The script starts a fake
+OpenAI-compatible LLM that streams tokens with a fixed delay (configured as
+the Cerebras provider) and swaps retrieval for a stub that blocks for
+--retrieval-ms on the pipeline pool. It then serves the real chat router with
+uvicorn, using a deliberately small Starlette threadpool, and opens
+--streams concurrent streams. If every stream stays open at the same time,
+the peak is far above the threadpool size, which means no stream pins a
+worker for its lifetime.
+
+With --base-url it only runs the client side, against a real deployment
+(which needs documents and LLM keys of its own).
+
+Usage:
+    cd apps/rag
+    python -m scripts.loadtest_chat_stream
+    python -m scripts.loadtest_chat_stream --streams 300 --threadpool 8 --tokens 40 --token-ms 50
+    python -m scripts.loadtest_chat_stream --base-url http://localhost:8000 --token $AUTH_TOKEN --streams 20
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.config import settings
+
+
+def start_fake_llm(args) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            if not body.get("stream"):  # Title generation etc.
+                payload = json.dumps({"choices": [{"message": {"content": "Titel"}}]}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for i in range(args.tokens):
+                time.sleep(args.token_ms / 1000)
+                self._chunk(f"data: {json.dumps({'choices': [{'delta': {'content': f'woord{i} '}}]})}\n\n")
+            self._chunk("data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+
+        def _chunk(self, text: str):
+            data = text.encode()
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        def log_message(self, *a):
+            pass
+
+    ThreadingHTTPServer.daemon_threads = True
+    ThreadingHTTPServer.request_queue_size = 1024
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def start_app(args, data_dir: Path) -> str:
+    """Serve the chat router in-process with stubbed retrieval and a fake LLM."""
+    import uvicorn
+    from anyio import to_thread
+    from fastapi import FastAPI
+
+    from app.api.router import api_router
+    from app.core import database, usage_tracker
+    from app.retrieval.retriever import RetrievedChunk
+    from app.services import chat_service
+
+    database.DB_PATH = usage_tracker.DB_PATH = data_dir / "chat.db"
+    database.init_db()
+    usage_tracker.init_usage_table()
+
+    llm = start_fake_llm(args)
+    settings.groq_api_key = ""
+    settings.openrouter_api_key = ""
+    settings.cerebras_api_key = "loadtest"
+    settings.cerebras_base_url = f"http://127.0.0.1:{llm.server_address[1]}/v1"
+    settings.chat_pipeline_max_workers = args.pipeline_workers
+
+    def fake_retrieval(search_query, collection, agent, session_id, top_k):
+        chunks = [
+            RetrievedChunk(content=f"Passage {i} over {search_query}", metadata={}, relevance_score=0.2,
+                           source_file="kennisbank.pdf", chunk_id=f"c{i}")
+            for i in range(5)
+        ]
+        time.sleep(args.retrieval_ms / 2000)  # Semantic search
+        yield "provisional", [], chunks
+        time.sleep(args.retrieval_ms / 2000)  # BM25 + rerank
+        yield "final", [], chunks
+
+    chat_service._retrieve_chunks_staged = fake_retrieval
+
+    async def limit_threadpool(app):
+        to_thread.current_default_thread_limiter().total_tokens = args.threadpool
+        yield
+
+    app = FastAPI(lifespan=limit_threadpool)
+    app.include_router(api_router, prefix="/api/v1")
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning", backlog=4096))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    return f"http://127.0.0.1:{port}"
+
+
+def _pct(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+async def run_load(base_url: str, args) -> None:
+    headers = {"Authorization": f"Bearer {args.token}"} if args.token else {}
+    limits = httpx.Limits(max_connections=args.streams + 10)
+    open_streams = 0
+    peak = 0
+    ttfts, totals, errors = [], [], []
+
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, limits=limits, timeout=120.0) as client:
+        sessions = []
+        for _ in range(args.streams):
+            r = await client.post("/api/v1/chat/sessions", json={})
+            r.raise_for_status()
+            sessions.append(r.json()["id"])
+
+        async def one(session_id: str):
+            nonlocal open_streams, peak
+            t0 = time.perf_counter()
+            first = None
+            opened = False
+            try:
+                async with client.stream(
+                    "POST", f"/api/v1/chat/sessions/{session_id}/messages/stream",
+                    json={"message": "Hoeveel eiwit heb ik nodig?"},
+                ) as response:
+                    response.raise_for_status()
+                    open_streams += 1
+                    opened = True
+                    peak = max(peak, open_streams)
+                    event = None
+                    async for line in response.aiter_lines():
+                        if line.startswith("event: "):
+                            event = line[7:]
+                            if event == "error":
+                                errors.append("error event")
+                            elif event == "content" and first is None:
+                                first = time.perf_counter() - t0
+            except Exception as e:
+                errors.append(str(e))
+            finally:
+                if opened:
+                    open_streams -= 1
+            if first is not None:
+                ttfts.append(first)
+                totals.append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one(s) for s in sessions))
+        elapsed = time.perf_counter() - t0
+
+    ok = len(totals)
+    print(f"  streams completed: {ok}/{args.streams} in {elapsed:.1f}s   errors: {len(errors)}")
+    print(f"  peak concurrent open streams: {peak}")
+    if ok:
+        print(f"  time to first content: p50 {statistics.median(ttfts):.2f}s   p95 {_pct(ttfts, 95):.2f}s")
+        print(f"  stream duration:       p50 {statistics.median(totals):.2f}s   p95 {_pct(totals, 95):.2f}s")
+    if errors:
+        print(f"  first error: {errors[0]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test concurrent SSE chat streams")
+    parser.add_argument("--streams", type=int, default=200, help="Concurrent chat streams")
+    parser.add_argument("--base-url", help="Test a running server instead of the in-process stub setup")
+    parser.add_argument("--token", default="", help="Bearer token for --base-url")
+    parser.add_argument("--threadpool", type=int, default=16, help="Starlette threadpool size (in-process only)")
+    parser.add_argument("--pipeline-workers", type=int, default=settings.chat_pipeline_max_workers)
+    parser.add_argument("--tokens", type=int, default=30, help="Tokens streamed by the fake LLM")
+    parser.add_argument("--token-ms", type=float, default=50.0, help="Delay per fake LLM token")
+    parser.add_argument("--retrieval-ms", type=float, default=40.0, help="Blocking time of the retrieval stub")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.base_url:
+            base_url = args.base_url
+            print(f"{args.streams} concurrent streams against {base_url}")
+        else:
+            base_url = start_app(args, Path(tmp))
+            print(
+                f"{args.streams} concurrent streams; Starlette threadpool {args.threadpool}, "
+                f"pipeline pool {args.pipeline_workers}; fake LLM {args.tokens} tokens x {args.token_ms:.0f} ms, "
+                f"retrieval {args.retrieval_ms:.0f} ms"
+            )
+        asyncio.run(run_load(base_url, args))
+
+
+if __name__ == "__main__":
+    main()
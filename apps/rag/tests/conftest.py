@@ -11,6 +11,22 @@ def tmp_dir():
         yield Path(d)
 
 
+@pytest.fixture
+def chat_db(tmp_dir, monkeypatch):
+    """A fresh chat.db (chat tables + usage table) in a temp dir."""
+    from app.core import database, sqlite_pool, usage_tracker
+
+    path = tmp_dir / "chat.db"
+    monkeypatch.setattr(database, "DB_PATH", path)
+    monkeypatch.setattr(usage_tracker, "DB_PATH", path)
+    database.init_db()
+    usage_tracker.init_usage_table()
+    yield path
+    usage_tracker.flush_usage()
+    database.flush_deferred_writes()
+    sqlite_pool.close_all()
+
+
 @pytest.fixture
 def sample_txt_file(tmp_dir):
     f = tmp_dir / "sample.txt"
@@ -38,3 +38,14 @@ class TestCollectionEndpoints:
         assert response.status_code == 200
         data = response.json()
         assert "collections" in data
+
+
+class TestChatSessionEndpoints:
+    def test_invalid_cursor_is_400(self, chat_db):
+        from app.core.database import page_cursor
+
+        bad = page_cursor({"updated_at": {"a": 1}, "id": "x"})
+        for path in ("/api/v1/chat/sessions", "/api/v1/chat/sessions/search?q=eiwit"):
+            response = client.get(path, params={"cursor": bad})
+            assert response.status_code == 400
+            assert response.json()["detail"] == "Invalid cursor"
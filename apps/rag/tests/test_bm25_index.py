@@ -0,0 +1,146 @@
+import pytest
+
+from app.retrieval import bm25_index
+from app.retrieval.bm25_scorer import SparseBM25, bm25_idf
+
+
+@pytest.fixture(autouse=True)
+def index_db(tmp_dir, monkeypatch):
+    monkeypatch.setattr(bm25_index, "DB_PATH", tmp_dir / "bm25.db")
+
+
+DOCS = {
+    "a_chunk_0": "Squats en deadlifts bouwen kracht in de benen.",
+    "a_chunk_1": "Eiwitinname van 1,6 gram per kilo lichaamsgewicht ondersteunt spiergroei.",
+    "a_chunk_2": "Slaap en herstel zijn net zo belangrijk als training.",
+}
+
+
+class TestTokenize:
+    def test_lowercases_and_keeps_diacritics(self):
+        assert bm25_index.tokenize("Één Café, twee!") == ["één", "café", "twee"]
+
+
+class TestIndexMaintenance:
+    def test_add_documents_updates_stats(self):
+        bm25_index.add_documents("kb", list(DOCS), list(DOCS.values()))
+        assert bm25_index.indexed_count("kb") == 3
+
+    def test_readding_same_id_replaces(self):
+        bm25_index.add_documents("kb", list(DOCS), list(DOCS.values()))
+        bm25_index.add_documents("kb", ["a_chunk_0"], ["Alleen nog over bankdrukken."])
+        assert bm25_index.indexed_count("kb") == 3
+        assert bm25_index.search(["kb"], "squats", 5) == []
+        assert bm25_index.search(["kb"], "bankdrukken", 5)[0][1] == "a_chunk_0"
+
+    def test_remove_documents(self):
+        bm25_index.add_documents("kb", list(DOCS), list(DOCS.values()))
+        assert bm25_index.remove_documents("kb", ["a_chunk_1", "missing"]) == 1
+        assert bm25_index.indexed_count("kb") == 2
+        assert bm25_index.search(["kb"], "eiwitinname", 5) == []
+
+    def test_drop_collection(self):
+        bm25_index.add_documents("kb", list(DOCS), list(DOCS.values()))
+        bm25_index.drop_collection("kb")
+        assert bm25_index.indexed_count("kb") is None
+
+    def test_unknown_collection_is_not_indexed(self):
+        assert bm25_index.indexed_count("nope") is None
+
+    def test_rebuild_is_invisible_to_readers_until_complete(self, monkeypatch):
+        bm25_index.add_documents("kb", ["old_chunk"], ["Oude tekst over zwemmen."])
+        seen_during_rebuild = []
+
+        class FakeChroma:
+            def count(self):
+                return len(DOCS)
+
+            def get(self, include, limit, offset):
+                # Another reader mid-rebuild still sees the complete old index
+                seen_during_rebuild.append([cid for _, cid, _ in bm25_index.search(["kb"], "zwemmen squats", 5)])
+                ids = list(DOCS)[offset:offset + limit]
+                return {"ids": ids, "documents": [DOCS[i] for i in ids]}
+
+        monkeypatch.setattr("app.core.vectorstore.get_or_create_collection", lambda name: FakeChroma())
+        monkeypatch.setattr(bm25_index, "REBUILD_PAGE_SIZE", 1)
+        assert bm25_index.rebuild_collection("kb") == 3
+        assert seen_during_rebuild == [["old_chunk"]] * 3
+        assert bm25_index.indexed_count("kb") == 3
+        assert [cid for _, cid, _ in bm25_index.search(["kb"], "zwemmen squats", 5)] == ["a_chunk_0"]
+
+    def test_rebuild_empty_collection_counts_as_indexed(self, monkeypatch):
+        class EmptyChroma:
+            def count(self):
+                return 0
+
+        monkeypatch.setattr("app.core.vectorstore.get_or_create_collection", lambda name: EmptyChroma())
+        assert bm25_index.rebuild_collection("kb") == 0
+        assert bm25_index.indexed_count("kb") == 0
+
+
+class TestSearch:
+    def test_best_match_first(self):
+        bm25_index.add_documents("kb", list(DOCS), list(DOCS.values()))
+        hits = bm25_index.search(["kb"], "hoeveel eiwitinname voor spiergroei", 2)
+        assert hits[0][:2] == ("kb", "a_chunk_1")
+        assert hits[0][2] > 0
+
+    def test_no_matching_terms(self):
+        bm25_index.add_documents("kb", list(DOCS), list(DOCS.values()))
+        assert bm25_index.search(["kb"], "zwemmen", 5) == []
+
+    def test_searches_across_collections(self):
+        bm25_index.add_documents("kb", list(DOCS), list(DOCS.values()))
+        bm25_index.add_documents("other", ["b_chunk_0"], ["Herstel na training met slaap."])
+        hits = bm25_index.search(["kb", "other"], "slaap herstel", 5)
+        assert {(col, cid) for col, cid, _ in hits} == {("kb", "a_chunk_2"), ("other", "b_chunk_0")}
+        assert [cid for _, cid, _ in bm25_index.search(["kb"], "slaap", 5)] == ["a_chunk_2"]
+
+    def test_respects_top_k(self):
+        bm25_index.add_documents("kb", list(DOCS), list(DOCS.values()))
+        assert len(bm25_index.search(["kb"], "en", 1)) == 1
+
+    def test_scorer_reloaded_after_update(self):
+        bm25_index.add_documents("kb", list(DOCS), list(DOCS.values()))
+        assert bm25_index.search(["kb"], "zwemmen", 5) == []
+        bm25_index.add_documents("kb", ["a_chunk_3"], ["Zwemmen is goede cardio."])
+        assert bm25_index.search(["kb"], "zwemmen", 5)[0][1] == "a_chunk_3"
+
+
+class TestSparseBM25:
+    def _naive_scores(self, texts, query):
+        docs = [bm25_index.tokenize(t) for t in texts]
+        avgdl = sum(len(d) for d in docs) / len(docs)
+        scores = []
+        for doc in docs:
+            score = 0.0
+            for term in bm25_index.tokenize(query):
+                df = sum(1 for d in docs if term in d)
+                if not df:
+                    continue
+                tf = doc.count(term)
+                norm = tf + bm25_index.BM25_K1 * (1 - bm25_index.BM25_B + bm25_index.BM25_B * len(doc) / avgdl)
+                score += bm25_idf(len(docs), df) * tf * (bm25_index.BM25_K1 + 1) / norm
+            scores.append(score)
+        return scores
+
+    def test_matches_reference_formula(self):
+        texts = list(DOCS.values()) + ["Kracht en herstel: squats, slaap en eiwit."]
+        ids = [f"c{i}" for i in range(len(texts))]
+        scorer = SparseBM25.from_texts(ids, texts)
+        query = "kracht slaap eiwit squats"
+        expected = self._naive_scores(texts, query)
+        got = dict(scorer.search(query, len(texts)))
+        for doc_id, score in zip(ids, expected):
+            assert got.get(doc_id, 0.0) == pytest.approx(score, rel=1e-5)
+
+    def test_top_k_is_sorted_and_bounded(self):
+        texts = [f"herstel {'slaap ' * i}" for i in range(1, 30)]
+        scorer = SparseBM25.from_texts([str(i) for i in range(len(texts))], texts)
+        hits = scorer.search("slaap", 5)
+        assert len(hits) == 5
+        assert [s for _, s in hits] == sorted((s for _, s in hits), reverse=True)
+
+    def test_unknown_terms_score_nothing(self):
+        scorer = SparseBM25.from_texts(["a"], ["squats en deadlifts"])
+        assert scorer.search("zwemmen", 5) == []
@@ -0,0 +1,92 @@
+import pytest
+
+from app.config import settings
+from app.core import database
+from app.services import chat_service
+
+
+@pytest.fixture
+def summarizer(chat_db, monkeypatch):
+    """Rolling summaries with the LLM replaced by a recorder."""
+    prompts = []
+
+    def fake_generate(prompt, temperature=0.3, **kwargs):
+        prompts.append(prompt)
+        return f"samenvatting {len(prompts)}"
+
+    monkeypatch.setattr(chat_service, "generate", fake_generate)
+    monkeypatch.setattr(settings, "summarize_after_messages", 20)
+    return prompts
+
+
+def _session_with_turns(n: int) -> str:
+    session_id = database.create_session()["id"]
+    for i in range(n):
+        database.record_turn(session_id, f"vraag {i}", f"antwoord {i}")
+    return session_id
+
+
+def _history(session_id: str) -> str:
+    context = database.get_turn_context(session_id, chat_service._history_tail())
+    return chat_service._build_history_section(context)
+
+
+class TestRollingSummary:
+    def test_turn_uses_extractive_summary_until_refreshed(self, summarizer):
+        session_id = _session_with_turns(15)
+        history = _history(session_id)
+        assert "Topics discussed: vraag 5; vraag 6" in history
+        assert "User: vraag 12" in history and "User: vraag 11" not in history
+        assert summarizer == []  # No LLM call on the request path
+
+    def test_refresh_folds_only_new_messages(self, summarizer):
+        session_id = _session_with_turns(15)
+        chat_service._refresh_summary(session_id)
+        meta = database.get_session_metadata(session_id)
+        assert (meta["summary"], meta["summary_covers"]) == ("samenvatting 1", 24)
+        assert "vraag 0" in summarizer[0] and "vraag 12" not in summarizer[0]
+
+        for i in range(15, 20):
+            database.record_turn(session_id, f"vraag {i}", f"antwoord {i}")
+        chat_service._refresh_summary(session_id)
+        assert "Summary so far:\nsamenvatting 1" in summarizer[1]
+        assert "vraag 11" not in summarizer[1] and "vraag 12" in summarizer[1]
+        assert database.get_session_metadata(session_id)["summary_covers"] == 34
+
+        history = _history(session_id)
+        assert "samenvatting 2" in history and "Topics discussed" not in history
+
+    def test_unsummarized_gap_is_added_to_cached_summary(self, summarizer):
+        session_id = _session_with_turns(15)
+        chat_service._refresh_summary(session_id)
+        database.record_turn(session_id, "nieuwe vraag", "nieuw antwoord")
+        history = _history(session_id)
+        assert "samenvatting 1\n\nTopics discussed since: vraag 12" in history
+
+    def test_old_cache_format_is_rebuilt(self, summarizer):
+        session_id = _session_with_turns(15)
+        database.update_session_metadata(session_id, {"summary": "oud", "summary_at_count": 30})
+        assert "oud" in _history(session_id)
+        chat_service._refresh_summary(session_id)
+        assert "Summary so far" not in summarizer[0]
+        assert database.get_session_metadata(session_id)["summary_covers"] == 24
+
+    def test_schedule_only_when_enough_aged_out_and_once_per_session(self, summarizer, monkeypatch):
+        submitted = []
+
+        class FakePool:
+            def submit(self, fn, *args):
+                submitted.append(args)
+
+        monkeypatch.setattr(chat_service, "_get_summary_pool", lambda: FakePool())
+        monkeypatch.setattr(chat_service, "_summaries_pending", set())
+        context = {"message_count": 18, "metadata": {}}
+        chat_service._schedule_summary(context, "s1")
+        assert submitted == []  # 20 messages: still sent whole
+        context = {"message_count": 24, "metadata": {"summary": "x", "summary_covers": 12, "summary_until": "t"}}
+        chat_service._schedule_summary(context, "s1")
+        assert submitted == []  # Only 8 aged out since the summary
+        context["message_count"] = 26
+        chat_service._schedule_summary(context, "s1")
+        chat_service._schedule_summary(context, "s1")
+        assert submitted == [("s1",)]
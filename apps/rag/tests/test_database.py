@@ -0,0 +1,238 @@
+import pytest
+
+from app.core import database
+
+
+class TestRecordTurn:
+    def test_writes_turn_title_and_metadata(self, chat_db):
+        session = database.create_session()
+        user, answer = database.record_turn(
+            session["id"], "Hoeveel eiwit?", "1,6 g/kg [1].",
+            sources=[{"filename": "voeding.pdf"}], title="Eiwitbehoefte", metadata={"k": 1},
+        )
+        messages = database.get_messages(session["id"])
+        assert [m["id"] for m in messages] == [user["id"], answer["id"]]
+        assert [m["role"] for m in messages] == ["user", "assistant"]
+        assert messages[1]["sources"] == [{"filename": "voeding.pdf"}]
+        stored = database.get_session(session["id"])
+        assert stored["title"] == "Eiwitbehoefte"
+        assert stored["updated_at"] == answer["created_at"]
+        assert database.get_session_metadata(session["id"]) == {"k": 1}
+
+    def test_keeps_title_when_none_given(self, chat_db):
+        session = database.create_session(title="Bestaand")
+        database.record_turn(session["id"], "vraag", "antwoord")
+        assert database.get_session(session["id"])["title"] == "Bestaand"
+
+    def test_answer_sorts_after_question(self, chat_db):
+        session = database.create_session()
+        for i in range(20):
+            database.record_turn(session["id"], f"v{i}", f"a{i}")
+        roles = [m["role"] for m in database.get_messages(session["id"])]
+        assert roles == ["user", "assistant"] * 20
+
+
+class TestDeferredWrites:
+    def test_runs_in_order_and_flushes(self, chat_db):
+        session = database.create_session()
+        database.defer_write(database.update_session_metadata, session["id"], {"summary": "a"})
+        database.defer_write(database.update_session_metadata, session["id"], {"summary": "b", "n": 2})
+        database.defer_write(database.update_session_title, session["id"], "Later")
+        assert database.flush_deferred_writes(timeout=5)
+        assert database.get_session_metadata(session["id"]) == {"summary": "b", "n": 2}
+        assert database.get_session(session["id"])["title"] == "Later"
+
+    def test_failed_write_does_not_stop_writer(self, chat_db):
+        session = database.create_session()
+
+        def boom():
+            raise RuntimeError("kapot")
+
+        database.defer_write(boom)
+        database.defer_write(database.update_session_title, session["id"], "Na fout")
+        assert database.flush_deferred_writes(timeout=5)
+        assert database.get_session(session["id"])["title"] == "Na fout"
+
+
+class TestAnalyticsCounters:
+    def _activity(self):
+        agent = database.create_agent("Coach", "prompt")
+        s1 = database.create_session(agent_id=agent["id"])
+        s2 = database.create_session()
+        s3 = database.create_session(agent_id=agent["id"])
+        _, a1 = database.record_turn(s1["id"], "Hoeveel eiwit?", "1,6 g/kg")
+        database.record_turn(s2["id"], "hoeveel  EIWIT?", "Veel")
+        database.record_turn(s3["id"], "Wat is RPE?", "Inspanning")
+        database.add_message(s2["id"], "user", "Wat is RPE?")
+        _, a3 = database.record_turn(s3["id"], "Deload?", "Ja")
+        database.add_feedback(a1["id"], "positive")
+        database.add_feedback(a1["id"], "negative")  # Replaces the positive one
+        database.add_feedback(a3["id"], "positive")
+        return agent, s1, s2, s3
+
+    def test_counts_turns_sessions_and_feedback(self, chat_db):
+        self._activity()
+        analytics = database.get_analytics()
+        assert analytics["totals"] == {"sessions": 3, "messages": 9, "questions": 5, "agents": 1}
+        assert analytics["feedback"]["positive"] == 1 and analytics["feedback"]["negative"] == 1
+        assert sorted(analytics["top_questions"][:2], key=lambda q: q["question"]) == [
+            {"question": "Hoeveel eiwit?", "count": 2},
+            {"question": "Wat is RPE?", "count": 2},
+        ]
+        assert sum(d["count"] for d in analytics["messages_per_day"]) == 9
+        assert analytics["agent_usage"] == [{"name": "Coach", "icon": "E", "sessions": 2}]
+
+    def test_delete_session_matches_rebuild(self, chat_db):
+        _, _, _, s3 = self._activity()
+        database.delete_session(s3["id"])
+        incremental = database.get_analytics()
+        assert incremental["totals"]["messages"] == 5
+        assert incremental["feedback"]["positive"] == 0
+        database.rebuild_analytics()
+        rebuilt = database.get_analytics()
+        assert incremental == rebuilt
+
+    def test_backfill_on_existing_database(self, chat_db):
+        self._activity()
+        expected = database.get_analytics()
+        with database._conn() as conn:
+            for table in ("analytics_counters", "analytics_daily_messages",
+                          "analytics_questions", "analytics_agent_sessions"):
+                conn.execute(f"DROP TABLE {table}")
+            conn.commit()
+        database.init_db()
+        assert database.get_analytics() == expected
+
+
+class TestSessionSearch:
+    def _session(self, title, *turns):
+        session = database.create_session(title=title)
+        for question, answer in turns:
+            database.record_turn(session["id"], question, answer)
+        return session
+
+    def test_ranks_and_snippets(self, chat_db):
+        eiwit = self._session("Voeding", ("Hoeveel eiwit per dag?", "Eiwit: 1,6 g/kg, verdeel eiwit over maaltijden."))
+        squat = self._session("Squat techniek", ("Hoe diep squatten?", "Tot onder parallel."))
+        database.record_turn(squat["id"], "En eiwit na training?", "Maakt weinig uit.")
+
+        results = database.search_sessions("eiwit")
+        assert [r["id"] for r in results] == [eiwit["id"], squat["id"]]
+        assert results[0]["message_count"] == 2
+        assert f"{database.SNIPPET_START}Eiwit{database.SNIPPET_END}" in results[0]["snippet"]
+
+    def test_prefix_and_diacritics(self, chat_db):
+        session = self._session("Nieuwe chat", ("Is crème fraîche oké bij cutten?", "Met mate."))
+        assert [r["id"] for r in database.search_sessions("creme fra")] == [session["id"]]
+        assert database.search_sessions("creme xyz") == []
+
+    def test_title_match_and_sync_on_rename_and_delete(self, chat_db):
+        session = self._session("Nieuwe chat", ("vraag", "antwoord"))
+        assert database.search_sessions("deload") == []
+        database.update_session_title(session["id"], "Deload week")
+        assert [r["id"] for r in database.search_sessions("deload")] == [session["id"]]
+        database.delete_session(session["id"])
+        assert database.search_sessions("deload") == []
+        assert database.search_sessions("antwoord") == []
+
+    def test_backfill_and_odd_input(self, chat_db):
+        session = self._session("Kracht", ("Wat is 1RM?", "Je maximale herhaling."))
+        with database._conn() as conn:
+            conn.executescript("DROP TABLE messages_fts; DROP TABLE sessions_fts;")
+        database.init_db()
+        assert [r["id"] for r in database.search_sessions("maximale")] == [session["id"]]
+        assert database.search_sessions('"NEAR(') == []  # FTS syntax is not passed through
+        assert [r["id"] for r in database.search_sessions("?!")] == []
+
+    def test_cursor_pages_through_ranked_results(self, chat_db):
+        for i in range(5):
+            self._session(f"Sessie {i}", ("eiwit " * (i + 1), "ok"))
+        expected = [r["id"] for r in database.search_sessions("eiwit")]
+        page = database.search_sessions("eiwit", limit=2)
+        seen = [r["id"] for r in page]
+        while len(page) == 2:
+            page = database.search_sessions("eiwit", limit=2, cursor=database.page_cursor(page[-1]))
+            seen += [r["id"] for r in page]
+        assert seen == expected
+
+
+class TestSessionList:
+    def test_message_count_and_preview_follow_messages(self, chat_db):
+        session = database.create_session()
+        assert database.get_session(session["id"])["message_count"] == 0
+        database.record_turn(session["id"], "Hoeveel sets?", "Tien tot twintig\nper week.")
+        database.add_message(session["id"], "user", "En voor beginners?")
+        stored = database.list_sessions()[0]
+        assert stored["message_count"] == 3
+        assert stored["last_message_preview"] == "En voor beginners?"
+        with database._conn() as conn:
+            conn.execute("DELETE FROM messages WHERE content = 'En voor beginners?'")
+            conn.commit()
+        stored = database.get_session(session["id"])
+        assert stored["message_count"] == 2
+        assert stored["last_message_preview"] == "Tien tot twintig per week."
+
+    def test_backfill_for_existing_database(self, chat_db):
+        session = database.create_session()
+        database.record_turn(session["id"], "vraag", "antwoord")
+        with database._conn() as conn:
+            conn.executescript("""
+                DROP TRIGGER sessions_stats_insert;
+                DROP TRIGGER sessions_stats_delete;
+                ALTER TABLE sessions DROP COLUMN message_count;
+                ALTER TABLE sessions DROP COLUMN last_message_preview;
+            """)
+        database.init_db()
+        stored = database.get_session(session["id"])
+        assert (stored["message_count"], stored["last_message_preview"]) == (2, "antwoord")
+
+    def test_keyset_pages_cover_all_sessions_once(self, chat_db):
+        ids = [database.create_session()["id"] for _ in range(7)]
+        with database._conn() as conn:  # Several sessions share an updated_at: id breaks the tie
+            conn.execute("UPDATE sessions SET updated_at = '2026-01-01T00:00:00+00:00' WHERE id IN (?, ?, ?)", ids[:3])
+            conn.commit()
+        seen, cursor = [], None
+        while True:
+            page = database.list_sessions(limit=3, cursor=cursor)
+            seen += [s["id"] for s in page]
+            if len(page) < 3:
+                break
+            cursor = database.page_cursor(page[-1])
+        assert seen == [s["id"] for s in database.list_sessions(limit=100)]
+        assert sorted(seen) == sorted(ids)
+
+    def test_invalid_cursor(self, chat_db):
+        bad_keys = ({"updated_at": "x", "id": 3}, {"updated_at": {"a": 1}, "id": "x"},
+                    {"updated_at": None, "id": "x"}, {"rank": True, "id": "x"})
+        for bad in ("nonsense", *(database.page_cursor(key) for key in bad_keys)):
+            with pytest.raises(ValueError):
+                database.list_sessions(cursor=bad)
+            with pytest.raises(ValueError):
+                database.search_sessions("eiwit", cursor=bad)
+
+
+class TestTurnContext:
+    def test_tail_count_and_metadata_in_one_read(self, chat_db):
+        session = database.create_session(title="Schema")
+        for i in range(5):
+            database.record_turn(session["id"], f"v{i}", f"a{i}", sources=[{"filename": "groot.pdf"}])
+        database.update_session_metadata(session["id"], {"summary": "eerder", "summary_at_count": 4})
+
+        context = database.get_turn_context(session["id"], tail=3)
+        assert context["title"] == "Schema"
+        assert context["message_count"] == 10
+        assert context["metadata"] == {"summary": "eerder", "summary_at_count": 4}
+        assert [m["content"] for m in context["recent"]] == ["a3", "v4", "a4"]
+        assert all("sources" not in m for m in context["recent"])
+
+    def test_empty_and_missing_session(self, chat_db):
+        session = database.create_session()
+        context = database.get_turn_context(session["id"], tail=6)
+        assert (context["message_count"], context["recent"]) == (0, [])
+        assert database.get_turn_context("bestaat-niet", tail=6) is None
+
+    def test_messages_without_sources(self, chat_db):
+        session = database.create_session()
+        database.record_turn(session["id"], "vraag", "antwoord", sources=[{"filename": "a.pdf"}])
+        assert database.get_messages(session["id"])[1]["sources"] == [{"filename": "a.pdf"}]
+        assert "sources" not in database.get_messages(session["id"], include_sources=False)[1]
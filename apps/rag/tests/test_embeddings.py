@@ -0,0 +1,146 @@
+import asyncio
+
+import pytest
+
+from app.config import settings
+from app.core import embeddings
+from app.core.embeddings import EmbeddingCache
+
+
+class FakeOllama:
+    def __init__(self):
+        self.calls = []
+
+    def embed(self, model, input):
+        texts = [input] if isinstance(input, str) else list(input)
+        self.calls.append(texts)
+        return {"embeddings": [[float(len(t)), 0.5, -1.0] for t in texts]}
+
+
+@pytest.fixture
+def cache(tmp_dir, monkeypatch):
+    cache = EmbeddingCache(tmp_dir / "embedding_cache.db", memory_items=100, max_bytes=1024 * 1024)
+    monkeypatch.setattr(embeddings, "_embedding_cache", cache)
+    monkeypatch.setattr(settings, "embedding_cache_enabled", True)
+    return cache
+
+
+@pytest.fixture
+def ollama(monkeypatch):
+    fake = FakeOllama()
+    monkeypatch.setattr(embeddings, "_get_ollama_client", lambda: fake)
+    return fake
+
+
+class TestEmbeddingCache:
+    def test_roundtrip_and_counters(self, cache):
+        assert cache.get_many("m", ["a", "b"]) == [None, None]
+        cache.put_many("m", ["a"], [[1.0, 2.0]])
+        assert cache.get_many("m", ["a", "b"]) == [[1.0, 2.0], None]
+        stats = cache.stats()
+        assert (stats["memory_hits"], stats["misses"]) == (1, 3)
+
+    def test_keyed_by_model(self, cache):
+        cache.put_many("m1", ["a"], [[1.0]])
+        assert cache.get_many("m2", ["a"]) == [None]
+
+    def test_persists_across_instances(self, cache, tmp_dir):
+        cache.put_many("m", ["a"], [[0.25, -0.5]])
+        fresh = EmbeddingCache(cache.path, memory_items=100, max_bytes=cache.max_bytes)
+        assert fresh.get_many("m", ["a"]) == [[0.25, -0.5]]
+        assert fresh.stats()["disk_hits"] == 1
+
+    def test_memory_tier_is_bounded(self, cache):
+        cache.memory_items = 2
+        cache.put_many("m", ["a", "b", "c"], [[1.0], [2.0], [3.0]])
+        assert cache.stats()["memory_items"] == 2
+
+    def test_disk_size_bounded(self, tmp_dir):
+        vector = [0.0] * 256  # 1 KB as float32
+        cache = EmbeddingCache(tmp_dir / "small.db", memory_items=0, max_bytes=10 * 1024)
+        for i in range(20):
+            cache.put_many("m", [f"text {i}"], [vector])
+        assert cache.stats()["evictions"] > 0
+        assert cache.get_many("m", ["text 0"]) == [None]
+        assert cache.get_many("m", ["text 19"]) == [vector]
+
+
+class TestEmbedBatch:
+    def test_only_misses_sent_in_order(self, cache, ollama):
+        embeddings.embed_batch(["aa", "b"])
+        result = embeddings.embed_batch(["ccc", "aa", "ccc", "b"])
+        assert ollama.calls == [["aa", "b"], ["ccc"]]
+        assert [v[0] for v in result] == [3.0, 2.0, 3.0, 1.0]
+
+    def test_embed_text_uses_cache(self, cache, ollama):
+        first = embeddings.embed_text("query")
+        assert embeddings.embed_text("query") == first
+        assert embeddings.embed_batch(["query"]) == [first]
+        assert len(ollama.calls) == 1
+
+
+class FakeHttpClient:
+    def __init__(self):
+        self.closed = False
+
+    async def aclose(self):
+        self.closed = True
+
+
+class FakeAsyncOllama:
+    in_flight = 0
+    peak = 0
+    instances = []
+
+    def __init__(self, host=None, timeout=None):
+        self._client = FakeHttpClient()
+        FakeAsyncOllama.instances.append(self)
+
+    async def embed(self, model, input):
+        cls = FakeAsyncOllama
+        cls.in_flight += 1
+        cls.peak = max(cls.peak, cls.in_flight)
+        await asyncio.sleep(0.01)
+        cls.in_flight -= 1
+        return {"embeddings": [[float(t.split()[0])] for t in input]}
+
+
+class TestConcurrentEmbedding:
+    def test_order_preserved_with_batches_in_flight(self, monkeypatch):
+        monkeypatch.setattr(embeddings, "AsyncOllamaClient", FakeAsyncOllama)
+        monkeypatch.setattr(settings, "embedding_cache_enabled", False)
+        monkeypatch.setattr(settings, "embedding_max_concurrency", 4)
+        FakeAsyncOllama.peak = 0
+        texts = [f"{i} tekst" for i in range(500)]
+        result = embeddings.embed_batch(texts)
+        assert [v[0] for v in result] == [float(i) for i in range(500)]
+        assert 1 < FakeAsyncOllama.peak <= 4
+
+    def test_client_closed_after_each_run(self, monkeypatch):
+        monkeypatch.setattr(embeddings, "AsyncOllamaClient", FakeAsyncOllama)
+        monkeypatch.setattr(settings, "embedding_cache_enabled", False)
+        FakeAsyncOllama.instances = []
+        for texts in (["1 a", "2 b"], ["3 c"]):
+            asyncio.run(embeddings.embed_batch_async(texts))
+        assert [c._client.closed for c in FakeAsyncOllama.instances] == [True, True]
+
+
+class TestAdaptiveBatchSizer:
+    def test_grows_for_fast_batches_and_respects_bounds(self):
+        sizer = embeddings.AdaptiveBatchSizer(target_seconds=1.0, max_chars=10**9)
+        sizer.observe(["x" * 100] * 50, 0.01)
+        assert sizer.size == embeddings.MAX_EMBED_BATCH_SIZE
+        sizer.observe(["x" * 100] * 50, 100.0)
+        sizer.observe(["x" * 100] * 50, 100.0)
+        assert sizer.size == embeddings.MIN_EMBED_BATCH_SIZE
+
+    def test_batch_cut_by_payload_and_fair_share(self):
+        sizer = embeddings.AdaptiveBatchSizer(target_seconds=1.0, max_chars=250)
+        assert sizer.next_end(["x" * 100] * 10, 0) == 2
+        sizer.max_chars = 10**9
+        assert sizer.next_end(["x"] * 100, 0, parallelism=4) == 25
+
+    def test_shrink_halves(self):
+        sizer = embeddings.AdaptiveBatchSizer(target_seconds=1.0, max_chars=1000, initial=64)
+        sizer.shrink()
+        assert sizer.size == 32
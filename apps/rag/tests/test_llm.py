@@ -0,0 +1,73 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.config import settings
+from app.core import llm
+
+
+def _sse(*tokens, usage=None):
+    lines = [f"data: {json.dumps({'choices': [{'delta': {'content': t}}]})}" for t in tokens]
+    if usage:
+        lines.append(f"data: {json.dumps({'choices': [{'delta': {}}], 'usage': usage})}")
+    lines.append("data: [DONE]")
+    return "\n\n".join(lines) + "\n\n"
+
+
+@pytest.fixture
+def providers(monkeypatch):
+    """Cerebras + OpenRouter configured against an in-process mock transport."""
+    requests = []
+    responses = {}
+
+    def handler(request: httpx.Request):
+        requests.append(request)
+        status, body = responses[request.url.host]
+        return httpx.Response(status, text=body, headers={"Content-Type": "text/event-stream"})
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(llm, "_get_async_http_client", lambda: client)
+    monkeypatch.setattr(llm, "_log_stream_usage", lambda *a, **kw: None)
+    monkeypatch.setattr(llm, "_circuit_breaker", {})
+    monkeypatch.setattr(settings, "groq_api_key", "")
+    monkeypatch.setattr(settings, "cerebras_api_key", "c-key")
+    monkeypatch.setattr(settings, "cerebras_base_url", "http://cerebras.test/v1")
+    monkeypatch.setattr(settings, "openrouter_api_key", "o-key")
+    monkeypatch.setattr(settings, "openrouter_base_url", "http://openrouter.test/v1")
+    return requests, responses
+
+
+def _stream(**kwargs):
+    async def collect():
+        return [t async for t in llm.generate_stream_async("vraag", system="sys", **kwargs)]
+    return asyncio.run(collect())
+
+
+class TestGenerateStreamAsync:
+    def test_parses_sse_tokens(self, providers):
+        requests, responses = providers
+        responses["cerebras.test"] = (200, _sse("Hallo", " wereld", usage={"total_tokens": 5}))
+        info = {}
+        assert _stream(provider_info=info) == ["Hallo", " wereld"]
+        assert info["name"].startswith("cerebras")
+        body = json.loads(requests[0].content)
+        assert body["stream"] is True
+        assert body["messages"][0] == {"role": "system", "content": "sys"}
+        assert requests[0].headers["Authorization"] == "Bearer c-key"
+
+    def test_falls_back_to_next_provider(self, providers):
+        requests, responses = providers
+        responses["cerebras.test"] = (429, "")
+        responses["openrouter.test"] = (200, _sse("Antwoord"))
+        info = {}
+        assert _stream(provider_info=info) == ["Antwoord"]
+        assert info["name"].startswith("openrouter")
+        assert llm._circuit_breaker["cerebras"]["failures"] == 1
+
+    def test_all_providers_down(self, providers):
+        _, responses = providers
+        responses["cerebras.test"] = responses["openrouter.test"] = (503, "")
+        with pytest.raises(RuntimeError):
+            _stream()
@@ -0,0 +1,97 @@
+import json
+import re
+from pathlib import Path
+
+import pytest
+
+from app.services.output_cleaner import StreamingCleaner, _clean_sequential, clean_llm_output
+
+GOLDEN = json.loads((Path(__file__).parent / "golden" / "clean_llm_output.json").read_text(encoding="utf-8"))
+
+BODY = (
+    "## Trainingsschema\n\nHier is een <strong>schema</strong> voor 3 dagen 💪.\n\n"
+    "<ul><li>Dag 1: squats</li><li>Dag 2: <em>bench press</em></li></ul>\n\n"
+    "<p>Rust minstens 48 uur tussen sessies,\nvooral als RPE > 8 [1].</p>\n\n"
+    "- Eiwit: 1,6 g/kg\n- Slaap: 8 uur\n\n"
+    "<h2>Voeding</h2>\n\nEet voldoende koolhydraten als x < 5 sets per spiergroep.\n\n"
+)
+ANSWER = BODY + "<followup>Hoe bouw ik volume op?</followup>"
+
+
+def _tokens(text: str) -> list[str]:
+    return re.findall(r"\s*\S+|\s+", text)
+
+
+def _apply(client: str, event: dict) -> str:
+    """What app.js does with an event — offsets count UTF-16 units like JS strings."""
+    if event["event"] == "content":
+        return event["data"]
+    kept = client.encode("utf-16-le")[: event["data"]["offset"] * 2].decode("utf-16-le")
+    return kept + event["data"]["text"]
+
+
+def _stream(text: str, cleaner: StreamingCleaner) -> tuple[str, list[dict]]:
+    client, events = "", []
+    for i, token in enumerate(_tokens(text), 1):
+        cleaner.feed(token)
+        if i % 3 == 0 or token.endswith(("\n", ".", "!", "?")):
+            for event in cleaner.flush():
+                client = _apply(client, event)
+                events.append(event)
+            assert client == cleaner._display()
+    for event in cleaner.flush():
+        client = _apply(client, event)
+        events.append(event)
+    return client, events
+
+
+class TestStreamingCleaner:
+    def test_client_text_matches_full_clean(self):
+        cleaner = StreamingCleaner()
+        client, _ = _stream(ANSWER, cleaner)
+        assert cleaner.raw == ANSWER
+        assert client == clean_llm_output(ANSWER)
+
+    def test_sends_deltas_not_full_text(self):
+        cleaner = StreamingCleaner()
+        cleaner.RESYNC_EVERY = 1000
+        client, events = _stream(BODY * 10, cleaner)
+        assert all(e["event"] == "delta" for e in events)
+        sent = sum(len(e["data"]["text"]) for e in events)
+        assert sent < 2 * len(client)
+
+    def test_paragraphs_are_frozen(self):
+        cleaner = StreamingCleaner()
+        _stream(ANSWER, cleaner)
+        assert cleaner._stable.startswith("## Trainingsschema\n\nHier is een **schema**")
+        assert len(cleaner._tail) < 100
+
+    def test_open_tag_spanning_paragraphs_not_frozen(self):
+        cleaner = StreamingCleaner()
+        cleaner.feed("<p>Eerste alinea\n\nnog steeds dezelfde")
+        cleaner.flush()
+        assert cleaner._stable == ""
+        cleaner.feed("</p>\n\nVolgende")
+        cleaner.flush()
+        assert cleaner._stable == clean_llm_output("<p>Eerste alinea\n\nnog steeds dezelfde</p>")
+
+    def test_periodic_resync(self):
+        cleaner = StreamingCleaner()
+        cleaner.RESYNC_EVERY = 4
+        client, events = _stream(ANSWER, cleaner)
+        assert [e["event"] for e in events[:4]] == ["delta", "delta", "delta", "content"]
+        assert client == clean_llm_output(ANSWER)
+
+
+class TestCleanLlmOutput:
+    @pytest.mark.parametrize("case", GOLDEN, ids=range(len(GOLDEN)))
+    def test_golden_corpus(self, case):
+        assert clean_llm_output(case["raw"]) == case["expected"]
+
+    @pytest.mark.parametrize("text", [
+        "<<p>a</p>", "</<strong>x</strong>", "<strong>a<em>b</strong>c</em>",
+        "<li><p>x</li></p>", "<p>open <b>zonder sluiting", "a < b en c > d",
+        "<strong>x</strong><strong>y</strong>", "<h2 class=\"t\">Kop</h2>tekst",
+    ])
+    def test_matches_sequential_on_edge_cases(self, text):
+        assert clean_llm_output(text) == _clean_sequential(text)
@@ -0,0 +1,84 @@
+import pytest
+
+from app.config import settings
+from app.retrieval.retriever import RetrievedChunk
+from app.services import chat_service, prompt_budget
+from app.services.prompt_budget import PromptTokenStats, count_tokens, truncate_tokens
+
+
+@pytest.fixture
+def estimated_tokens(monkeypatch):
+    """Token counts as characters / 4, independent of whether tiktoken's encoding is available."""
+    monkeypatch.setattr(prompt_budget, "_get_encoding", lambda: None)
+
+
+def _chunk(chunk_id, tokens):
+    return RetrievedChunk(
+        content=f"{chunk_id} " + "x" * (tokens * 4 - len(chunk_id) - 1),
+        metadata={}, relevance_score=0.2, source_file=f"{chunk_id}.pdf", chunk_id=chunk_id,
+    )
+
+
+def _fit(monkeypatch, budget, att, kb, history=""):
+    monkeypatch.setattr(chat_service, "get_prompt_token_budget", lambda: budget)
+    return chat_service._fit_prompt("Hoeveel sets?", att, kb, history, "Je bent een coach.")
+
+
+class TestTokenCounting:
+    def test_estimate_without_tiktoken(self, estimated_tokens):
+        assert count_tokens("") == 0
+        assert count_tokens("abcdefgh") == 2
+        assert truncate_tokens("abcdefghij", 2) == "abcdefgh"
+        assert truncate_tokens("abcdefghij", 2, keep_end=True) == "cdefghij"
+
+    def test_tiktoken_counts_special_tokens_as_text(self):
+        if prompt_budget._get_encoding() is None:
+            pytest.skip("tiktoken encoding not available offline")
+        assert count_tokens("hallo <|endoftext|>") > 1
+        assert count_tokens(truncate_tokens("een twee drie vier vijf zes", 3)) <= 3
+
+
+class TestFitPrompt:
+    def test_everything_fits(self, estimated_tokens, monkeypatch):
+        att, kb, prompt, breakdown = _fit(monkeypatch, 10000, [], [_chunk("a", 200), _chunk("b", 200)])
+        assert [c.chunk_id for c in kb] == ["a", "b"]
+        assert "[1] a " in prompt and "[2] b " in prompt
+        assert (breakdown["chunks_dropped"], breakdown["chunks_compressed"]) == (0, 0)
+        assert breakdown["total"] <= breakdown["budget"]
+
+    def test_lowest_ranked_compressed_then_dropped(self, estimated_tokens, monkeypatch):
+        chunks = [_chunk(c, 400) for c in "abcd"]
+        att, kb, prompt, breakdown = _fit(monkeypatch, 1300, [], chunks)
+        assert [c.chunk_id for c in kb] == ["a", "b", "c"]
+        assert kb[2].content.endswith(" …") and kb[2].content != chunks[2].content
+        assert chunks[2].content.endswith("x")  # Retrieved chunk itself is not modified
+        assert (breakdown["chunks_kept"], breakdown["chunks_compressed"], breakdown["chunks_dropped"]) == (3, 1, 1)
+        assert breakdown["total"] <= breakdown["budget"]
+
+    def test_attachments_before_kb(self, estimated_tokens, monkeypatch):
+        att, kb, prompt, breakdown = _fit(monkeypatch, 1100, [_chunk("bijlage", 600)], [_chunk("kb1", 600), _chunk("kb2", 600)])
+        assert [c.chunk_id for c in att] == ["bijlage"]
+        assert [c.chunk_id for c in kb] == ["kb1"]
+        assert breakdown["attachments"] > breakdown["kb"] > 0
+
+    def test_history_capped_keeping_most_recent(self, estimated_tokens, monkeypatch):
+        monkeypatch.setattr(settings, "prompt_history_share", 0.3)
+        history = "CONVERSATION HISTORY:\n" + "oud " * 2000 + "User: laatste vraag"
+        att, kb, prompt, breakdown = _fit(monkeypatch, 2000, [], [_chunk("a", 100)], history)
+        assert breakdown["history_truncated"]
+        assert breakdown["history"] <= 600
+        assert "User: laatste vraag" in prompt and [c.chunk_id for c in kb] == ["a"]
+
+
+class TestPromptTokenStats:
+    def test_totals_and_shares(self):
+        stats = PromptTokenStats()
+        base = {"system": 100, "instructions": 200, "history": 300, "attachments": 0, "kb": 400, "total": 1000,
+                "chunks_dropped": 0, "chunks_compressed": 0, "history_truncated": False}
+        stats.record(base)
+        stats.record({**base, "chunks_dropped": 2, "chunks_compressed": 1})
+        result = stats.stats()
+        assert result["turns"] == 2
+        assert result["avg_tokens"]["kb"] == 400
+        assert result["share"]["history"] == 0.3
+        assert (result["turns_trimmed"], result["chunks_dropped"], result["chunks_compressed"]) == (1, 2, 1)
@@ -0,0 +1,69 @@
+from types import SimpleNamespace
+
+import numpy as np
+from tokenizers import Tokenizer
+from tokenizers.models import WordLevel
+from tokenizers.pre_tokenizers import Whitespace
+from tokenizers.processors import TemplateProcessing
+
+from app.retrieval.reranker import OnnxCrossEncoder
+
+WORDS = ["squats", "slaap", "herstel", "eiwit", "kracht", "training", "en", "voor"]
+
+
+def make_tokenizer() -> Tokenizer:
+    vocab = {"[PAD]": 0, "[UNK]": 1, "[CLS]": 2, "[SEP]": 3}
+    vocab.update({w: i + 4 for i, w in enumerate(WORDS)})
+    tokenizer = Tokenizer(WordLevel(vocab, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = Whitespace()
+    tokenizer.post_processor = TemplateProcessing(
+        single="[CLS] $A [SEP]",
+        pair="[CLS] $A [SEP] $B:1 [SEP]:1",
+        special_tokens=[("[CLS]", 2), ("[SEP]", 3)],
+    )
+    return tokenizer
+
+
+class FakeSession:
+    """Scores a pair as the sum of its token ids; records batch shapes."""
+
+    def __init__(self):
+        self.shapes = []
+
+    def get_inputs(self):
+        return [SimpleNamespace(name="input_ids"), SimpleNamespace(name="attention_mask")]
+
+    def run(self, output_names, feeds):
+        assert set(feeds) == {"input_ids", "attention_mask"}
+        self.shapes.append(feeds["input_ids"].shape)
+        return [(feeds["input_ids"] * feeds["attention_mask"]).sum(axis=1, keepdims=True).astype(np.float32)]
+
+
+class TestOnnxCrossEncoder:
+    def test_scores_returned_in_input_order(self):
+        session = FakeSession()
+        model = OnnxCrossEncoder(session, make_tokenizer())
+        pairs = [
+            ("slaap", "squats en kracht en training"),
+            ("eiwit", "herstel"),
+            ("kracht", "slaap voor herstel"),
+        ]
+        expected = [sum(model.tokenizer.encode(q, p).ids) for q, p in pairs]
+        assert model.predict(pairs, batch_size=2).tolist() == expected
+
+    def test_batches_padded_to_own_longest_pair(self):
+        session = FakeSession()
+        model = OnnxCrossEncoder(session, make_tokenizer())
+        pairs = [("slaap", "squats en kracht en training en herstel"), ("eiwit", "herstel"), ("kracht", "slaap")]
+        model.predict(pairs, batch_size=2)
+        assert session.shapes == [(2, 5), (1, 11)]
+
+    def test_truncates_to_max_length(self):
+        session = FakeSession()
+        model = OnnxCrossEncoder(session, make_tokenizer(), max_length=6)
+        model.predict([("slaap", " ".join(WORDS * 5))])
+        assert session.shapes == [(1, 6)]
+
+    def test_empty_input(self):
+        model = OnnxCrossEncoder(FakeSession(), make_tokenizer())
+        assert model.predict([]).shape == (0,)
@@ -0,0 +1,221 @@
+import threading
+import time
+
+import pytest
+
+from app.config import settings
+from app.retrieval import result_cache, retriever
+from app.retrieval.result_cache import RetrievalResultCache
+from app.retrieval.retriever import RetrievedChunk, TTLCache
+
+
+class FakeCrossEncoder:
+    def __init__(self):
+        self.pairs = []
+
+    def predict(self, pairs, batch_size=16):
+        self.pairs.extend(pairs)
+        return [float(len(passage)) for _, passage in pairs]
+
+
+@pytest.fixture
+def reranker(monkeypatch):
+    fake = FakeCrossEncoder()
+    monkeypatch.setattr(retriever, "_get_cross_encoder", lambda: fake)
+    monkeypatch.setattr(retriever, "_rerank_cache", TTLCache(max_items=100, ttl_seconds=60))
+    return fake
+
+
+def _chunks(*contents):
+    return [
+        RetrievedChunk(content=c, metadata={}, relevance_score=0.5, source_file="f", chunk_id=f"id{i}" if c != "geen id" else "")
+        for i, c in enumerate(contents)
+    ]
+
+
+class TestTTLCache:
+    def test_lru_bound(self):
+        cache = TTLCache(max_items=2, ttl_seconds=60)
+        cache.put_many([(("q", "a"), 1.0), (("q", "b"), 2.0), (("q", "c"), 3.0)])
+        assert cache.get_many([("q", "a"), ("q", "c")]) == [None, 3.0]
+
+    def test_expired_entries_are_misses(self):
+        cache = TTLCache(max_items=10, ttl_seconds=-1)
+        cache.put_many([(("q", "a"), 1.0)])
+        assert cache.get_many([("q", "a")]) == [None]
+        assert cache.stats()["size"] == 0
+
+
+class TestCrossEncoderRerank:
+    def test_only_unseen_pairs_scored(self, reranker):
+        retriever._cross_encoder_rerank("Hoeveel eiwit?", _chunks("kort", "veel langer"))
+        result = retriever._cross_encoder_rerank("hoeveel  eiwit", _chunks("kort", "veel langer", "middel"))
+        assert [p for _, p in reranker.pairs] == ["kort", "veel langer", "middel"]
+        assert [c.content for c in result] == ["veel langer", "middel", "kort"]
+        assert retriever.get_rerank_cache_stats()["hits"] == 2
+
+    def test_chunks_without_id_are_always_scored(self, reranker):
+        retriever._cross_encoder_rerank("q", _chunks("geen id"))
+        retriever._cross_encoder_rerank("q", _chunks("geen id"))
+        assert len(reranker.pairs) == 2
+
+
+@pytest.fixture
+def uncached(monkeypatch):
+    calls = []
+
+    def fake_stages(query, *args):
+        calls.append(query)
+        yield "provisional", _chunks("voorlopig"), False
+        yield "final", _chunks("resultaat"), True
+
+    monkeypatch.setattr(retriever, "_retrieval_stages", fake_stages)
+    monkeypatch.setattr(retriever, "_result_cache", RetrievalResultCache(max_bytes=1024 * 1024, ttl_seconds=60))
+    monkeypatch.setattr(settings, "retrieval_cache_enabled", True)
+    return calls
+
+
+class TestRetrievalResultCache:
+    def test_repeat_query_served_from_cache(self, uncached):
+        first = retriever.retrieve("Wat is RPE?", collection_name="kennisbank")
+        first[0].relevance_score = 0.0
+        second = retriever.retrieve("wat is rpe", collection_name="kennisbank")
+        assert uncached == ["Wat is RPE?"]
+        assert second[0].relevance_score == 0.5
+
+    def test_collection_write_invalidates(self, uncached):
+        retriever.retrieve("vraag", collection_name="kennisbank")
+        retriever.retrieve("vraag")
+        result_cache.bump_generation("kennisbank")
+        retriever.retrieve("vraag", collection_name="kennisbank")
+        retriever.retrieve("vraag")
+        assert len(uncached) == 4
+
+    def test_other_collection_write_keeps_entry(self, uncached):
+        retriever.retrieve("vraag", collection_name="kennisbank")
+        result_cache.bump_generation("andere-collectie")
+        retriever.retrieve("vraag", collection_name="kennisbank")
+        assert len(uncached) == 1
+
+    def test_bypass(self, uncached):
+        retriever.retrieve("vraag", use_cache=False)
+        retriever.retrieve("vraag", use_cache=False)
+        assert len(uncached) == 2
+
+    def test_staged_yields_provisional_then_final(self, uncached):
+        stages = list(retriever.retrieve_staged("vraag", collection_name="kennisbank"))
+        assert [stage for stage, _ in stages] == ["provisional", "final"]
+        assert stages[1][1][0].content == "resultaat"
+        assert [stage for stage, _ in retriever.retrieve_staged("vraag", collection_name="kennisbank")] == ["final"]
+
+    def test_memory_bound(self):
+        cache = RetrievalResultCache(max_bytes=3000, ttl_seconds=60)
+        for i in range(5):
+            cache.put(("q", i), _chunks("x" * 500))
+        assert cache.get(("q", 0)) is None
+        assert cache.get(("q", 4)) is not None
+        assert cache.stats()["size_mb"] * 1024 * 1024 <= 3000
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    """Stub out search so only the multi-query orchestration is exercised."""
+    searched = []
+
+    def fake_semantic(queries, collection_name, collection_names, fetch_k):
+        searched.append(list(queries))
+        return [
+            RetrievedChunk(content=q, metadata={}, relevance_score=0.1, source_file="f", chunk_id=q)
+            for q in queries
+        ]
+
+    monkeypatch.setattr(retriever, "_semantic_search", fake_semantic)
+    monkeypatch.setattr(retriever, "_cross_encoder_rerank", lambda query, chunks: chunks)
+    monkeypatch.setattr(retriever, "_expand_with_neighbors", lambda chunks, *a, **kw: chunks)
+    monkeypatch.setattr(retriever, "_expansion_cache", TTLCache(max_items=100, ttl_seconds=60))
+    return searched
+
+
+def _final(stages):
+    for stage, chunks, complete in stages:
+        if stage == "final":
+            return chunks, complete
+
+
+class TestMultiQueryExpansion:
+    def test_expansion_cached_by_normalized_question(self, pipeline, monkeypatch):
+        calls = []
+        monkeypatch.setattr(retriever, "_generate_alternative_queries", lambda q: calls.append(q) or ["alt 1", "alt 2"])
+        for question in ("Wat is RPE?", "wat is rpe"):
+            chunks, complete = _final(retriever._retrieval_stages(question, "kb", None, 5, True, False))
+            assert complete
+        assert calls == ["Wat is RPE?"]
+        assert pipeline[1] == ["alt 1", "alt 2"]
+        assert {c.content for c in chunks} == {"wat is rpe", "alt 1", "alt 2"}
+
+    def test_slow_expansion_skipped_after_budget(self, pipeline, monkeypatch):
+        release = threading.Event()
+
+        def slow(question):
+            release.wait(5)
+            return ["te laat"]
+
+        monkeypatch.setattr(retriever, "_generate_alternative_queries", slow)
+        monkeypatch.setattr(settings, "multi_query_budget_seconds", 0.05)
+        chunks, complete = _final(retriever._retrieval_stages("vraag", "kb", None, 5, True, False))
+        assert not complete
+        assert pipeline == [["vraag"]]
+
+        # The late expansion still lands in the cache for the next ask
+        release.set()
+        deadline = time.monotonic() + 2
+        while retriever._expansion_cache.get_many(["vraag"]) == [None] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert retriever._expansion_cache.get_many(["vraag"]) == [["te laat"]]
+
+    def test_failed_expansion_result_not_cached(self, pipeline, monkeypatch):
+        def failing(question):
+            raise RuntimeError("rate limited")
+
+        monkeypatch.setattr(retriever, "_generate_alternative_queries", failing)
+        monkeypatch.setattr(retriever, "_result_cache", RetrievalResultCache(1_000_000, ttl_seconds=60))
+        monkeypatch.setattr(settings, "retrieval_cache_enabled", True)
+        for _ in range(2):
+            stages = list(retriever.retrieve_staged("vraag", "kb", top_k=5, use_multi_query=True, use_hybrid=False))
+            assert stages[-1][0] == "final"
+        assert pipeline == [["vraag"], ["vraag"]]  # Searched again, not served from the result cache
+        assert retriever._expansion_cache.get_many(["vraag"]) == [None]
+
+
+class FakeCollection:
+    def __init__(self, docs):
+        self.docs = docs
+        self.get_calls = []
+
+    def get(self, ids, include):
+        self.get_calls.append(ids)
+        found = [i for i in ids if i in self.docs]
+        return {"ids": found, "documents": [self.docs[i] for i in found]}
+
+
+class TestNeighborExpansion:
+    def _hit(self, idx, collection="kb"):
+        return RetrievedChunk(
+            content=f"chunk {idx}", metadata={"document_id": "doc", "chunk_index": idx},
+            relevance_score=0.1, source_file="f", chunk_id=f"doc_chunk_{idx}", collection=collection,
+        )
+
+    def test_fetches_only_neighbor_ids_once_per_collection(self, monkeypatch):
+        kb = FakeCollection({f"doc_chunk_{i}": f"chunk {i}" for i in range(10)})
+        other = FakeCollection({})
+        monkeypatch.setattr(retriever, "get_or_create_collection", {"kb": kb, "other": other}.get)
+        result = retriever._expand_with_neighbors([self._hit(0), self._hit(5)], None, ["kb", "other"], window=2)
+        assert kb.get_calls == [["doc_chunk_1", "doc_chunk_2", "doc_chunk_3", "doc_chunk_4", "doc_chunk_6", "doc_chunk_7"]]
+        assert other.get_calls == []
+        assert result[0].content == "chunk 0\n\nchunk 1\n\nchunk 2"
+        assert result[1].content.split("\n\n") == [f"chunk {i}" for i in range(3, 8)]
+
+    def test_window_zero_disables_expansion(self, monkeypatch):
+        monkeypatch.setattr(retriever, "get_or_create_collection", lambda name: pytest.fail("no lookup expected"))
+        chunks = [self._hit(3)]
+        assert retriever._expand_with_neighbors(chunks, "kb", None, window=0) == chunks
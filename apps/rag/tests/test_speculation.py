@@ -0,0 +1,279 @@
+import asyncio
+from concurrent.futures import Future
+
+import pytest
+
+from app.config import settings
+from app.retrieval.retriever import RetrievedChunk
+from app.services import chat_service
+from app.services.speculation import SpeculationStats, SpeculativeGeneration, chunk_overlap
+
+
+def _chunk(chunk_id, content="tekst"):
+    return RetrievedChunk(content=content, metadata={}, relevance_score=0.2, source_file="f.pdf", chunk_id=chunk_id)
+
+
+class TestChunkOverlap:
+    def test_share_of_final_chunks_already_provisional(self):
+        provisional = [_chunk("a"), _chunk("b"), _chunk("c")]
+        final = [_chunk("a", "uitgebreid"), _chunk("c"), _chunk("d"), _chunk("e")]
+        assert chunk_overlap(provisional, final) == 0.5
+
+    def test_empty_final(self):
+        assert chunk_overlap([], []) == 1.0
+        assert chunk_overlap([_chunk("a")], []) == 0.0
+
+
+async def _aiter(items, delay=0.0):
+    for item in items:
+        await asyncio.sleep(delay)
+        yield item
+
+
+async def _collect(agen):
+    return [item async for item in agen]
+
+
+class TestSpeculativeGeneration:
+    def test_buffers_tokens_until_consumed(self):
+        async def scenario():
+            run = SpeculativeGeneration(lambda: _aiter(["Hallo", " wereld"]))
+            await asyncio.sleep(0.01)
+            return await _collect(run.tokens())
+
+        assert asyncio.run(scenario()) == ["Hallo", " wereld"]
+
+    def test_cancel_closes_stream(self):
+        closed = []
+
+        async def stream():
+            try:
+                yield "eerste"
+                await asyncio.sleep(5)
+                yield "tweede"
+            finally:
+                closed.append(True)
+
+        async def scenario():
+            run = SpeculativeGeneration(stream)
+            await asyncio.sleep(0.01)
+            run.cancel()
+            return await asyncio.wait_for(_collect(run.tokens()), timeout=1)
+
+        assert asyncio.run(scenario()) == ["eerste"]
+        assert closed == [True]
+
+    def test_errors_surface_to_consumer(self):
+        async def failing():
+            yield "a"
+            raise RuntimeError("provider down")
+
+        async def scenario():
+            return await _collect(SpeculativeGeneration(failing).tokens())
+
+        with pytest.raises(RuntimeError, match="provider down"):
+            asyncio.run(scenario())
+
+    def test_stats(self):
+        stats = SpeculationStats()
+        for overlap, kept in ((1.0, True), (0.9, True), (0.4, False)):
+            stats.record_start()
+            stats.record_outcome(overlap, kept, head_start=0.5)
+        result = stats.stats()
+        assert (result["started"], result["kept"], result["restarted"]) == (3, 2, 1)
+        assert result["keep_rate"] == pytest.approx(2 / 3, abs=1e-4)
+        assert result["avg_head_start_seconds"] == 0.5
+        assert result["overlap_histogram"]["1.0"] == 1
+        assert result["overlap_histogram"]["0.4"] == 1
+
+
+@pytest.fixture
+def stream_env(monkeypatch):
+    """chat_stream with storage, retrieval and the LLM stubbed out."""
+    prompts = []
+
+    async def fake_generate_stream(prompt, system=None, temperature=0.7, provider_info=None):
+        prompts.append(prompt)
+        if provider_info is not None:
+            provider_info["name"] = "fake"
+        for token in ("Antwoord", " [1]."):
+            await asyncio.sleep(0)
+            yield token
+
+    stages = {}
+
+    def fake_staged(*args):
+        yield "provisional", [], stages["provisional"]
+        yield "final", [], stages["final"]
+
+    monkeypatch.setattr(chat_service, "get_turn_context", lambda sid, tail: {
+        "id": sid, "collection": "kb", "metadata": {}, "message_count": 1,
+        "recent": [{"role": "user", "content": "eerder"}],
+    })
+    monkeypatch.setattr(chat_service, "_build_history_section", lambda context: "")
+    monkeypatch.setattr(chat_service, "_retrieve_chunks_staged", fake_staged)
+    monkeypatch.setattr(chat_service, "generate_stream_async", fake_generate_stream)
+    monkeypatch.setattr(chat_service, "record_turn", lambda *a, **kw: ({"id": 0}, {"id": 1}))
+    monkeypatch.setattr(chat_service, "speculation_stats", SpeculationStats())
+    monkeypatch.setattr(settings, "speculative_generation_enabled", True)
+    monkeypatch.setattr(settings, "speculative_overlap_threshold", 0.8)
+    return prompts, stages
+
+
+def _run_stream():
+    return asyncio.run(_collect(chat_service.chat_stream("s1", "vraag")))
+
+
+def _final_sources(events):
+    return [e["data"] for e in events if e["event"] == "sources"][-1]
+
+
+class TestSpeculativeChatStream:
+    def test_kept_when_final_top_k_unchanged(self, stream_env):
+        prompts, stages = stream_env
+        stages["provisional"] = [_chunk("a", "alpha"), _chunk("b", "beta")]
+        stages["final"] = [_chunk("b", "beta"), _chunk("a", "alpha")]
+        events = _run_stream()
+        assert len(prompts) == 1
+        assert prompts[0].index("alpha") < prompts[0].index("beta")
+        assert [s["chunk_text"] for s in _final_sources(events)] == ["alpha", "beta"]
+        assert events[-1]["data"]["answer"] == "Antwoord [1]."
+        assert chat_service.speculation_stats.stats()["kept"] == 1
+
+    def test_restarted_when_final_top_k_differs(self, stream_env):
+        prompts, stages = stream_env
+        stages["provisional"] = [_chunk("a", "alpha"), _chunk("b", "beta")]
+        stages["final"] = [_chunk("c", "gamma"), _chunk("a", "alpha")]
+        events = _run_stream()
+        assert any("gamma" in p for p in prompts)
+        assert [s["chunk_text"] for s in _final_sources(events)] == ["gamma", "alpha"]
+        assert events[-1]["data"]["model_used"] == "fake"
+        assert chat_service.speculation_stats.stats()["restarted"] == 1
+
+    def test_disabled(self, stream_env, monkeypatch):
+        prompts, stages = stream_env
+        monkeypatch.setattr(settings, "speculative_generation_enabled", False)
+        stages["provisional"] = stages["final"] = [_chunk("a", "alpha")]
+        _run_stream()
+        assert len(prompts) == 1
+        assert chat_service.speculation_stats.stats()["started"] == 0
+
+    def test_cancelled_when_client_leaves_before_answer(self, stream_env, monkeypatch):
+        prompts, stages = stream_env
+        stages["provisional"] = stages["final"] = [_chunk("a", "alpha")]
+        generated, closed = [], []
+
+        async def slow_stream(prompt, system=None, temperature=0.7, provider_info=None):
+            try:
+                for i in range(20):
+                    await asyncio.sleep(0.01)
+                    generated.append(i)
+                    yield f" {i}"
+            finally:
+                closed.append(True)
+
+        monkeypatch.setattr(chat_service, "generate_stream_async", slow_stream)
+
+        async def scenario():
+            stream = chat_service.chat_stream("s1", "vraag")
+            async for event in stream:
+                if event["event"] == "sources":
+                    break  # Provisional sources: the speculative run has started
+            await asyncio.sleep(0.03)
+            await stream.aclose()
+            await asyncio.sleep(0.3)  # Long enough for all 20 tokens if the run were left going
+
+        asyncio.run(scenario())
+        assert closed == [True]
+        assert len(generated) < 20
+
+    def test_cancelled_when_a_step_fails_after_start(self, stream_env, monkeypatch):
+        prompts, stages = stream_env
+        cancelled = []
+
+        async def endless_stream(prompt, system=None, temperature=0.7, provider_info=None):
+            try:
+                while True:
+                    await asyncio.sleep(0.01)
+                    yield "x"
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        def failing_staged(*args):
+            yield "provisional", [], [_chunk("a", "alpha")]
+            raise RuntimeError("reranker down")
+
+        monkeypatch.setattr(chat_service, "generate_stream_async", endless_stream)
+        monkeypatch.setattr(chat_service, "_retrieve_chunks_staged", failing_staged)
+
+        seen = []
+
+        async def scenario():
+            try:
+                await _collect(chat_service.chat_stream("s1", "vraag"))
+            finally:
+                await asyncio.sleep(0.05)  # Let the cancellation reach the stream
+                seen.extend(cancelled)  # Before asyncio.run() cancels leftover tasks itself
+
+        with pytest.raises(RuntimeError, match="reranker down"):
+            asyncio.run(scenario())
+        assert seen == [True]
+
+
+
+class TestNewSessionTitle:
+    @pytest.fixture
+    def new_session(self, stream_env, monkeypatch):
+        """A first turn, with the title pool replaced by one that hands out the given future."""
+        prompts, stages = stream_env
+        stages["provisional"] = stages["final"] = [_chunk("a", "alpha")]
+        monkeypatch.setattr(settings, "speculative_generation_enabled", False)
+        monkeypatch.setattr(chat_service, "get_turn_context", lambda sid, tail: {
+            "id": sid, "collection": "kb", "metadata": {}, "message_count": 0, "recent": [],
+        })
+        saved = []
+        monkeypatch.setattr(chat_service, "record_turn", lambda *a, **kw: saved.append(kw) or ({"id": 0}, {"id": 1}))
+        title = Future()
+
+        class FakePool:
+            def submit(self, fn, *args):
+                return title
+
+        monkeypatch.setattr(chat_service, "_get_title_pool", lambda: FakePool())
+        return title, saved
+
+    def test_ready_title_saved_with_turn(self, new_session):
+        title, saved = new_session
+        title.set_result("Titel")
+        _run_stream()
+        assert saved[0]["title"] == "Titel"
+
+    def test_turn_saved_when_title_cancelled_by_shutdown(self, new_session):
+        title, saved = new_session
+        title.cancel()  # As stop_title_generator() does to a queued title
+        events = _run_stream()
+        assert saved[0]["title"] is None
+        assert events[-1]["event"] == "done"
+
+    def test_late_cancelled_title_is_not_written(self, monkeypatch):
+        writes = []
+        monkeypatch.setattr(chat_service, "defer_write", lambda *args: writes.append(args))
+        title = Future()
+        assert chat_service._title_if_ready("s1", title) is None
+        title.cancel()
+        assert writes == []
+
+    def test_cancelled_when_stream_aborts(self, new_session):
+        title, saved = new_session
+
+        async def scenario():
+            stream = chat_service.chat_stream("s1", "vraag")
+            async for event in stream:
+                if event["event"] not in ("status", "sources"):
+                    break
+            await stream.aclose()
+
+        asyncio.run(scenario())
+        assert title.cancelled()
+        assert saved == []
@@ -0,0 +1,49 @@
+import threading
+
+import pytest
+
+from app.core import database, sqlite_pool, usage_tracker
+
+
+class TestSqlitePool:
+    def test_connection_reused_within_thread_and_shared(self, chat_db):
+        with database._conn() as a, usage_tracker._conn() as b:
+            assert a is b
+        with database._conn() as c:
+            assert c is a
+            assert c.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+            assert c.execute("PRAGMA foreign_keys").fetchone()[0] == 1
+
+    def test_separate_connection_per_thread(self, chat_db):
+        with database._conn() as main_conn:
+            pass
+        other = []
+
+        def use_connection():
+            with database._conn() as conn:
+                other.append(conn)
+
+        t = threading.Thread(target=use_connection)
+        t.start()
+        t.join()
+        assert other[0] is not main_conn
+
+    def test_uncommitted_write_is_rolled_back(self, chat_db):
+        with pytest.raises(RuntimeError):
+            with database._conn() as conn:
+                conn.execute(
+                    "INSERT INTO sessions (id, title, created_at, updated_at) VALUES ('x', 't', 'now', 'now')"
+                )
+                raise RuntimeError("boom")
+        assert database.get_session("x") is None
+        session = database.create_session()
+        assert database.get_session(session["id"]) is not None
+
+    def test_close_all_reopens_lazily(self, chat_db):
+        with database._conn() as before:
+            pass
+        sqlite_pool.close_all()
+        session = database.create_session()
+        with database._conn() as after:
+            assert after is not before
+        assert database.get_session(session["id"])["id"] == session["id"]
@@ -0,0 +1,116 @@
+import queue
+import threading
+import time
+
+import pytest
+
+from app.config import settings
+from app.core import usage_tracker
+
+
+def _rows():
+    with usage_tracker._conn() as conn:
+        return conn.execute("SELECT call_type, model, total_tokens, provider FROM groq_usage ORDER BY id").fetchall()
+
+
+class TestUsageWriteBehind:
+    def test_rows_written_on_flush(self, chat_db):
+        usage_tracker.log_llm_usage("llama-3.3-70b-versatile", 100, 20, provider="groq")
+        usage_tracker.log_whisper_usage("whisper-large-v3-turbo", 12.5)
+        assert usage_tracker.flush_usage(timeout=5)
+        rows = [tuple(r) for r in _rows()]
+        assert rows == [("chat", "llama-3.3-70b-versatile", 120, "groq"), ("whisper", "whisper-large-v3-turbo", 0, "groq")]
+
+    def test_rows_are_batched(self, chat_db):
+        before = usage_tracker.get_usage_queue_stats()
+        threads = [
+            threading.Thread(target=lambda: [usage_tracker.log_llm_usage("llama3.1-8b", 1, 1, provider="cerebras")
+                                             for _ in range(50)])
+            for _ in range(4)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert usage_tracker.flush_usage(timeout=5)
+        after = usage_tracker.get_usage_queue_stats()
+        assert len(_rows()) == 200
+        assert after["written"] - before["written"] == 200
+        assert after["batches"] - before["batches"] < 50
+
+    def test_full_queue_writes_directly(self, chat_db, monkeypatch):
+        full = queue.Queue(maxsize=1)
+        full.put(object())
+        monkeypatch.setattr(usage_tracker, "_get_usage_queue", lambda: full)
+        monkeypatch.setattr(usage_tracker, "_ENQUEUE_TIMEOUT", 0.01)
+        before = usage_tracker.get_usage_queue_stats()["direct_writes"]
+        t0 = time.monotonic()
+        usage_tracker.log_llm_usage("llama3.1-8b", 5, 5, provider="cerebras")
+        assert time.monotonic() - t0 < 1
+        assert usage_tracker.get_usage_queue_stats()["direct_writes"] == before + 1
+        assert len(_rows()) == 1
+
+
+def _insert_raw(rows):
+    with usage_tracker._conn() as conn:
+        conn.executemany(usage_tracker._INSERT_SQL, rows)
+        conn.commit()
+
+
+class TestUsageRollups:
+    def test_stats_match_raw_rows(self, chat_db):
+        for i in range(5):
+            usage_tracker.log_llm_usage("llama-3.3-70b-versatile", 100 * i, 10, provider="groq")
+        usage_tracker.log_llm_usage("llama3.1-8b", 50, 5, provider="cerebras")
+        usage_tracker.log_whisper_usage("whisper-large-v3-turbo", 60.0)
+        assert usage_tracker.flush_usage(timeout=5)
+
+        stats = usage_tracker.get_usage_stats()
+        with usage_tracker._conn() as conn:
+            raw = conn.execute(
+                "SELECT COUNT(*), SUM(input_tokens), SUM(total_tokens), SUM(estimated_cost) FROM groq_usage"
+            ).fetchone()
+            raw_model_cost = conn.execute(
+                "SELECT SUM(estimated_cost) FROM groq_usage WHERE model = 'llama-3.3-70b-versatile'"
+            ).fetchone()[0]
+        pricing = usage_tracker.PRICING["llama-3.3-70b-versatile"]
+        model_cost = 1000 * pricing["input"] + 50 * pricing["output"]  # 0+100+..+400 in, 5 x 10 out
+        assert raw_model_cost == pytest.approx(model_cost)
+        assert stats["all_time"]["requests"] == stats["today"]["requests"] == raw[0] == 7
+        assert stats["all_time"]["input_tokens"] == raw[1]
+        assert stats["all_time"]["total_tokens"] == raw[2]
+        assert stats["all_time"]["estimated_cost"] == round(raw[3], 4)
+        assert {p["provider"]: p["requests"] for p in stats["by_provider"]} == {"groq": 6, "cerebras": 1}
+        assert stats["by_model"][0] == {
+            "model": "llama-3.3-70b-versatile", "type": "chat", "provider": "groq", "requests": 5,
+            "tokens": 1050, "audio_seconds": 0, "cost": round(model_cost, 4),
+        }
+
+    def test_backfill_from_existing_raw_rows(self, chat_db):
+        with usage_tracker._conn() as conn:
+            conn.execute("DROP TABLE usage_daily")
+            conn.commit()
+        _insert_raw([
+            ("2024-01-05T10:00:00+00:00", "chat", "m", 10, 5, 15, 0, 0.1, "groq"),
+            ("2024-01-05T11:00:00+00:00", "chat", "m", 20, 5, 25, 0, 0.2, "groq"),
+        ])
+        usage_tracker.init_usage_table()
+        with usage_tracker._conn() as conn:
+            row = conn.execute("SELECT * FROM usage_daily").fetchone()
+        assert (row["day"], row["requests"], row["total_tokens"]) == ("2024-01-05", 2, 40)
+
+    def test_compaction_keeps_totals(self, chat_db, monkeypatch):
+        monkeypatch.setattr(settings, "usage_raw_retention_days", 0)  # No compaction by the writer thread
+        usage_tracker._insert_rows([
+            ("2020-03-01T08:00:00+00:00", "chat", "m", 10, 10, 20, 0, 0.0, "groq"),
+            ("2020-03-02T08:00:00+00:00", "chat", "m", 10, 10, 20, 0, 0.0, "groq"),
+        ])
+        usage_tracker.log_llm_usage("m", 1, 1, provider="groq")
+        assert usage_tracker.flush_usage(timeout=5)
+        before = usage_tracker.get_usage_stats()["all_time"]
+
+        assert usage_tracker.compact_usage(30) == 2
+        assert usage_tracker.compact_usage(0) == 0
+        with usage_tracker._conn() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM groq_usage").fetchone()[0] == 1
+        assert usage_tracker.get_usage_stats()["all_time"] == before
@@ -533,31 +533,33 @@ function toggleSidebar() {
 // Sessions
 // ============================================================
 
-async function loadSessions(searchQuery = '') {
+async function loadSessions(searchQuery = '', cursor = null) {
   try {
-    const endpoint = searchQuery
-      ? `/chat/sessions/search?q=${encodeURIComponent(searchQuery)}&limit=30`
-      : '/chat/sessions?limit=30';
+    const params = new URLSearchParams({ limit: 30 });
+    if (searchQuery) params.set('q', searchQuery);
+    if (cursor) params.set('cursor', cursor);
+    const endpoint = `${searchQuery ? '/chat/sessions/search' : '/chat/sessions'}?${params}`;
     const data = await apiGet(endpoint);
     const sessions = data.sessions || [];
-    renderSessions(sessions, searchQuery);
+    renderSessions(sessions, searchQuery, data.next_cursor || null, !!cursor);
   } catch (e) {
     // Session load failed silently
   }
 }
 
-function renderSessions(sessions, searchQuery = '') {
-  if (!sessions.length) {
-    $sessionsEl.innerHTML = searchQuery
-      ? `<div class="sessions-empty">Geen resultaten voor "${escapeHtml(searchQuery)}"</div>`
-      : '<div class="sessions-empty">Nog geen gesprekken</div>';
-    return;
+function renderSessions(sessions, searchQuery = '', nextCursor = null, append = false) {
+  if (append) {
+    $sessionsEl.querySelector('.sessions-more')?.remove();
+  } else {
+    if (!sessions.length) {
+      $sessionsEl.innerHTML = searchQuery
+        ? `<div class="sessions-empty">Geen resultaten voor "${escapeHtml(searchQuery)}"</div>`
+        : '<div class="sessions-empty">Nog geen gesprekken</div>';
+      return;
+    }
+    $sessionsEl.innerHTML = '<div class="sessions-group-label">Recente gesprekken</div>';
   }
 
-  $sessionsEl.innerHTML = searchQuery
-    ? `<div class="sessions-group-label">${sessions.length} resultaten</div>`
-    : '<div class="sessions-group-label">Recente gesprekken</div>';
-
   sessions.forEach(s => {
     const el = document.createElement('div');
     el.className = 'session-item' + (s.id === currentSessionId ? ' active' : '');
@@ -570,9 +572,21 @@ function renderSessions(sessions, searchQuery = '') {
       }
     }
 
+    // Search results carry a snippet with \u0002…\u0003 around the matched words,
+    // otherwise show the start of the last message
+    let snippetHtml = '';
+    if (s.snippet) {
+      snippetHtml = `<span class="session-snippet">${escapeHtml(s.snippet).replace(/\u0002/g, '<mark>').replace(/\u0003/g, '</mark>')}</span>`;
+    } else if (s.last_message_preview) {
+      snippetHtml = `<span class="session-snippet">${escapeHtml(s.last_message_preview)}</span>`;
+    }
+
     el.innerHTML = `
       ${agentBadge}
-      <span class="session-title">${escapeHtml(s.title || 'Nieuw gesprek')}</span>
+      <span class="session-text">
+        <span class="session-title">${escapeHtml(s.title || 'Nieuw gesprek')}</span>
+        ${snippetHtml}
+      </span>
       <button class="session-delete" title="Verwijder" data-id="${s.id}">
         <svg width="16" height="16" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2" stroke-linecap="round" stroke-linejoin="round">
           <polyline points="3 6 5 6 21 6"/>
@@ -604,6 +618,21 @@ function renderSessions(sessions, searchQuery = '') {
 
     $sessionsEl.appendChild(el);
   });
+
+  if (searchQuery) {
+    const count = $sessionsEl.querySelectorAll('.session-item').length;
+    $sessionsEl.querySelector('.sessions-group-label').textContent = `${count}${nextCursor ? '+' : ''} resultaten`;
+  }
+  if (nextCursor) {
+    const more = document.createElement('button');
+    more.className = 'sessions-more';
+    more.textContent = 'Meer laden';
+    more.addEventListener('click', () => {
+      more.disabled = true;
+      loadSessions(searchQuery, nextCursor);
+    });
+    $sessionsEl.appendChild(more);
+  }
 }
 
 async function loadSession(sessionId, agentId = null) {
@@ -773,8 +802,19 @@ async function streamResponse(sessionId, message) {
           if (span) span.textContent = data;
         } else if (eventType === 'sources') {
           sources = data;
+        } else if (eventType === 'delta') {
+          // Server sends only what changed in the cleaned text: keep the first
+          // `offset` characters, append `text`
+          if (firstToken) {
+            if (statusEl) statusEl.style.display = 'none';
+            streamingText.innerHTML = '';
+            firstToken = false;
+          }
+          fullText = fullText.slice(0, data.offset) + data.text;
+          streamingText.innerHTML = renderMarkdown(fullText, sources);
+          scrollToBottom();
         } else if (eventType === 'content') {
-          // Server sends full cleaned text (replaces everything) — no client-side HTML cleaning needed
+          // Server sends full cleaned text (periodic resync) — no client-side HTML cleaning needed
           if (firstToken) {
             if (statusEl) statusEl.style.display = 'none';
             streamingText.innerHTML = '';
@@ -897,7 +937,7 @@ async function streamResponse(sessionId, message) {
 
 async function submitStreamFeedbackLegacy(feedbackDiv, feedback) {
   try {
-    const data = await apiGet(`/chat/sessions/${currentSessionId}`);
+    const data = await apiGet(`/chat/sessions/${currentSessionId}?sources=false`);
     const messages = data.messages || [];
     const lastAssistant = [...messages].reverse().find(m => m.role === 'assistant');
     if (!lastAssistant) return;